@@ -1,40 +1,268 @@
-from cmath import pi
+import argparse
+import math
+import selectors
 import socket
 import struct
+import time
 
-UDP_RECEIVE_MULTICAST_IP = "234.1.1.2"
-UDP_RECEIVE_PORT = 15150
-UDP_RECEIVE_BYTES = 1024
-interface_ip    = "192.168.1.10"
+# Receives the position of the DA42 simulator (multicast) and forwards it
+# to HoloAssist as a simulator position update packet.
+# Each packet is decoded once and sent to every destination (e.g. the
+# HoloLens, a Unity editor and a logger), each with its own rate limit.
+# The forwarder waits in `select` until a packet arrives (with a timeout,
+# so that the counters can be reported even when no packets arrive), so an
+# idle forwarder does not use any CPU.
+#
+# Destinations can be added and removed at runtime by sending text commands
+# to the control port, e.g.:
+#   echo "add 127.0.0.1:53941@60" | nc -u -w1 127.0.0.1 15151
+#   echo "remove 127.0.0.1:53941" | nc -u -w1 127.0.0.1 15151
+#   echo "list" | nc -u -w1 127.0.0.1 15151
 
-UDP_SEND_IP = '192.168.137.236'
-UDP_SEND_PORT = 53941
-UDP_SEND_BYTES = 6*8
+DEFAULT_RECEIVE_MULTICAST_IP = "234.1.1.2"
+DEFAULT_RECEIVE_PORT = 15150
+DEFAULT_INTERFACE_IP = "192.168.1.10"
+RECEIVE_BUFFER_BYTES = 1024
 
-sock_da42_pos = socket.socket(socket.AF_INET, # Internet
-                     socket.SOCK_DGRAM, socket.IPPROTO_UDP) # UDP
-sock_da42_pos.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock_da42_pos.bind(('', UDP_RECEIVE_PORT))
-# Tell the operating system to add the socket to the multicast group
-# on all interfaces.
-group = socket.inet_aton(UDP_RECEIVE_MULTICAST_IP)
+DEFAULT_DESTINATION = "192.168.137.236:53941"
 
-mreq = struct.pack('4s4s', group, socket.inet_aton(interface_ip))
-sock_da42_pos.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-sock_da42_pos.setblocking(0)
+DEFAULT_CONTROL_IP = "127.0.0.1"
+DEFAULT_CONTROL_PORT = 15151
 
-sock_send_sim_pos = socket.socket(socket.AF_INET, # Internet
-                     socket.SOCK_DGRAM) # UDP
+# Fields of the DA42 packet, starting at byte 48: latitude and longitude
+# (double, in arc minutes), altitude (float, meters), 16 bytes that are not
+# used and the attitude theta, phi, psi (float, radians)
+DA42_POSITION_OFFSET = 48
+DA42_POSITION_STRUCT = struct.Struct("<2df16x3f")
+DA42_PACKET_MIN_BYTES = DA42_POSITION_OFFSET + DA42_POSITION_STRUCT.size
 
+# Simulator position update understood by HoloAssist: a zero byte, then
+# latitude, longitude (radians), altitude (meters), phi, theta, psi (radians)
+SIM_POSITION_STRUCT = struct.Struct("<B6d")
+
+ARC_MINUTES_TO_RADIANS = math.pi / (60 * 180)
+
+class Destination:
+    def __init__(self, address, rate_hz = None):
+        self.address = address
+        # None means no rate limit: every packet is forwarded
+        self.rate_hz = rate_hz
+        self.next_send_time = 0
+        self.packets_out = 0
+
+    @staticmethod
+    def parse(text):
+        """
+            Parses `IP:PORT` or `IP:PORT@RATE_HZ`
+        """
+        (address, _, rate) = text.partition("@")
+        (ip, _, port) = address.rpartition(":")
+
+        try:
+            socket.inet_aton(ip)
+        except OSError as e:
+            raise ValueError(f"invalid IP address: {ip}") from e
+
+        port = int(port)
+        if not 0 <= port <= 65535:
+            raise ValueError(f"invalid port: {port}")
+
+        rate_hz = float(rate) if rate else None
+        if rate_hz is not None and not (math.isfinite(rate_hz) and rate_hz > 0):
+            raise ValueError(f"invalid rate: {rate}")
+
+        return Destination((ip, port), rate_hz)
+
+    def is_due(self, now):
+        if self.rate_hz is None:
+            return True
+
+        if now < self.next_send_time:
+            return False
+
+        # Keeping the schedule (instead of restarting it from `now`) gives
+        # the requested average rate even when the input packets do not
+        # arrive exactly when a destination is due. After a pause, instead,
+        # the schedule restarts, to avoid a burst of packets.
+        interval = 1 / self.rate_hz
+        if now - self.next_send_time > interval:
+            self.next_send_time = now + interval
+        else:
+            self.next_send_time += interval
+
+        return True
+
+    def __str__(self):
+        rate = "full rate" if self.rate_hz is None else f"{self.rate_hz:g} Hz"
+        return f"{self.address[0]}:{self.address[1]} ({rate})"
+
+class ForwarderCounters:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.packets_in = 0
+        self.packets_out = 0
+        self.decode_errors = 0
+        self.total_latency_ns = 0
+        self.max_latency_ns = 0
+
+    def add_latency(self, latency_ns):
+        self.total_latency_ns += latency_ns
+        self.max_latency_ns = max(self.max_latency_ns, latency_ns)
+
+    def report(self, elapsed_seconds, destinations):
+        decoded_packets = max(self.packets_in - self.decode_errors, 1)
+        mean_latency_us = self.total_latency_ns / decoded_packets / 1000
+
+        print(
+            f"in {self.packets_in / elapsed_seconds:.0f}/s, " +
+            f"out {self.packets_out / elapsed_seconds:.0f}/s, " +
+            f"decode errors {self.decode_errors / elapsed_seconds:.0f}/s, " +
+            f"latency mean {mean_latency_us:.0f} us, max {self.max_latency_ns / 1000:.0f} us",
+            flush=True
+        )
+
+        for d in destinations:
+            print(f"  {d}: {d.packets_out / elapsed_seconds:.0f}/s", flush=True)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Forwards the DA42 simulator position to HoloAssist"
+    )
+    parser.add_argument("--interface", default=DEFAULT_INTERFACE_IP,
+        help="IP address of the interface on which to join the multicast group")
+    parser.add_argument("--group", default=DEFAULT_RECEIVE_MULTICAST_IP,
+        help="multicast group of the DA42 position packets")
+    parser.add_argument("--port", type=int, default=DEFAULT_RECEIVE_PORT,
+        help="port of the DA42 position packets")
+    parser.add_argument("--destination", action="append", type=Destination.parse,
+        metavar="IP:PORT[@RATE_HZ]",
+        help="where to forward the position (can be repeated), " +
+            f"defaults to {DEFAULT_DESTINATION} at full rate")
+    parser.add_argument("--control-ip", default=DEFAULT_CONTROL_IP,
+        help="IP address on which to receive the control commands")
+    parser.add_argument("--control-port", type=int, default=DEFAULT_CONTROL_PORT,
+        help="port on which to receive the control commands")
+    parser.add_argument("--stats", action="store_true",
+        help="print the packet counters and the forwarding latency every second")
+
+    args = parser.parse_args()
+    if args.destination is None:
+        args.destination = [Destination.parse(DEFAULT_DESTINATION)]
+
+    return args
+
+def open_receive_socket(interface_ip, multicast_ip, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", port))
+
+    # Join the multicast group on the given interface
+    mreq = struct.pack("4s4s", socket.inet_aton(multicast_ip), socket.inet_aton(interface_ip))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+    return sock
+
+def process_control_command(command, destinations):
+    """
+        Returns the reply to send back to whoever sent the command
+    """
+    (verb, _, argument) = command.strip().partition(" ")
 
-while True:
-    #msg_bytes, addr = sock_da42_pos.recvfrom(UDP_RECEIVE_BYTES)
     try:
-        msg_bytes = sock_da42_pos.recv(UDP_RECEIVE_BYTES)
-        [lat_rad, lon_rad] = struct.unpack('<2d', msg_bytes[48:64])
-        [alt_m] = struct.unpack('<1f', msg_bytes[64:68])
-        [theta_rad, phi_rad, psi_rad] = struct.unpack('<3f', msg_bytes[84:96])
-        send_pos_msg=[0, lat_rad/60/180*pi, lon_rad/60/180*pi,alt_m, phi_rad, theta_rad, psi_rad]
-        sock_send_sim_pos.sendto(struct.pack('<B6d',*send_pos_msg), (UDP_SEND_IP, UDP_SEND_PORT))
-    except BlockingIOError:
-            continue
+        if verb == "add":
+            destination = Destination.parse(argument.strip())
+            destinations[:] = [d for d in destinations if d.address != destination.address]
+            destinations.append(destination)
+            return f"added {destination}"
+
+        if verb == "remove":
+            address = Destination.parse(argument.strip()).address
+            destinations[:] = [d for d in destinations if d.address != address]
+            return f"removed {address[0]}:{address[1]}"
+
+        if verb == "list":
+            return "\n".join(str(d) for d in destinations) or "no destinations"
+    except ValueError as e:
+        return f"invalid destination: {argument.strip()} ({e})"
+
+    return f"unknown command: {verb} (commands: add IP:PORT[@RATE_HZ], remove IP:PORT, list)"
+
+def main():
+    args = parse_arguments()
+    destinations = args.destination
+
+    receive_socket = open_receive_socket(args.interface, args.group, args.port)
+    receive_socket.setblocking(False)
+
+    control_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    control_socket.bind((args.control_ip, args.control_port))
+    control_socket.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(receive_socket, selectors.EVENT_READ)
+    selector.register(control_socket, selectors.EVENT_READ)
+
+    send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    receive_buffer = bytearray(RECEIVE_BUFFER_BYTES)
+    send_buffer = bytearray(SIM_POSITION_STRUCT.size)
+
+    counters = ForwarderCounters()
+    last_report = time.monotonic()
+
+    while True:
+        timeout = max(last_report + 1 - time.monotonic(), 0)
+
+        for (key, _) in selector.select(timeout):
+            if key.fileobj is control_socket:
+                (command, sender) = control_socket.recvfrom(RECEIVE_BUFFER_BYTES)
+                reply = process_control_command(command.decode("utf-8", "replace"), destinations)
+                control_socket.sendto((reply + "\n").encode("utf-8"), sender)
+                continue
+
+            try:
+                received_bytes = receive_socket.recv_into(receive_buffer)
+            except BlockingIOError:
+                continue
+
+            received_at_ns = time.perf_counter_ns()
+            counters.packets_in += 1
+
+            if received_bytes < DA42_PACKET_MIN_BYTES:
+                counters.decode_errors += 1
+                continue
+
+            (lat_arcmin, lon_arcmin, alt_m, theta_rad, phi_rad, psi_rad) = \
+                DA42_POSITION_STRUCT.unpack_from(receive_buffer, DA42_POSITION_OFFSET)
+
+            SIM_POSITION_STRUCT.pack_into(
+                send_buffer, 0, 0,
+                lat_arcmin * ARC_MINUTES_TO_RADIANS, lon_arcmin * ARC_MINUTES_TO_RADIANS,
+                alt_m, phi_rad, theta_rad, psi_rad
+            )
+
+            # The packet is encoded once and sent from the same socket to all
+            # the destinations that are due
+            now = time.monotonic()
+            for destination in destinations:
+                if destination.is_due(now):
+                    send_socket.sendto(send_buffer, destination.address)
+                    destination.packets_out += 1
+                    counters.packets_out += 1
+
+            counters.add_latency(time.perf_counter_ns() - received_at_ns)
+
+        now = time.monotonic()
+        if now - last_report >= 1:
+            if args.stats:
+                counters.report(now - last_report, destinations)
+
+            counters.reset()
+            for d in destinations:
+                d.packets_out = 0
+            last_report = now
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+
+from holo_assist_daemon import Daemon, Upstream
+from lib import holo_assist_binary, simple_obj_importer
+from lib import convert_obj_to_geo_fixed_mesh
+from lib.holo_assist_service import HoloAssistService, DEFAULT_MAX_DATAGRAM_BYTES
+from lib.holo_assist_types import Color, Rotation, WGS84Point
+from lib.multiplexer import Multiplexer, command_mesh_ids
+from lib.reactor import Reactor
+
+# Runs `holo_assist_daemon.py` in front of a local receiver (nothing is sent
+# to HoloAssist), with BULK_APPS apps uploading copies of the terrain mesh as
+# fast as the daemon lets them, and one app that sends a small index update
+# every CULLING_PERIOD_SECONDS, like the terrain culling loop. Prints the
+# share of the link each app got, the latency of the small updates (from the
+# app to the receiver), and how many datagrams the daemon merged. Also checks
+# that an app cannot delete a mesh created by another app, and that malformed
+# datagrams are refused without stopping the daemon.
+
+BULK_APPS = 5
+LINK_RATE_BYTES_PER_SECOND = 512 * 1024
+CULLING_PERIOD_SECONDS = 0.05
+DURATION_SECONDS = 5
+CULLING_MESH_ID = "CULLED_TERRAIN"
+
+MALFORMED_DATAGRAMS = [
+    b'{"type": "DAEMON_HELLO", "weight": null}',
+    b'{"type": "DAEMON_HELLO", "weight": 1000000}',
+    b'{"type": "DAEMON_HELLO", "namespace": 5}',
+    b'{"type": "DELETE_MESH", "id": 5}',
+    b"HB" + bytes(3),
+]
+
+terrain_obj = simple_obj_importer.load_obj_line_mesh(os.path.join("data", "3d-terrain.obj"))
+(vertices, indices) = convert_obj_to_geo_fixed_mesh(
+    terrain_obj, Color(0.4, 0.0, 0.0),
+    WGS84Point.from_degrees(47.2651649542, 11.3186282186, 580 + 20),
+    Rotation.from_degrees(0, 0, 0)
+)
+
+class Receiver:
+    """
+        Stands in for HoloAssist: records when the commands of each mesh
+        arrive (unpacking the merged datagrams), and answers the SYNCs
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.ack_address = None
+
+        self.bytes_per_mesh = {}
+        self.culling_arrivals = {}
+        self.datagrams = 0
+        self.bytes = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def __run(self):
+        while self.running:
+            try:
+                packet = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+
+            now = time.monotonic()
+            self.datagrams += 1
+            self.bytes += len(packet)
+
+            if packet[0:2] == holo_assist_binary.BATCH_MAGIC:
+                (_, _, _, commands) = holo_assist_binary.decode_batch_packet(packet)
+            else:
+                commands = [packet]
+
+            for command in commands:
+                self.__process(command, now)
+
+    def __process(self, command: bytes, now):
+        if command[0:1] == b"{":
+            msg = json.loads(command.decode("utf-8"))
+            if msg["type"] == "SYNC":
+                reply = {"type": "SYNC_ACK", "sequence": msg["sequence"]}
+                self.sock.sendto(json.dumps(reply).encode("utf-8"), self.ack_address)
+                return
+
+        if command[0:2] == holo_assist_binary.HEADER_MAGIC:
+            (_, mesh_id, start_index, _, _) = holo_assist_binary.decode_header(command)
+            if mesh_id == CULLING_MESH_ID:
+                # The start index of each update is its number
+                self.culling_arrivals[start_index // 2] = now
+
+        for (_, mesh_id) in command_mesh_ids(command):
+            self.bytes_per_mesh[mesh_id] = self.bytes_per_mesh.get(mesh_id, 0) + len(command)
+
+def connect(daemon_port, name):
+    service = HoloAssistService(
+        "127.0.0.1", daemon_port, binary_encoding=True, acknowledged=True, ack_port=None
+    )
+    service.register_with_daemon(name)
+    return service
+
+def bulk_app(daemon_port, number, stop):
+    service = connect(daemon_port, f"bulk {number}")
+    mesh_id = f"TERRAIN_{number}"
+
+    while not stop.is_set():
+        service.create_mesh(mesh_id)
+        service.add_mesh_vertices(mesh_id, vertices)
+        service.add_mesh_indices(mesh_id, indices)
+        service.commit_mesh_changes(mesh_id)
+
+def culling_app(daemon_port, sent_at, stop):
+    service = connect(daemon_port, "culling")
+    service.create_mesh(CULLING_MESH_ID)
+
+    update = 0
+    while not stop.is_set():
+        sent_at[update] = time.monotonic()
+        service.replace_mesh_indices(CULLING_MESH_ID, 2 * update, [0, 0])
+        service.commit_mesh_changes(CULLING_MESH_ID)
+        update += 1
+        time.sleep(CULLING_PERIOD_SECONDS)
+
+def main():
+    receiver = Receiver()
+
+    ack_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ack_socket.bind(("127.0.0.1", 0))
+    receiver.ack_address = ack_socket.getsockname()
+
+    app_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    app_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    app_socket.bind(("127.0.0.1", 0))
+    daemon_port = app_socket.getsockname()[1]
+
+    reactor = Reactor()
+    upstream = Upstream(
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM), receiver.sock.getsockname(),
+        LINK_RATE_BYTES_PER_SECOND, acknowledged=False
+    )
+    multiplexer = Multiplexer(DEFAULT_MAX_DATAGRAM_BYTES)
+    daemon = Daemon(reactor, app_socket, upstream, multiplexer)
+    reactor.add_udp_socket(app_socket, daemon.on_app_datagram, buffer_size=65536, with_address=True)
+    reactor.add_udp_socket(ack_socket, daemon.on_reply)
+    threading.Thread(target=reactor.run, daemon=True).start()
+
+    stop = threading.Event()
+    sent_at = {}
+    threads = [threading.Thread(target=culling_app, args=(daemon_port, sent_at, stop))]
+    threads += [
+        threading.Thread(target=bulk_app, args=(daemon_port, i, stop)) for i in range(BULK_APPS)
+    ]
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+
+    # Meanwhile, another app tries to delete a mesh that is not its own
+    time.sleep(1)
+    intruder = connect(daemon_port, "intruder")
+    intruder.delete_mesh("TERRAIN_0")
+    intruder.flush()
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        for packet in MALFORMED_DATAGRAMS:
+            sock.sendto(packet, ("127.0.0.1", daemon_port))
+        time.sleep(0.1)
+        malformed_app = multiplexer.apps[sock.getsockname()]
+
+    time.sleep(DURATION_SECONDS - 1)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    seconds = time.monotonic() - start
+    time.sleep(0.5)
+    receiver.running = False
+    reactor.stop()
+
+    print(
+        f"{BULK_APPS} bulk apps and 1 culling app over a " +
+        f"{LINK_RATE_BYTES_PER_SECOND // 1024} KiB/s link, {seconds:.1f} s"
+    )
+    print(
+        f"received {receiver.bytes / seconds / 1024:.0f} KiB/s in " +
+        f"{receiver.datagrams} datagrams, {multiplexer.merged_datagrams} of them merged"
+    )
+    for (mesh_id, count) in sorted(receiver.bytes_per_mesh.items()):
+        print(f"  {mesh_id}: {count / seconds / 1024:.1f} KiB/s")
+
+    latencies = [
+        (receiver.culling_arrivals[u] - sent_at[u]) * 1000
+        for u in sent_at if u in receiver.culling_arrivals
+    ]
+    print(
+        f"culling updates: {len(latencies)} of {len(sent_at)} received, latency " +
+        f"median {statistics.median(latencies):.1f} ms, max {max(latencies):.1f} ms"
+    )
+
+    intruder_app = next(app for app in multiplexer.apps.values() if app.name.startswith("intruder"))
+    assert intruder_app.rejected_datagrams == 1
+    print("delete of another app's mesh: refused")
+
+    assert malformed_app.rejected_datagrams == len(MALFORMED_DATAGRAMS)
+    print(f"{len(MALFORMED_DATAGRAMS)} malformed datagrams: refused")
+
+if __name__ == "__main__":
+    main()
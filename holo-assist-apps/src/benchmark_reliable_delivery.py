@@ -0,0 +1,159 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+from lib import simple_obj_importer
+from lib import convert_obj_to_geo_fixed_mesh
+from lib.holo_assist_service import HoloAssistService
+from lib.holo_assist_types import Color, Rotation, WGS84Point
+from lib.reliable_delivery import ReliableReceiver, decode_frame
+
+# Sends copies of the terrain mesh in reliable mode to a local receiver that drops a
+# fraction of the datagrams, and acknowledges the others once per (simulated)
+# Unity frame, like HoloAssist. Prints how long the upload takes and the
+# counters of the sender and the receiver, and checks that every command
+# arrived exactly once and in order (nothing is sent to HoloAssist). Finally,
+# checks that the commit of an upload is delivered even when it is lost and
+# the app sends nothing after it, but only calls `service.poll()`.
+
+MESH_IDS = [f"INNSBRUCK_TERRAIN_{i}" for i in range(8)]
+FRAME_SECONDS = 1 / 60
+LOSS_RATES = [0, 0.01, 0.05, 0.1, 0.2]
+
+terrain_obj = simple_obj_importer.load_obj_line_mesh(os.path.join("data", "3d-terrain.obj"))
+(vertices, indices) = convert_obj_to_geo_fixed_mesh(
+    terrain_obj, Color(0.4, 0.0, 0.0),
+    WGS84Point.from_degrees(47.2651649542, 11.3186282186, 580 + 20),
+    Rotation.from_degrees(0, 0, 0)
+)
+
+class LossyReceiver:
+    """
+        Applies the reliable frames received on a local UDP port,
+        dropping `loss_rate` of them, and sends the acks to `ack_port`.
+        The first copy of the frames whose command matches `drop_first`
+        is dropped as well.
+    """
+
+    def __init__(self, loss_rate, ack_port, drop_first = None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.setblocking(False)
+        self.ack_address = ("127.0.0.1", ack_port)
+
+        self.loss_rate = loss_rate
+        self.drop_first = drop_first
+        self.dropped_first = set()
+        self.receiver = ReliableReceiver()
+        self.commands = []
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def __run(self):
+        while self.running:
+            while True:
+                try:
+                    packet = self.sock.recv(65536)
+                except BlockingIOError:
+                    break
+
+                if random.random() < self.loss_rate or self.__is_first_to_drop(packet):
+                    self.dropped += 1
+                    continue
+
+                self.commands += self.receiver.receive(packet)
+
+            for (_, ack) in self.receiver.take_acks():
+                self.sock.sendto(json.dumps(ack).encode("utf-8"), self.ack_address)
+
+            time.sleep(FRAME_SECONDS)
+
+    def __is_first_to_drop(self, packet):
+        if self.drop_first is None:
+            return False
+
+        (_, mesh_id, sequence, command) = decode_frame(packet)
+        if not self.drop_first(command) or (mesh_id, sequence) in self.dropped_first:
+            return False
+
+        self.dropped_first.add((mesh_id, sequence))
+        return True
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+print(f"{len(MESH_IDS)} meshes of {len(vertices)} vertices and {len(indices)} indices (JSON)")
+print(
+    f"{'loss':>6}{'seconds':>9}{'KiB/s':>8}{'commands':>10}{'sent':>7}" +
+    f"{'lost':>7}{'retrans':>9}{'dropped':>9}{'dups':>6}{'rto ms':>8}"
+)
+
+for loss_rate in LOSS_RATES:
+    ack_port = free_port()
+    receiver = LossyReceiver(loss_rate, ack_port)
+    service = HoloAssistService(
+        "127.0.0.1", receiver.sock.getsockname()[1],
+        ack_port=ack_port, reliable=True
+    )
+
+    start = time.monotonic()
+    for mesh_id in MESH_IDS:
+        service.create_mesh(mesh_id)
+        service.add_mesh_vertices(mesh_id, vertices)
+        service.add_mesh_indices(mesh_id, indices)
+        service.commit_mesh_changes(mesh_id)
+    service.flush()
+    seconds = time.monotonic() - start
+    receiver.stop()
+
+    sender = service.reliable_sender
+    assert len(receiver.commands) == sender.acked_datagrams
+    assert sender.acked_datagrams == sender.sent_datagrams - sender.retransmitted_datagrams
+    for mesh_id in MESH_IDS:
+        commands = [c for c in map(json.loads, receiver.commands) if c["id"] == mesh_id]
+        assert commands[0]["type"] == "CREATE_MESH"
+        assert commands[-1]["type"] == "COMMIT_MESH_CHANGES"
+        assert sum(len(c.get("vertices", [])) for c in commands) == len(vertices)
+        assert sum(len(c.get("indices", [])) for c in commands) == len(indices)
+
+    print(
+        f"{loss_rate:>6.0%}{seconds:>9.2f}{sender.sent_bytes / seconds / 1024:>8.0f}" +
+        f"{len(receiver.commands):>10}{sender.sent_datagrams:>7}{sender.lost_datagrams:>7}" +
+        f"{sender.retransmitted_datagrams:>9}{receiver.dropped:>9}" +
+        f"{receiver.receiver.duplicate_frames:>6}{sender.retransmit_timeout_seconds * 1000:>8.0f}"
+    )
+
+ack_port = free_port()
+receiver = LossyReceiver(0, ack_port, drop_first=lambda command: b"COMMIT_MESH_CHANGES" in command)
+service = HoloAssistService(
+    "127.0.0.1", receiver.sock.getsockname()[1],
+    ack_port=ack_port, reliable=True
+)
+
+service.create_mesh(MESH_IDS[0])
+service.add_mesh_vertices(MESH_IDS[0], vertices)
+service.add_mesh_indices(MESH_IDS[0], indices)
+service.commit_mesh_changes(MESH_IDS[0])
+
+# Like an idle app in a `Reactor`, which polls instead of flushing
+start = time.monotonic()
+while service.reliable_sender.in_flight_datagrams > 0 and time.monotonic() - start < 5:
+    service.poll()
+    time.sleep(FRAME_SECONDS)
+receiver.stop()
+
+commands = [json.loads(c) for c in receiver.commands]
+assert len(receiver.dropped_first) == 1 and commands[-1]["type"] == "COMMIT_MESH_CHANGES"
+print(f"lost final commit: retransmitted by poll after {(time.monotonic() - start) * 1000:.0f} ms")
@@ -0,0 +1,80 @@
+import sys
+import time
+
+import numpy as np
+
+from lib.line_culling import filter_lines_by_distance
+from lib.index_delta import DEFAULT_MAX_GAP_LINES, changed_line_ranges
+from lib.spatial_index import LineProximityIndex
+
+# Feeds synthetic aircraft positions to the terrain culling and measures how
+# long each update takes, both for the brute-force culling and for the
+# KD-tree based LineProximityIndex. The mesh is a synthetic square grid of terrain lines
+# (about 2 * GRID_SIZE^2 lines), the aircraft flies across it at constant speed.
+# Usage: python src/benchmark_terrain_culling.py [GRID_SIZE]
+
+GRID_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+GRID_SPACING_METERS = 100
+SIMULATOR_RATE_HZ = 100
+GROUND_SPEED_METERS_PER_SECOND = 60
+NUMBER_OF_UPDATES = 500
+MAX_DISTANCE_METERS = 5 * 1852
+
+def make_grid_mesh(size, spacing):
+    (xs, ys) = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+    heights = np.random.default_rng(0).random((size, size)) * 500
+    vertices = np.stack([xs * spacing, ys * spacing, heights], axis=-1).reshape(-1, 3)
+
+    ids = np.arange(size * size).reshape(size, size)
+    horizontal = np.stack([ids[:, :-1].reshape(-1), ids[:, 1:].reshape(-1)], axis=1)
+    vertical = np.stack([ids[:-1, :].reshape(-1), ids[1:, :].reshape(-1)], axis=1)
+
+    return (vertices, np.concatenate([horizontal, vertical]))
+
+(vertices, lines) = make_grid_mesh(GRID_SIZE, GRID_SPACING_METERS)
+
+step = GROUND_SPEED_METERS_PER_SECOND / SIMULATOR_RATE_HZ
+positions = np.array([[i * step, i * step, 1000.0] for i in range(NUMBER_OF_UPDATES)])
+
+start = time.perf_counter()
+index = LineProximityIndex(vertices, lines)
+build_ms = (time.perf_counter() - start) * 1000
+
+print(f"{len(vertices)} vertices, {len(lines)} lines, {NUMBER_OF_UPDATES} updates")
+print(f"index built in {build_ms:.1f} ms")
+
+methods = [
+    ("brute force", lambda p: filter_lines_by_distance(vertices, lines, p, MAX_DISTANCE_METERS)),
+    ("proximity index", lambda p: index.filter_lines(p, MAX_DISTANCE_METERS))
+]
+
+for (name, cull) in methods:
+    timings = []
+    for p in positions:
+        start = time.perf_counter()
+        cull(p)
+        timings.append(time.perf_counter() - start)
+
+    timings_ms = np.array(timings) * 1000
+    print(f"{name}: mean {timings_ms.mean():.2f} ms, " +
+        f"p99 {np.percentile(timings_ms, 99):.2f} ms, max {timings_ms.max():.2f} ms, " +
+        f"sustainable update rate {1000 / np.percentile(timings_ms, 99):.0f} Hz")
+
+print(f"(simulator sends {SIMULATOR_RATE_HZ} Hz)")
+
+# Indices that must be sent after each update, when sending the whole
+# index buffer and when only sending the changed lines
+sent_lines = index.filter_lines(positions[0], MAX_DISTANCE_METERS)
+delta_indices = []
+delta_commands = []
+for p in positions[1:]:
+    filtered_lines = index.filter_lines(p, MAX_DISTANCE_METERS)
+    ranges = changed_line_ranges(sent_lines, filtered_lines, DEFAULT_MAX_GAP_LINES)
+    delta_indices.append(sum(2 * (end - begin) for (begin, end) in ranges))
+    delta_commands.append(len(ranges))
+    sent_lines = filtered_lines
+
+print(f"indices sent per update: full {lines.size}, " +
+    f"delta mean {np.mean(delta_indices):.1f} (max {np.max(delta_indices)}) " +
+    f"in {np.mean(delta_commands):.1f} commands, " +
+    f"{np.mean(np.array(delta_indices) == 0) * 100:.0f}% of the updates send nothing")
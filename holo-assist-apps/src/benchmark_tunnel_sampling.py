@@ -0,0 +1,65 @@
+import sys
+import time
+
+import numpy as np
+import scipy.interpolate
+
+from innsbruck_approach import read_csv, fit_spline
+from lib.curve_sampling import adaptive_spline_parameters
+
+# Compares the uniform and the adaptive placement of the slices of the spline
+# tunnel of an approach procedure: for each, the number of slices (4 vertices
+# each) and the visual error, measured against a very finely sampled spline:
+# the largest distance between the spline and the lines joining the slices,
+# the largest turn of the spline between two slices and the largest spacing.
+# Usage: python src/benchmark_tunnel_sampling.py [procedure.csv]
+
+REFERENCE_SAMPLES = 200001
+
+csv_points = read_csv(sys.argv[1]) if len(sys.argv) > 1 else read_csv()
+tck = fit_spline(csv_points)
+
+reference_u = np.linspace(0, 1, REFERENCE_SAMPLES)
+reference_points = np.stack(scipy.interpolate.splev(reference_u, tck), axis=-1)
+
+def unit_tangents(u):
+    d1 = np.stack(scipy.interpolate.splev(u, tck, der=1), axis=-1)
+    return d1 / np.linalg.norm(d1, axis=1, keepdims=True)
+
+def report(name, u):
+    points = np.stack(scipy.interpolate.splev(u, tck), axis=-1)
+
+    # Distance of each reference point to the line joining the
+    # slices before and after it
+    segment = np.clip(np.searchsorted(u, reference_u, side="right") - 1, 0, len(u) - 2)
+    (a, b) = (points[segment], points[segment + 1])
+    ab = b - a
+    squared_lengths = np.maximum(np.einsum("ij,ij->i", ab, ab), 1e-9)
+    t = np.einsum("ij,ij->i", reference_points - a, ab) / squared_lengths
+    closest = a + np.clip(t, 0, 1)[:, np.newaxis] * ab
+    chord_error = np.max(np.linalg.norm(reference_points - closest, axis=1))
+
+    tangents = unit_tangents(u)
+    cosines = np.einsum("ij,ij->i", tangents[1:], tangents[:-1])
+    turns = np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+    spacing = np.max(np.linalg.norm(np.diff(points, axis=0), axis=1))
+
+    print(
+        f"{name:<32} {len(u):5} slices {4 * len(u):6} vertices  " +
+        f"chord error {chord_error:6.1f} m  turn {np.max(turns):6.1f} deg  spacing {spacing:6.0f} m"
+    )
+
+for samples in [62, 125, 250, 1000]:
+    report("uniform", np.linspace(0, 1, samples))
+
+for (turn_degrees, chord_error_meters) in [(10, 20), (5, 5), (3, 2), (1, 0.5)]:
+    start = time.perf_counter()
+    u = adaptive_spline_parameters(tck, 10000, np.radians(turn_degrees), chord_error_meters)
+    elapsed = time.perf_counter() - start
+    report(f"adaptive {turn_degrees} deg {chord_error_meters} m ({1e3 * elapsed:.0f} ms)", u)
+
+for samples in [62, 125]:
+    report(
+        f"adaptive 3 deg 2 m, budget {samples}",
+        adaptive_spline_parameters(tck, samples, np.radians(3), 2)
+    )
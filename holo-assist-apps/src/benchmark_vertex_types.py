@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from lib.holo_assist_types import Color, Rotation, Vector3, WGS84Point
+from lib.holo_assist_types import GeoFixedVertex, GeoFixedVertexBuffer
+
+# Construction time and memory of 100k geo-fixed vertices, built the way
+# OBJ meshes are built: every vertex shares origin, color and rotation and
+# has its own local position.
+# The "__dict__" row is the baseline: the plain classes holo_assist_types used
+# before they were NamedTuples. Only Vector3 and GeoFixedVertex are copied, as
+# the origin, color and rotation are shared and cost nothing per vertex.
+
+NUMBER_OF_VERTICES = 100_000
+
+origin = WGS84Point.from_degrees(47.2651649542, 11.3186282186, 600)
+color = Color(0.4, 0.0, 0.0)
+rotation = Rotation(0, 0, 0)
+positions = (np.random.default_rng(0).random((NUMBER_OF_VERTICES, 3)) * 5000).tolist()
+
+class DictVector3:
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+class DictGeoFixedVertex:
+    def __init__(self, origin_wgs, vertex_color, local_position, local_rotation):
+        self.origin_wgs = origin_wgs
+        self.color = vertex_color
+        self.local_position = local_position
+        self.local_rotation = local_rotation
+
+def build_dict_objects():
+    return [
+        DictGeoFixedVertex(origin, color, DictVector3(x, y, z), rotation)
+        for (x, y, z) in positions
+    ]
+
+def build_objects():
+    return [GeoFixedVertex(origin, color, Vector3(x, y, z), rotation) for (x, y, z) in positions]
+
+def build_buffer():
+    return GeoFixedVertexBuffer.from_arrays(
+        [origin.latitude_rad, origin.longitude_rad, origin.altitude_meters],
+        [color.red, color.green, color.blue],
+        positions,
+        [rotation.localx_radians, rotation.localy_radians, rotation.localz_radians]
+    )
+
+print(f"{NUMBER_OF_VERTICES} vertices")
+print(f"{'representation':<28}{'ms':>10}{'bytes/vertex':>15}")
+
+for (name, build) in [
+    ("GeoFixedVertex (__dict__)", build_dict_objects),
+    ("GeoFixedVertex", build_objects),
+    ("GeoFixedVertexBuffer", build_buffer),
+]:
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+
+    # Memory is measured in a separate run, as tracing slows down allocations
+    tracemalloc.start()
+    result = build()
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    print(f"{name:<28}{elapsed * 1000:>10.1f}{size / NUMBER_OF_VERTICES:>15.1f}")
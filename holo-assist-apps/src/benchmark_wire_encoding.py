@@ -0,0 +1,149 @@
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+import timeit
+
+from lib import simple_obj_importer, holo_assist_binary
+from lib import convert_obj_to_geo_fixed_mesh
+from lib.holo_assist_service import HoloAssistService
+from lib.holo_assist_types import Color, Rotation, WGS84Point
+from lib.tunnel_builder import TunnelBuilder
+from lib.tunnel_commands import read_tunnel_commands
+
+# Compares size and encoding time of the JSON and binary encodings
+# of the terrain mesh vertices and indices. Then compares the bytes that
+# HoloAssistService actually sends for the vertices of the terrain and of
+# the test tunnels, with and without shared vertex attributes, to a local
+# socket (nothing is sent to HoloAssist).
+
+MESH_ID = "INNSBRUCK_TERRAIN"
+REPETITIONS = 20
+
+terrain_obj = simple_obj_importer.load_obj_line_mesh(os.path.join("data", "3d-terrain.obj"))
+(vertices, indices) = convert_obj_to_geo_fixed_mesh(
+    terrain_obj, Color(0.4, 0.0, 0.0),
+    WGS84Point.from_degrees(47.2651649542, 11.3186282186, 580 + 20),
+    Rotation.from_degrees(0, 0, 0)
+)
+
+def encode_vertices_json():
+    return json.dumps({
+        "type": "SET_MESH_VERTICES",
+        "id": MESH_ID,
+        "startIndex": None,
+        "vertices": vertices.prepare_for_json()
+    }).encode("utf-8")
+
+def encode_indices_json():
+    return json.dumps({
+        "type": "SET_MESH_INDICES",
+        "id": MESH_ID,
+        "startIndex": None,
+        "indices": indices
+    }).encode("utf-8")
+
+def encode_vertices_binary():
+    return holo_assist_binary.encode_geo_fixed_vertices(MESH_ID, None, vertices)
+
+def encode_indices_binary():
+    return holo_assist_binary.encode_indices(
+        holo_assist_binary.GEO_FIXED_INDICES_KIND, MESH_ID, None, indices
+    )
+
+print(f"{len(vertices)} vertices, {len(indices)} indices, {REPETITIONS} repetitions")
+print(f"{'payload':<20}{'bytes':>10}{'bytes/elem':>12}{'ms/encode':>12}")
+
+for (name, encode, n) in [
+    ("vertices (JSON)", encode_vertices_json, len(vertices)),
+    ("vertices (binary)", encode_vertices_binary, len(vertices)),
+    ("indices (JSON)", encode_indices_json, len(indices)),
+    ("indices (binary)", encode_indices_binary, len(indices)),
+]:
+    size = len(encode())
+    seconds = timeit.timeit(encode, number=REPETITIONS) / REPETITIONS
+    print(f"{name:<20}{size:>10}{size / n:>12.1f}{seconds * 1000:>12.3f}")
+
+class ByteCounter:
+    """
+        Receives (and counts) everything sent to a local UDP port
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.datagrams = 0
+        self.bytes = 0
+        threading.Thread(target=self.__receive, daemon=True).start()
+
+    def __receive(self):
+        while True:
+            try:
+                packet = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            self.datagrams += 1
+            self.bytes += len(packet)
+
+    def measure(self, send):
+        (datagrams, size) = (self.datagrams, self.bytes)
+        send()
+        time.sleep(0.3)
+        return (self.datagrams - datagrams, self.bytes - size)
+
+class TunnelVerticesOnly:
+    """
+        Passes the vertices of the test tunnels, which `TunnelBuilder` sends
+        in batches, to a `HoloAssistService` one command at a time, and
+        drops every other command
+    """
+
+    def __init__(self, service, mesh_id = None):
+        self.service = service
+        self.mesh_id = mesh_id
+
+    def batch(self, mesh_id, _all_or_nothing = True):
+        return contextlib.nullcontext(TunnelVerticesOnly(self.service, mesh_id))
+
+    def add_mesh_vertices(self, vertices):
+        self.service.add_mesh_vertices(self.mesh_id, vertices)
+
+    def replace_mesh_vertices(self, start_index, vertices):
+        self.service.replace_mesh_vertices(self.mesh_id, start_index, vertices)
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+with open(os.path.join("data", "test-tunnel-for-tunnel-api.csv"), encoding="UTF-8") as file:
+    tunnel_commands = list(read_tunnel_commands(file))
+
+def send_tunnel_vertices(service):
+    builder = TunnelBuilder(TunnelVerticesOnly(service))
+    for cmd in tunnel_commands:
+        builder.apply(cmd)
+    builder.flush()
+
+counter = ByteCounter()
+
+print()
+print(f"{'vertices sent':<36}{'datagrams':>10}{'bytes':>10}{'bytes/vertex':>14}")
+
+for (mesh, send, n) in [
+    ("terrain", lambda service: service.add_mesh_vertices(MESH_ID, vertices), len(vertices)),
+    ("tunnels", send_tunnel_vertices, sum(4 for c in tunnel_commands if c.setting in [0, 1, 2])),
+]:
+    for binary_encoding in [False, True]:
+        for shared in [False, True]:
+            service = HoloAssistService(
+                "127.0.0.1", counter.sock.getsockname()[1], binary_encoding,
+                send_rate_bytes_per_second=32 * 1024 * 1024, shared_vertex_attributes=shared
+            )
+            (datagrams, size) = counter.measure(lambda: send(service))
+
+            encoding = 'binary' if binary_encoding else 'JSON'
+            name = f"{mesh} ({encoding}{', shared' if shared else ''})"
+            print(f"{name:<36}{datagrams:>10}{size:>10}{size / n:>14.1f}")
@@ -1,8 +1,8 @@
-from time import sleep
-from lib import prepare_holo_assist_instance
-from lib.holo_assist_types import Vector3, Color, ColoredVertex, Rotation
+import asyncio
 
-service = prepare_holo_assist_instance()
+from lib import prepare_async_holo_assist_instance
+from lib.async_holo_assist_service import ainput
+from lib.holo_assist_types import Vector3, Color, ColoredVertex, Rotation
 
 vertices = [
     Vector3(0.494726, 0.368722, 1.003500),
@@ -22,46 +22,55 @@ colored_vertices = [ColoredVertex(point, color) for (point, color) in zip(vertic
 indices = [2, 0, 0, 1, 1, 3, 3, 2]
 MESH_ID = "GEAR_LEVER"
 
-print("Creating mesh...")
-service = prepare_holo_assist_instance()
-service.plane_fixed_create_mesh(MESH_ID)
-service.plane_fixed_add_mesh_vertices(MESH_ID, colored_vertices)
-service.plane_fixed_add_mesh_indices(MESH_ID, indices)
-service.plane_fixed_commit_mesh_changes(MESH_ID)
-service.plane_fixed_activate_mesh(MESH_ID)
-
-input("Press any key to continue...")
-
-print("Mangling indices...")
-weird_indices = [0, 1, 1, 3, 3, 2, 2, 0]
-service.plane_fixed_replace_mesh_indices(MESH_ID, 0, weird_indices)
-service.plane_fixed_commit_mesh_changes(MESH_ID)
-
-input("Press any key to continue...")
-
-print("Rotating mesh...")
-for i in range (0, 30):
-    service.plane_fixed_update_mesh_origin(
-        MESH_ID, origin_rotation=Rotation(0, 0, i)
-    )
-    sleep(0.1)
-for i in range (30, 0, -1):
-    service.plane_fixed_update_mesh_origin(
-        MESH_ID, origin_rotation=Rotation(0, 0, i)
-    )
-    sleep(0.1)
-
-input("Press any key to continue...")
-
-print("Translating mesh...")
-for i in range (0, 10):
-    service.plane_fixed_update_mesh_origin(
-        MESH_ID, origin_position=Vector3(0, 0, -i / 10.0)
-    )
-    sleep(0.5)
-
-input("Press any key to continue...")
-
-print("Removing mesh...")
-service.deactivate_mesh(MESH_ID)
-service.delete_mesh(MESH_ID)
+# The animations are coroutines: they could run while the same event
+# loop handles the simulator (see `listen_udp`) or other meshes
+
+async def rotate(service):
+    for i in list(range(0, 30)) + list(range(30, 0, -1)):
+        await service.plane_fixed_update_mesh_origin(
+            MESH_ID, origin_rotation=Rotation(0, 0, i)
+        )
+        await asyncio.sleep(0.1)
+
+async def translate(service):
+    for i in range (0, 10):
+        await service.plane_fixed_update_mesh_origin(
+            MESH_ID, origin_position=Vector3(0, 0, -i / 10.0)
+        )
+        await asyncio.sleep(0.5)
+
+async def main():
+    service = await prepare_async_holo_assist_instance()
+
+    print("Creating mesh...")
+    await service.plane_fixed_create_mesh(MESH_ID)
+    await service.plane_fixed_add_mesh_vertices(MESH_ID, colored_vertices)
+    await service.plane_fixed_add_mesh_indices(MESH_ID, indices)
+    await service.plane_fixed_commit_mesh_changes(MESH_ID)
+    await service.plane_fixed_activate_mesh(MESH_ID)
+
+    await ainput("Press any key to continue...")
+
+    print("Mangling indices...")
+    weird_indices = [0, 1, 1, 3, 3, 2, 2, 0]
+    await service.plane_fixed_replace_mesh_indices(MESH_ID, 0, weird_indices)
+    await service.plane_fixed_commit_mesh_changes(MESH_ID)
+
+    await ainput("Press any key to continue...")
+
+    print("Rotating mesh...")
+    await rotate(service)
+
+    await ainput("Press any key to continue...")
+
+    print("Translating mesh...")
+    await translate(service)
+
+    await ainput("Press any key to continue...")
+
+    print("Removing mesh...")
+    await service.plane_fixed_deactivate_mesh(MESH_ID)
+    await service.plane_fixed_delete_mesh(MESH_ID)
+    service.close()
+
+asyncio.run(main())
@@ -0,0 +1,92 @@
+import sys
+import time
+
+import numpy as np
+
+from lib import geodesy
+
+# Compares the closed-form WGS84 <-> ECEF conversions of lib/geodesy with
+# pyproj, on random points all around the globe (from the bottom of the
+# oceans to well above cruise altitude) and near the poles and the equator.
+# Exits with a non-zero status when any error is above the tolerance.
+# The inverse conversion of PROJ is itself approximate (about 1e-5 m), so
+# the round trip ECEF -> WGS84 of the original points is checked as well.
+# pyproj is not needed by the apps, only by this check:
+# pip install -r requirements-check.txt
+# Usage: python src/check_geodesy_accuracy.py
+
+NUMBER_OF_POINTS = 1_000_000
+ECEF_TOLERANCE_METERS = 1e-6
+ALTITUDE_TOLERANCE_METERS = 1e-4
+ANGLE_TOLERANCE_RADIANS = 1e-11
+ROUND_TRIP_ALTITUDE_TOLERANCE_METERS = 1e-6
+ROUND_TRIP_ANGLE_TOLERANCE_RADIANS = 1e-13
+
+try:
+    import pyproj
+except ImportError:
+    print("pyproj is not installed, nothing to compare with")
+    sys.exit(0)
+
+rng = np.random.default_rng(0)
+points_wgs = np.stack([
+    np.arcsin(rng.uniform(-1, 1, NUMBER_OF_POINTS)),
+    rng.uniform(-np.pi, np.pi, NUMBER_OF_POINTS),
+    rng.uniform(-11_000, 50_000, NUMBER_OF_POINTS)
+], axis=-1)
+
+# Corner cases: poles, equator, antimeridian
+points_wgs[0:6] = [
+    [np.pi / 2, 0, 0], [-np.pi / 2, 1, 1000], [0, 0, 0],
+    [0, np.pi, 0], [0, -np.pi / 2, -100], [np.pi / 2 - 1e-9, 0, 10]
+]
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return (result, (time.perf_counter() - start) * 1000)
+
+(ecef, numpy_forward_ms) = timed(geodesy.wgs84_to_ecef, points_wgs)
+(ecef_pyproj, pyproj_forward_ms) = timed(geodesy.wgs84_to_ecef, points_wgs, use_pyproj=True)
+
+(wgs, numpy_inverse_ms) = timed(geodesy.ecef_to_wgs84, ecef_pyproj)
+(wgs_pyproj, pyproj_inverse_ms) = timed(geodesy.ecef_to_wgs84, ecef_pyproj, use_pyproj=True)
+
+def longitude_errors(a, b):
+    errors = np.abs(np.angle(np.exp(1j * (a[:, 1] - b[:, 1]))))
+    # Longitude is undefined at the poles
+    errors[np.abs(np.abs(b[:, 0]) - np.pi / 2) < 1e-12] = 0
+    return errors
+
+errors = [
+    ("WGS84 -> ECEF [m]", np.linalg.norm(ecef - ecef_pyproj, axis=-1), ECEF_TOLERANCE_METERS),
+    ("ECEF -> latitude [rad]", np.abs(wgs[:, 0] - wgs_pyproj[:, 0]), ANGLE_TOLERANCE_RADIANS),
+    ("ECEF -> longitude [rad]", longitude_errors(wgs, wgs_pyproj), ANGLE_TOLERANCE_RADIANS),
+    ("ECEF -> altitude [m]", np.abs(wgs[:, 2] - wgs_pyproj[:, 2]), ALTITUDE_TOLERANCE_METERS),
+    (
+        "round trip latitude [rad]", np.abs(wgs[:, 0] - points_wgs[:, 0]),
+        ROUND_TRIP_ANGLE_TOLERANCE_RADIANS
+    ),
+    (
+        "round trip longitude [rad]", longitude_errors(wgs, points_wgs),
+        ROUND_TRIP_ANGLE_TOLERANCE_RADIANS
+    ),
+    (
+        "round trip altitude [m]", np.abs(wgs[:, 2] - points_wgs[:, 2]),
+        ROUND_TRIP_ALTITUDE_TOLERANCE_METERS
+    )
+]
+
+print(f"{NUMBER_OF_POINTS} points, pyproj {pyproj.__version__}")
+print(f"{'conversion':<28}{'max error':>12}{'tolerance':>12}")
+
+passed = True
+for (name, error, tolerance) in errors:
+    passed = passed and bool(np.max(error) <= tolerance)
+    print(f"{name:<28}{np.max(error):>12.2e}{tolerance:>12.0e}")
+
+print(f"WGS84 -> ECEF: numpy {numpy_forward_ms:.0f} ms, pyproj {pyproj_forward_ms:.0f} ms")
+print(f"ECEF -> WGS84: numpy {numpy_inverse_ms:.0f} ms, pyproj {pyproj_inverse_ms:.0f} ms")
+print("OK" if passed else "FAILED")
+
+sys.exit(0 if passed else 1)
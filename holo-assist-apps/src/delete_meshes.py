@@ -1,7 +1,6 @@
-import time
 from lib import prepare_holo_assist_instance
 
-service = prepare_holo_assist_instance()
+service = prepare_holo_assist_instance(paced=True)
 
 MESH_IDS = [
     "RPN Y RWY 08 - Line",
@@ -29,4 +28,5 @@ MESH_IDS = [
 
 for mesh_id in MESH_IDS:
     service.delete_mesh(mesh_id)
-    time.sleep(0.3)
\ No newline at end of file
+
+service.flush()
\ No newline at end of file
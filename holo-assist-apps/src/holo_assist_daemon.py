@@ -0,0 +1,285 @@
+import argparse
+import json
+import socket
+import time
+
+from lib import HOLOLENS_ADDRESS, UNITY_ADDRESS
+from lib.flow_control import TokenBucket, DEFAULT_ACK_PORT, DEFAULT_BURST_BYTES
+from lib.flow_control import DEFAULT_RATE_BYTES_PER_SECOND, RATE_INCREASE_BYTES_PER_SECOND
+from lib.flow_control import DEFAULT_SYNC_EVERY_DATAGRAMS, DEFAULT_ACK_TIMEOUT_SECONDS
+from lib.flow_control import MIN_RATE_BYTES_PER_SECOND, MAX_RATE_BYTES_PER_SECOND
+from lib.holo_assist_service import DEFAULT_MAX_DATAGRAM_BYTES
+from lib.multiplexer import Multiplexer, DEFAULT_DAEMON_PORT, DEFAULT_MAX_QUEUED_BYTES
+from lib.reactor import Reactor
+
+# Daemon in front of HoloAssist, to run several apps at the same time: the
+# apps send their commands to the daemon (on localhost), which forwards them
+# to HoloAssist over a single paced connection, sharing its bandwidth fairly
+# between the apps and merging their small commands (see `multiplexer`).
+# Usage: python src/holo_assist_daemon.py [--unity] [--ack] [--rate KIB/S]
+# then run the apps with --daemon (which implies --ack between the app and
+# the daemon, and replaces --unity), e.g.
+#
+#     python src/holo_assist_daemon.py --unity --ack
+#     python src/innsbruck_terrain.py --daemon
+#     python src/tunnel_generator.py --daemon --listen 53950
+#
+# --rate is the total rate of all the apps together: without --ack it is
+# fixed, with --ack it is the starting rate, then adapted to HoloAssist.
+
+# Seconds between two checks for apps that went idle
+EXPIRE_INTERVAL_SECONDS = 10
+
+class Upstream:
+    """
+        The connection to HoloAssist. Like `PacedSender`, but it never
+        blocks: `wait_seconds` tells how long to wait before the next
+        datagram, so that the daemon keeps receiving from the apps.
+    """
+
+    def __init__(self, sock: socket.socket, address, rate_bytes_per_second, acknowledged):
+        self.__socket = sock
+        self.__address = address
+        self.bucket = TokenBucket(rate_bytes_per_second, DEFAULT_BURST_BYTES)
+
+        self.acknowledged = acknowledged
+        self.__datagrams_since_sync = 0
+        self.__next_sequence = 0
+        # (sequence, time sent) of the SYNC whose ack is awaited, if any
+        self.__awaited_sync = None
+
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.ack_timeouts = 0
+        self.round_trip_seconds = None
+
+    def wait_seconds(self, now):
+        """
+            0 when the next datagram can be reserved in the bucket, otherwise
+            how long to wait for the ack of the previous window
+        """
+        if not self.acknowledged or self.__datagrams_since_sync < DEFAULT_SYNC_EVERY_DATAGRAMS:
+            return 0
+
+        if self.__awaited_sync is not None:
+            (_, sent_at) = self.__awaited_sync
+            if now < sent_at + DEFAULT_ACK_TIMEOUT_SECONDS:
+                return sent_at + DEFAULT_ACK_TIMEOUT_SECONDS - now
+
+            self.ack_timeouts += 1
+            self.bucket.rate_per_second = max(
+                self.bucket.rate_per_second / 2, MIN_RATE_BYTES_PER_SECOND
+            )
+
+        # The SYNC itself is tiny, and not worth waiting for
+        self.__awaited_sync = (self.__next_sequence, now)
+        self.__next_sequence += 1
+        self.__datagrams_since_sync = 0
+
+        msg = json.dumps({"type": "SYNC", "sequence": self.__awaited_sync[0]}).encode("utf-8")
+        self.bucket.reserve(len(msg))
+        self.__send(msg)
+        return 0
+
+    def send(self, data: bytes):
+        self.__send(data)
+        self.__datagrams_since_sync += 1
+
+    def on_reply(self, reply: bytes):
+        # HoloAssist also sends plain-text debug messages on the same channel
+        try:
+            msg = json.loads(reply.decode("utf-8"))
+        except ValueError:
+            return
+
+        if not isinstance(msg, dict) or msg.get("type") != "SYNC_ACK":
+            return
+        if self.__awaited_sync is None:
+            return
+
+        # An ack for a later SYNC also acknowledges the previous ones
+        (sequence, sent_at) = self.__awaited_sync
+        if msg.get("sequence", -1) >= sequence:
+            self.round_trip_seconds = time.monotonic() - sent_at
+            self.bucket.rate_per_second = min(
+                self.bucket.rate_per_second + RATE_INCREASE_BYTES_PER_SECOND,
+                MAX_RATE_BYTES_PER_SECOND
+            )
+            self.__awaited_sync = None
+
+    def __send(self, data: bytes):
+        self.__socket.sendto(data, self.__address)
+        self.sent_datagrams += 1
+        self.sent_bytes += len(data)
+
+class Daemon:
+    def __init__(
+        self, reactor: Reactor, app_socket: socket.socket,
+        upstream: Upstream, multiplexer: Multiplexer
+    ):
+        self.reactor = reactor
+        self.app_socket = app_socket
+        self.upstream = upstream
+        self.multiplexer = multiplexer
+
+        # The next datagram, already reserved in the token bucket: (datagram,
+        # time it can be sent, replies to send to the apps once it is sent)
+        self.__pending = None
+        self.__timer = None
+        # (app, reason) already printed, each is only printed once
+        self.__reported = set()
+
+    def on_app_datagram(self, packet: bytes, address):
+        reason = self.multiplexer.receive(packet, address)
+        if reason is not None:
+            app = self.multiplexer.apps[address]
+            if (app, reason) not in self.__reported:
+                self.__reported.add((app, reason))
+                print(f"{app.name}: datagram refused, {reason}", flush=True)
+
+        self.pump()
+
+    def on_reply(self, reply: bytes):
+        self.upstream.on_reply(reply)
+
+        # The ack may end the wait early
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        self.pump()
+
+    def pump(self):
+        """
+            Sends what can be sent now, and sets a timer for the rest
+        """
+        if self.__timer is not None:
+            return
+
+        now = time.monotonic()
+
+        while True:
+            wait_seconds = self.upstream.wait_seconds(now)
+            if wait_seconds > 0:
+                self.__wake_up_in(wait_seconds)
+                return
+
+            if self.__pending is None:
+                data = self.multiplexer.next_datagram()
+                replies = self.multiplexer.take_replies()
+                if data is None:
+                    self.__send_replies(replies)
+                    return
+                self.__pending = (data, now + self.upstream.bucket.reserve(len(data)), replies)
+
+            (data, send_at, replies) = self.__pending
+            if send_at > now:
+                self.__wake_up_in(send_at - now)
+                return
+
+            self.upstream.send(data)
+            self.__send_replies(replies)
+            self.__pending = None
+            now = time.monotonic()
+
+    def expire_apps(self):
+        for app in self.multiplexer.expire():
+            self.__reported = {r for r in self.__reported if r[0] is not app}
+            print(f"{app.name}: idle, its meshes are released", flush=True)
+
+    def print_stats(self, interval_seconds, previous):
+        """
+            Prints the rate of each app since the previous call, `previous`
+            being the bytes each app had forwarded then. Returns the new one.
+        """
+        current = {app: app.forwarded_bytes for app in self.multiplexer.apps.values()}
+        active = [
+            app for app in current
+            if current[app] != previous.get(app, 0) or len(app.queue) > 0
+        ]
+        if len(active) == 0:
+            return current
+
+        print(
+            f"{self.upstream.sent_datagrams} datagrams sent " +
+            f"({self.multiplexer.merged_datagrams} merged), " +
+            f"{self.upstream.bucket.rate_per_second / 1024:.0f} KiB/s allowed, " +
+            f"{self.upstream.ack_timeouts} ack timeouts", flush=True
+        )
+        for app in active:
+            rate = (current[app] - previous.get(app, 0)) / interval_seconds / 1024
+            print(
+                f"  {app.name}: {rate:.0f} KiB/s, {app.queued_bytes} bytes queued, " +
+                f"{app.rejected_datagrams} refused, {app.dropped_datagrams} dropped" +
+                ("" if app.namespace is None else f", namespace {app.namespace}"), flush=True
+            )
+
+        return current
+
+    def __wake_up_in(self, seconds):
+        def wake_up():
+            self.__timer = None
+            self.pump()
+
+        self.__timer = self.reactor.add_timer(seconds, wake_up, repeat=False)
+
+    def __send_replies(self, replies):
+        for (address, reply) in replies:
+            self.app_socket.sendto(reply, address)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Shares the connection to HoloAssist between several apps"
+    )
+    parser.add_argument("--unity", action="store_true",
+        help="forward to a local Unity instance instead of the HoloLens")
+    parser.add_argument("--port", type=int, default=DEFAULT_DAEMON_PORT,
+        help="localhost port on which the apps send their commands")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_BYTES_PER_SECOND / 1024,
+        help="KiB/s sent to HoloAssist, by all the apps together")
+    parser.add_argument("--ack", action="store_true",
+        help="adapt the rate to the acknowledgments of HoloAssist")
+    parser.add_argument("--ack-port", type=int, default=DEFAULT_ACK_PORT)
+    parser.add_argument("--max-queued-bytes", type=int, default=DEFAULT_MAX_QUEUED_BYTES,
+        help="datagrams of an app are dropped while it has this much waiting")
+    parser.add_argument("--stats-interval", type=float, default=5,
+        help="seconds between two prints of the rate of each app")
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    upstream_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    upstream = Upstream(
+        upstream_socket, UNITY_ADDRESS if args.unity else HOLOLENS_ADDRESS,
+        args.rate * 1024, args.ack
+    )
+
+    # The apps may send faster than their share while their rate adapts
+    app_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    app_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    app_socket.bind(("127.0.0.1", args.port))
+
+    reactor = Reactor()
+    multiplexer = Multiplexer(DEFAULT_MAX_DATAGRAM_BYTES, max_queued_bytes=args.max_queued_bytes)
+    daemon = Daemon(reactor, app_socket, upstream, multiplexer)
+
+    reactor.add_udp_socket(app_socket, daemon.on_app_datagram, buffer_size=65536, with_address=True)
+    if args.ack:
+        reactor.add_udp_listener(("", args.ack_port), daemon.on_reply)
+    reactor.add_timer(EXPIRE_INTERVAL_SECONDS, daemon.expire_apps)
+
+    forwarded_bytes = {}
+    def print_stats():
+        nonlocal forwarded_bytes
+        forwarded_bytes = daemon.print_stats(args.stats_interval, forwarded_bytes)
+    reactor.add_timer(args.stats_interval, print_stats)
+
+    print(f"Listening for apps on 127.0.0.1:{args.port}", flush=True)
+    try:
+        reactor.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import collections
+import json
+import random
+import socket
+import time
+
+from lib import holo_assist_binary
+from lib.reliable_delivery import ReliableReceiver
+
+# Stand-in for HoloAssist, to test apps (and their pacing) without a headset.
+# It receives the same UDP API, keeps track of how many vertices and indices
+# each mesh has, and answers SYNC commands with SYNC_ACK like HoloAssist does.
+#
+# Like in Unity, commands are processed once per frame, and processing each
+# command takes some (simulated) time: when the app sends faster than this,
+# the receive buffer fills up and the datagrams that do not fit are dropped.
+# Usage: python src/holo_assist_stand_in.py [--frame-rate 60] [...]
+# then run any app with --unity (and --ack to test acknowledged pacing).
+# Like HoloAssist, the acks are sent back to the host each datagram came
+# from, on --reply-port (HoloAssist's SendUdpPort).
+#
+# Batches are applied like HoloAssist does: all at once, when their last
+# missing packet arrives. Incomplete batches are dropped after a while.
+# Reliable frames (see `reliable_delivery`) are acknowledged once per frame,
+# and --loss-rate drops a fraction of the datagrams to test retransmissions.
+
+# Incomplete batches older than this are dropped
+BATCH_TIMEOUT_SECONDS = 5
+# Ids of the last batches applied, so that their duplicates are ignored
+APPLIED_BATCH_HISTORY = 256
+
+BINARY_KIND_NAMES = {
+    holo_assist_binary.GEO_FIXED_VERTICES_KIND: ("SET_MESH_VERTICES", "vertices"),
+    holo_assist_binary.GEO_FIXED_INDICES_KIND: ("SET_MESH_INDICES", "indices"),
+    holo_assist_binary.PLANE_FIXED_VERTICES_KIND: ("PF_SET_MESH_VERTICES", "vertices"),
+    holo_assist_binary.PLANE_FIXED_INDICES_KIND: ("PF_SET_MESH_INDICES", "indices"),
+    holo_assist_binary.GEO_FIXED_VERTEX_OFFSETS_KIND: ("SET_MESH_VERTEX_OFFSETS", "vertices"),
+}
+
+class StandInMesh:
+    def __init__(self):
+        self.vertices = 0
+        self.indices = 0
+
+    def set_elements(self, field, start_index, count):
+        current = getattr(self, field)
+
+        if start_index is None:
+            setattr(self, field, current + count)
+        else:
+            setattr(self, field, max(current, start_index + count))
+
+class StandIn:
+    def __init__(self, reply_socket, reply_port):
+        self.reply_socket = reply_socket
+        self.reply_port = reply_port
+        # Host of the datagram being processed
+        self.__source_host = None
+        self.meshes = {}
+
+        self.datagrams = 0
+        self.bytes = 0
+        self.syncs = 0
+        self.elements = 0
+
+        self.total_datagrams = 0
+        self.total_bytes = 0
+
+        # Batch id -> (time of the first packet received, commands of each packet)
+        self.batches = {}
+        self.applied_batches = collections.deque(maxlen=APPLIED_BATCH_HISTORY)
+        self.dropped_batches = 0
+
+        self.reliable = ReliableReceiver()
+
+    def process(self, packet: bytes, source_host):
+        """
+            Returns the number of elements (vertices, indices) in the commands applied
+        """
+        self.__source_host = source_host
+        self.datagrams += 1
+        self.bytes += len(packet)
+        self.total_datagrams += 1
+        self.total_bytes += len(packet)
+
+        return self.__dispatch(packet)
+
+    def send_acks(self):
+        for (host, ack) in self.reliable.take_acks():
+            self.reply_socket.sendto(json.dumps(ack).encode("utf-8"), (host, self.reply_port))
+
+    def __dispatch(self, packet: bytes):
+        if ReliableReceiver.is_frame(packet):
+            commands = self.reliable.receive(packet, self.__source_host)
+            return sum(self.__dispatch(c) for c in commands)
+
+        if packet[0:2] == holo_assist_binary.BATCH_MAGIC:
+            return self.__process_batch_packet(packet)
+
+        return self.__process_command(packet)
+
+    def __process_batch_packet(self, packet: bytes):
+        (batch_id, sequence, packet_count, commands) = \
+            holo_assist_binary.decode_batch_packet(packet)
+        now = time.monotonic()
+
+        for (stale_id, (received_at, _)) in list(self.batches.items()):
+            if now - received_at > BATCH_TIMEOUT_SECONDS:
+                del self.batches[stale_id]
+                self.dropped_batches += 1
+
+        if batch_id in self.applied_batches:
+            return 0
+
+        (_, packets) = self.batches.setdefault(batch_id, (now, [None] * packet_count))
+        packets[sequence] = commands
+        if any(p is None for p in packets):
+            return 0
+
+        del self.batches[batch_id]
+        self.applied_batches.append(batch_id)
+        return sum(self.__process_command(c) for p in packets for c in p)
+
+    def __process_command(self, packet: bytes):
+        if packet[0:1] == b"{":
+            command = json.loads(packet.decode("utf-8"))
+            msg_type = command["type"]
+            mesh_id = command.get("id")
+            start_index = command.get("startIndex")
+
+            if msg_type == "SYNC":
+                self.syncs += 1
+                reply = {"type": "SYNC_ACK", "sequence": command["sequence"]}
+                self.reply_socket.sendto(
+                    json.dumps(reply).encode("utf-8"), (self.__source_host, self.reply_port)
+                )
+                return 0
+
+            for field in ["vertices", "indices"]:
+                if field in command:
+                    return self.__set_elements(mesh_id, field, start_index, len(command[field]))
+
+            if "groups" in command:
+                count = sum(len(g["localPositionsMeters"]) for g in command["groups"])
+                return self.__set_elements(mesh_id, "vertices", start_index, count)
+
+            if msg_type in ["CREATE_MESH", "PF_CREATE_MESH"]:
+                self.meshes[mesh_id] = StandInMesh()
+            elif msg_type in ["DELETE_MESH", "PF_DELETE_MESH"]:
+                self.meshes.pop(mesh_id, None)
+
+            return 0
+
+        if packet[0:2] == holo_assist_binary.HEADER_MAGIC:
+            (kind, mesh_id, start_index, count, _) = holo_assist_binary.decode_header(packet)
+            (_, field) = BINARY_KIND_NAMES[kind]
+            return self.__set_elements(mesh_id, field, start_index, count)
+
+        # Simulator position update
+        return 0
+
+    def __set_elements(self, mesh_id, field, start_index, count):
+        if mesh_id in self.meshes:
+            self.meshes[mesh_id].set_elements(field, start_index, count)
+
+        self.elements += count
+        return count
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Stand-in for HoloAssist")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=53941)
+    parser.add_argument("--reply-port", type=int, default=53942,
+        help="port on which the acks are sent (HoloAssist's SendUdpPort)")
+    parser.add_argument("--frame-rate", type=float, default=60)
+    parser.add_argument("--cost-per-command-us", type=float, default=200,
+        help="simulated processing time of each command")
+    parser.add_argument("--cost-per-element-us", type=float, default=2,
+        help="simulated processing time of each vertex or index")
+    parser.add_argument("--receive-buffer-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--loss-rate", type=float, default=0,
+        help="fraction of the datagrams received that are dropped")
+    parser.add_argument("--duration", type=float, default=None,
+        help="seconds after which to print the meshes and exit")
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.receive_buffer_bytes)
+    sock.bind((args.ip, args.port))
+    sock.setblocking(False)
+
+    reply_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    stand_in = StandIn(reply_socket, args.reply_port)
+
+    frame_seconds = 1 / args.frame_rate
+    dropped = 0
+    start = time.monotonic()
+    last_report = start
+
+    try:
+        while args.duration is None or time.monotonic() - start < args.duration:
+            frame_start = time.monotonic()
+            cost_seconds = 0
+
+            while True:
+                try:
+                    (packet, (source_host, _)) = sock.recvfrom(65536)
+                except BlockingIOError:
+                    break
+
+                if random.random() < args.loss_rate:
+                    dropped += 1
+                    continue
+
+                elements = stand_in.process(packet, source_host)
+                cost_us = args.cost_per_command_us + elements * args.cost_per_element_us
+                cost_seconds += cost_us / 1e6
+
+            stand_in.send_acks()
+
+            # The frame lasts as long as the processing takes, but at least `frame_seconds`
+            time.sleep(max(cost_seconds, frame_seconds - (time.monotonic() - frame_start)))
+
+            now = time.monotonic()
+            if now - last_report >= 1 and stand_in.datagrams > 0:
+                elapsed = now - last_report
+                print(
+                    f"{stand_in.datagrams / elapsed:.0f} datagrams/s, " +
+                    f"{stand_in.bytes / elapsed / 1024:.0f} KiB/s, " +
+                    f"{stand_in.elements / elapsed:.0f} elements/s, " +
+                    f"{stand_in.syncs} syncs", flush=True
+                )
+                (stand_in.datagrams, stand_in.bytes) = (0, 0)
+                (stand_in.elements, stand_in.syncs) = (0, 0)
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+
+    print(f"{stand_in.total_datagrams} datagrams, {stand_in.total_bytes} bytes in total")
+    if dropped > 0:
+        print(f"{dropped} datagrams dropped on purpose")
+    if stand_in.reliable.received_frames > 0:
+        print(
+            f"{stand_in.reliable.received_frames} reliable frames, " +
+            f"{stand_in.reliable.duplicate_frames} duplicates, " +
+            f"{stand_in.reliable.out_of_order_frames} out of order"
+        )
+    if stand_in.dropped_batches + len(stand_in.batches) > 0:
+        print(f"{stand_in.dropped_batches + len(stand_in.batches)} incomplete batches not applied")
+    for (mesh_id, mesh) in stand_in.meshes.items():
+        print(f"{mesh_id}: {mesh.vertices} vertices, {mesh.indices} indices")
+
+if __name__ == "__main__":
+    main()
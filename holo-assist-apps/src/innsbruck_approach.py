@@ -1,26 +1,26 @@
+import argparse
+import asyncio
 import csv
-import math
 import os
 
 import numpy as np
-import pyproj
 import scipy, scipy.interpolate
 
-from lib import prepare_holo_assist_instance
-from lib.holo_assist_types import Rotation, Vector3, WGS84Point, Color, GeoFixedVertex
+from lib import prepare_async_holo_assist_instance
+from lib.async_holo_assist_service import ainput
+from lib import geodesy
+from lib.curve_sampling import adaptive_spline_parameters
+from lib.curve_sampling import DEFAULT_MAX_TURN_DEGREES, DEFAULT_MAX_CHORD_ERROR_METERS
+from lib.holo_assist_types import Color, GeoFixedVertexBuffer
 
 csv.register_dialect("my", skipinitialspace=True, strict=True)
 
-def normalize(vector):
-    #https://stackoverflow.com/q/21030391
-    norm=np.linalg.norm(vector)
-    if norm==0:
-        norm=np.finfo(vector.dtype).eps
-    return vector/norm
+# Vertex budget of the spline tunnel, each rectangle having 4 vertices
+DEFAULT_MAX_VERTICES = 250
 
-def read_csv():
+def read_csv(path = os.path.join("data", "innsbruck-RNP-Y-RWY-08.csv")):
     pts = []
-    with open(os.path.join("data", "innsbruck-RNP-Y-RWY-08.csv"), encoding="UTF-8") as file:
+    with open(path, encoding="UTF-8") as file:
         reader = csv.reader(file, dialect="my")
         reader.__next__() #Skip first line (headings)
         for row in reader:
@@ -29,72 +29,88 @@ def read_csv():
             )
     return pts
 
-def create_rectangle(position: WGS84Point, color: Color,
-                    width: float, height: float,
-                    normal: np.ndarray, tangent = np.array([0, 0, -1])):
+def create_rectangles(positions_wgs, color: Color,
+                      width: float, height: float,
+                      normals, tangent = np.array([0, 0, -1])):
+    """
+        One rectangle for each position (radians and meters), facing the
+        matching row of `normals` (in the ENU system of the position, with
+        the axes in the order used by HoloAssist: east, up, north)
+    """
     DEFAULT_NORMAL = np.array([0, 1, 0])
     DEFAULT_TANGENT = np.array([0, 0, -1])
 
+    positions_wgs = np.asarray(positions_wgs, dtype=np.float64).reshape(-1, 3)
+    normals = np.broadcast_to(np.asarray(normals, dtype=np.float64), positions_wgs.shape)
+    tangents = np.broadcast_to(np.asarray(tangent, dtype=np.float64), positions_wgs.shape)
+
     # Describes the vertices of a rectangle which has
     # normal DEFAULT_NORMAL and tangent DEFAULT_TANGENT
     # The origin of the coordinate system is the origin
-    # of the ENU system centered at `position`
-    vertices = [
-        Vector3(-width / 2, 0, +height/2),
-        Vector3(+width / 2, 0, +height/2),
-        Vector3(+width / 2, 0, -height/2),
-        Vector3(-width / 2, 0, -height/2),
-    ]
-
-    indices = [0, 1, 1, 2, 2, 3, 3, 0]
-
-    rot_default_to_desired, error = scipy.spatial.transform.Rotation.align_vectors(
-        [DEFAULT_NORMAL, DEFAULT_TANGENT],
-        [normal, tangent]
+    # of the ENU system centered at each position
+    vertices = np.array([
+        [-width / 2, 0, +height/2],
+        [+width / 2, 0, +height/2],
+        [+width / 2, 0, -height/2],
+        [-width / 2, 0, -height/2],
+    ])
+
+    # Rotations that best align (normal, tangent) to (DEFAULT_NORMAL,
+    # DEFAULT_TANGENT), as `Rotation.align_vectors` would compute them one
+    # by one, with a single batched SVD (Kabsch algorithm)
+    defaults = np.array([DEFAULT_NORMAL, DEFAULT_TANGENT], dtype=np.float64)
+    targets = np.stack([normals, tangents], axis=1)
+    b = np.einsum("ji,njk->nik", defaults, targets)
+    (u, _, vh) = np.linalg.svd(b)
+    u[:, :, -1] *= np.sign(np.linalg.det(u @ vh))[:, np.newaxis]
+    matrices = u @ vh
+
+    rotated_defaults = np.einsum("nij,nkj->nki", matrices, targets)
+    errors = np.sqrt(np.sum((defaults - rotated_defaults) ** 2, axis=(1, 2)))
+    assert np.all(errors < 0.5)
+
+    rotations = scipy.spatial.transform.Rotation.from_matrix(matrices).as_euler("XYZ")
+
+    geo_vertices = GeoFixedVertexBuffer.from_arrays(
+        np.repeat(positions_wgs, len(vertices), axis=0),
+        [color.red, color.green, color.blue],
+        np.tile(vertices, (len(positions_wgs), 1)),
+        np.repeat(rotations, len(vertices), axis=0)
     )
 
-    assert error < 0.5
+    return (geo_vertices, tunnel_indices(len(positions_wgs)))
 
-    rotation = Rotation(*rot_default_to_desired.as_euler("XYZ"))
-    geo_vertices = [GeoFixedVertex(position, color, v, rotation) for v in vertices]
+def tunnel_indices(rectangles):
+    """
+        Indices of the outline of each rectangle, and of the lines
+        that connect each rectangle to the previous one
+    """
+    first_indices = np.arange(rectangles)[:, np.newaxis] * 4
 
-    return (geo_vertices, indices)
+    outlines = np.array([0, 1, 1, 2, 2, 3, 3, 0]) + first_indices
+    links = np.array([-4, 0, -3, 1, -2, 2, -1, 3]) + first_indices
 
-def create_tunnel_mesh(csv_points):
-    points = []
-    indices = []
-    current_index = 0
+    # The first square of the tunnel does not have a "previous"
+    # square to connect to
+    return np.concatenate([
+        outlines[0:1].reshape(-1),
+        np.concatenate([outlines[1:], links[1:]], axis=1).reshape(-1)
+    ])
 
+def create_tunnel_mesh(csv_points):
     color = Color(0.3, 0.3, 0.0)
+    positions_wgs = geodesy.wgs84_degrees_to_radians(csv_points)
 
-    for point in csv_points:
-        pos = WGS84Point.from_degrees(*point)
-        (geo_pts, ics) = create_rectangle(pos, color, 200, 200, [1.0, 0.0, 0.0])
-        points.extend(geo_pts)
-        indices.extend([i + current_index for i in ics])
-
-        # The first square of the tunnel does not have a "previous"
-        # square to connect to
-        if current_index != 0:
-            indices.extend([
-                current_index - 4 + 0, current_index + 0,
-                current_index - 4 + 1, current_index + 1,
-                current_index - 4 + 2, current_index + 2,
-                current_index - 4 + 3, current_index + 3,
-            ])
-
-        current_index += len(geo_pts)
-
-    return (points, indices)
-
-def compute_spline(csv_points):
-    wgs84_crs = pyproj.CRS.from_epsg(4979)
-    ecef_crs = pyproj.CRS.from_epsg(4978)
-    transformer_wgs2ecef = pyproj.Transformer.from_crs(wgs84_crs, ecef_crs)
+    return create_rectangles(positions_wgs, color, 200, 200, [1.0, 0.0, 0.0])
 
+def fit_spline(csv_points):
+    """
+        Returns the spline (see `scipy.interpolate.splprep`), in ECEF, that
+        smoothly follows the waypoints (degrees and meters) of the procedure
+    """
     xs, ys, zs = [], [], []
 
-    csv_points = [np.array(list(transformer_wgs2ecef.transform(*p))) for p in csv_points]
+    csv_points = geodesy.wgs84_to_ecef(geodesy.wgs84_degrees_to_radians(csv_points))
 
     for i in range(0, len(csv_points)):
         curr = csv_points[i]
@@ -122,119 +138,105 @@ def compute_spline(csv_points):
     w[0] = 1
     w[-1] = 1
 
-    tck, u = scipy.interpolate.splprep([xs, ys, zs], w, s=2000)
-    u = np.linspace(0, 1, 250 // 4)
-    spline_points = scipy.interpolate.splev(u, tck)
-    spline_points_der_1 = scipy.interpolate.splev(u, tck, der=1)
-
-    points = []
-    for i in range(0, len(spline_points[0])):
-        p_ecef = [spline_points[0][i], spline_points[1][i], spline_points[2][i]]
-        d1 = np.array([spline_points_der_1[0][i], spline_points_der_1[1][i], spline_points_der_1[2][i]])
-        points.append((p_ecef, d1))
-
-    return points
-
-def ecef_to_enu(p_ecef, enu_origin: WGS84Point):
-    phi = enu_origin.latitude_rad
-    llambda = enu_origin.longitude_rad
-
-    rotation = np.array([
-        [ -math.sin(llambda),  math.cos(llambda), 0, 0 ],
-        [ -math.cos(llambda) * math.sin(phi),  -math.sin(llambda) * math.sin(phi), math.cos(phi), 0 ],
-        [ math.cos(llambda) * math.cos(phi),  math.sin(llambda) * math.cos(phi), math.sin(phi), 0 ],
-        [ 0, 0, 0, 1 ]
-    ])
-
-    wgs84_crs = pyproj.CRS.from_epsg(4979)
-    ecef_crs = pyproj.CRS.from_epsg(4978)
-    transformer_wgs2ecef = pyproj.Transformer.from_crs(wgs84_crs, ecef_crs)
-    enu_origin_wgs_deg = [np.rad2deg(enu_origin.latitude_rad), np.rad2deg(enu_origin.longitude_rad), enu_origin.altitude_meters]
-    enu_origin_ecef = np.array([*transformer_wgs2ecef.transform(*enu_origin_wgs_deg), 0])
-
-    p_ecef = np.array([*p_ecef, 1])
-    enu = np.matmul(rotation, p_ecef - enu_origin_ecef)
-
-    return np.array([enu[0], enu[2], enu[1]])
-
-def create_spline_tunnel_mesh(csv_points):
+    (tck, _) = scipy.interpolate.splprep([xs, ys, zs], w, s=2000)
+    return tck
+
+def compute_spline(
+    csv_points, max_samples = DEFAULT_MAX_VERTICES // 4, uniform = False,
+    max_turn_degrees = DEFAULT_MAX_TURN_DEGREES,
+    max_chord_error_meters = DEFAULT_MAX_CHORD_ERROR_METERS
+):
+    """
+        Returns the positions (ECEF) and derivatives of points along
+        the spline, both with shape (N, 3). The points are denser where
+        the spline turns more (see `adaptive_spline_parameters`), or
+        `max_samples` are evenly spread over the spline parameter
+        with `uniform`.
+    """
+    tck = fit_spline(csv_points)
+
+    if uniform:
+        u = np.linspace(0, 1, max_samples)
+    else:
+        u = adaptive_spline_parameters(
+            tck, max_samples, np.radians(max_turn_degrees), max_chord_error_meters
+        )
+
+    spline_points = np.stack(scipy.interpolate.splev(u, tck), axis=-1)
+    spline_points_der_1 = np.stack(scipy.interpolate.splev(u, tck, der=1), axis=-1)
+
+    return (spline_points, spline_points_der_1)
+
+def create_spline_tunnel_mesh(csv_points, **sampling):
+    """
+        See `compute_spline` for `sampling`
+    """
     color = Color(0, 0.3, 0.5)
 
-    wgs84_crs = pyproj.CRS.from_epsg(4979)
-    ecef_crs = pyproj.CRS.from_epsg(4978)
-    transformer_ecef2wgs = pyproj.Transformer.from_crs(ecef_crs, wgs84_crs)
+    (points_ecef, derivatives) = compute_spline(csv_points, **sampling)
+    points_wgs = geodesy.ecef_to_wgs84(points_ecef)
 
-    spline_points = compute_spline(csv_points)
+    # Tangent of the spline in the ENU system of each point, with the
+    # axes in the order used by HoloAssist (east, up, north)
+    (east, north, up) = geodesy.enu_axes(points_wgs)
+    tangents_enu = np.stack([
+        np.einsum("ij,ij->i", derivatives, east),
+        np.einsum("ij,ij->i", derivatives, up),
+        np.einsum("ij,ij->i", derivatives, north),
+    ], axis=-1)
+    norms = np.linalg.norm(tangents_enu, axis=1, keepdims=True)
+    tangents_enu /= np.maximum(norms, np.finfo(np.float64).eps)
 
-    vertices = []
-    indices = []
-    current_index = 0
+    return create_rectangles(points_wgs, color, 200, 200, tangents_enu)
 
-    for i in range(0, len(spline_points)):
-        (point_ecef, d1) = spline_points[i]
-        (lat_deg, lon_deg, alt_m) = transformer_ecef2wgs.transform(*point_ecef)
-        point_wgs = WGS84Point.from_degrees(lat_deg, lon_deg, alt_m)
-        
-        spline_tangent_enu = normalize(ecef_to_enu(point_ecef + d1, point_wgs))
+async def upload_mesh(service, mesh_id, vertices, indices, show = True):
+    await service.create_mesh(mesh_id)
+    await service.add_mesh_vertices(mesh_id, vertices)
+    await service.add_mesh_indices(mesh_id, indices)
 
-        (rect_points, rect_indices) = create_rectangle(point_wgs, color, 200, 200, spline_tangent_enu)
+    if show:
+        await service.commit_mesh_changes(mesh_id)
+        await service.activate_mesh(mesh_id)
 
-        vertices.extend(rect_points)
-        indices.extend([i + current_index for i in rect_indices])
-
-        # The first square of the tunnel does not have a "previous"
-        # square to connect to
-        if current_index != 0:
-            indices.extend([
-                current_index - 4 + 0, current_index + 0,
-                current_index - 4 + 1, current_index + 1,
-                current_index - 4 + 2, current_index + 2,
-                current_index - 4 + 3, current_index + 3,
-            ])
-
-        current_index += len(rect_points)
-
-    return (vertices, indices)
-
-def chunks(lst, n):
-    """Yield successive n-sized chunks from lst."""
-    #https://stackoverflow.com/a/312464
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
-
-def main():
-    csv_points = read_csv()
-    (vertices_line, indices_line) = create_tunnel_mesh(csv_points)
-    (vertices_spline, indices_spline) = create_spline_tunnel_mesh(csv_points)
-
-    service = prepare_holo_assist_instance()
+async def draw(vertices_line, indices_line, vertices_spline, indices_spline):
+    # Paced, as the spline tunnel can have thousands of rectangles
+    service = await prepare_async_holo_assist_instance(paced=True)
 
+    # Both meshes are uploaded at the same time
     mesh_id = "RPN Y RWY 08 - Line"
-    service.create_mesh(mesh_id)
-
-    for vs in chunks(vertices_line, 100):
-        service.add_mesh_vertices(mesh_id, vs)
-
-    for inds in chunks(indices_line, 500):
-        service.add_mesh_indices(mesh_id, inds)
-
-    #service.commit_mesh_changes(mesh_id)
-    #service.activate_mesh(mesh_id)
-
     mesh_id_spline = "RPN Y RWY 08 - Spline"
-    service.create_mesh(mesh_id_spline)
+    await asyncio.gather(
+        upload_mesh(service, mesh_id, vertices_line, indices_line, show=False),
+        upload_mesh(service, mesh_id_spline, vertices_spline, indices_spline)
+    )
+    await service.flush()
 
-    for vs in chunks(vertices_spline, 100):
-        service.add_mesh_vertices(mesh_id_spline, vs)
+    await ainput()
+    await service.delete_mesh(mesh_id)
+    await service.delete_mesh(mesh_id_spline)
+    service.close()
 
-    for inds in chunks(indices_spline, 500):
-        service.add_mesh_indices(mesh_id_spline, inds)
+def main():
+    parser = argparse.ArgumentParser(description="Draws the RNP Y RWY 08 approach of Innsbruck")
+    parser.add_argument("--max-vertices", type=int, default=DEFAULT_MAX_VERTICES,
+        help="vertex budget of the spline tunnel")
+    parser.add_argument("--max-turn-deg", type=float, default=DEFAULT_MAX_TURN_DEGREES,
+        help="largest turn of the spline between two rectangles")
+    parser.add_argument("--max-chord-error-m", type=float, default=DEFAULT_MAX_CHORD_ERROR_METERS,
+        help="largest distance between the spline and the lines that join the rectangles")
+    parser.add_argument("--uniform", action="store_true",
+        help="spread the whole budget evenly over the spline parameter instead")
+    # The other options (--unity, --binary, ...) are read by prepare_async_holo_assist_instance
+    (args, _) = parser.parse_known_args()
 
-    service.commit_mesh_changes(mesh_id_spline)
-    service.activate_mesh(mesh_id_spline)
+    csv_points = read_csv()
+    (vertices_line, indices_line) = create_tunnel_mesh(csv_points)
+    (vertices_spline, indices_spline) = create_spline_tunnel_mesh(
+        csv_points, max_samples=args.max_vertices // 4, uniform=args.uniform,
+        max_turn_degrees=args.max_turn_deg, max_chord_error_meters=args.max_chord_error_m
+    )
 
-    input()
-    service.delete_mesh(mesh_id)
-    service.delete_mesh(mesh_id_spline)
+    asyncio.run(draw(vertices_line, indices_line, vertices_spline, indices_spline))
 
-main()
+if __name__ == "__main__":
+    main()
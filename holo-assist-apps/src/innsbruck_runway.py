@@ -29,11 +29,15 @@ runway_indices = [0, 1, 1, 2, 2, 3, 3, 0]
 
 service = prepare_holo_assist_instance()
 
-service.create_mesh(MESH_ID)
-service.add_mesh_vertices(MESH_ID, runway_vertices)
-service.add_mesh_indices(MESH_ID, runway_indices)
-service.commit_mesh_changes(MESH_ID)
-service.activate_mesh(MESH_ID)
-
+with service.batch(MESH_ID) as batch:
+    batch.create_mesh()
+    batch.add_mesh_vertices(runway_vertices)
+    batch.add_mesh_indices(runway_indices)
+    batch.commit_mesh_changes()
+    batch.activate_mesh()
+
+service.flush()
 input()
 service.delete_mesh(MESH_ID)
+
+service.flush()
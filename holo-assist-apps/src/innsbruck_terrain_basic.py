@@ -14,17 +14,16 @@ terrain_obj = simple_obj_importer.load_obj_line_mesh(os.path.join("data", "3d-te
     terrain_obj, TERRAIN_COLOR, TERRAIN_POSITION, TERRAIN_ROTATION
 )
 
-vertices_A = vertices[:len(vertices) // 2]
-vertices_B = vertices[len(vertices) // 2:]
-
 service = prepare_holo_assist_instance()
 
 service.create_mesh(MESH_ID)
-service.add_mesh_vertices(MESH_ID, vertices_A)
-service.add_mesh_vertices(MESH_ID, vertices_B)
+service.add_mesh_vertices(MESH_ID, vertices)
 service.add_mesh_indices(MESH_ID, indices)
 service.commit_mesh_changes(MESH_ID)
 service.activate_mesh(MESH_ID)
 
+service.flush()
 input("")
 service.delete_mesh(MESH_ID)
+
+service.flush()
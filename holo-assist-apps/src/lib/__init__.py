@@ -1,20 +1,78 @@
+import os
 import sys
-import itertools
 
-from .holo_assist_types import Color, WGS84Point, Rotation, GeoFixedVertex, Vector3
+import numpy as np
+
+from .holo_assist_types import Color, WGS84Point, Rotation, GeoFixedVertexBuffer
 from .holo_assist_service import HoloAssistService
+from .async_holo_assist_service import AsyncHoloAssistService
+from .flow_control import DEFAULT_RATE_BYTES_PER_SECOND
+from .multiplexer import DEFAULT_DAEMON_PORT
 from .simple_obj_importer import ObjLineMesh
 
-def prepare_holo_assist_instance():
-    send_to_hololens = True
+HOLOLENS_ADDRESS = ("192.168.0.200", 53941)
+UNITY_ADDRESS = ("127.0.0.1", 53941)
+
+def _holo_assist_options(paced):
+    """
+        Address and options of the service, from the command line
+    """
+    send_to_hololens = "--unity" not in sys.argv[1:]
+    through_daemon = "--daemon" in sys.argv[1:]
+    # The daemon acknowledges the SYNCs of each app once it has
+    # forwarded what came before, which keeps apps to their share
+    acknowledged = through_daemon or "--ack" in sys.argv[1:]
+    paced = paced or acknowledged or "--paced" in sys.argv[1:]
+
+    if through_daemon and "--reliable" in sys.argv[1:]:
+        raise ValueError("--reliable cannot be used with --daemon")
+
+    options = {
+        "binary_encoding": "--binary" in sys.argv[1:],
+        "send_rate_bytes_per_second": DEFAULT_RATE_BYTES_PER_SECOND if paced else None,
+        "acknowledged": acknowledged,
+        "shared_vertex_attributes": "--shared" in sys.argv[1:],
+    }
+
+    if through_daemon:
+        return (("127.0.0.1", DEFAULT_DAEMON_PORT), {**options, "ack_port": None})
+
+    return (HOLOLENS_ADDRESS if send_to_hololens else UNITY_ADDRESS, options)
 
-    if len(sys.argv) > 1 and sys.argv[1] == "--unity":
-        send_to_hololens = False
+def prepare_holo_assist_instance(paced = False, mesh_namespace = None):
+    """
+        `paced` (or `--paced`) sends the datagrams through a token bucket,
+        for apps that send many commands in a row. `--ack` additionally
+        adapts the rate to the acknowledgments of HoloAssist. `--shared`
+        sends the origin, color and rotation once for each group of
+        geo-fixed vertices that share them. `--reliable` retransmits
+        whatever HoloAssist does not acknowledge (and replaces pacing).
+        `--daemon` sends everything through `holo_assist_daemon.py`,
+        which reserves the mesh ids starting with `mesh_namespace`.
+    """
+    (address, options) = _holo_assist_options(paced)
+    service = HoloAssistService(*address, **options, reliable="--reliable" in sys.argv[1:])
 
-    if send_to_hololens:
-        return HoloAssistService("192.168.0.200", 53941)
+    if "--daemon" in sys.argv[1:]:
+        service.register_with_daemon(os.path.basename(sys.argv[0]), mesh_namespace)
 
-    return HoloAssistService("127.0.0.1", 53941)
+    return service
+
+async def prepare_async_holo_assist_instance(paced = False, mesh_namespace = None):
+    """
+        `AsyncHoloAssistService` with the same options as
+        `prepare_holo_assist_instance`, except `--reliable`
+    """
+    if "--reliable" in sys.argv[1:]:
+        raise ValueError("--reliable is not supported by AsyncHoloAssistService")
+
+    (address, options) = _holo_assist_options(paced)
+    service = await AsyncHoloAssistService.connect(*address, **options)
+
+    if "--daemon" in sys.argv[1:]:
+        await service.register_with_daemon(os.path.basename(sys.argv[0]), mesh_namespace)
+
+    return service
 
 def convert_obj_to_geo_fixed_mesh(
     mesh: ObjLineMesh, mesh_color: Color,
@@ -29,16 +87,24 @@ def convert_obj_to_geo_fixed_mesh(
     # When loading the OBJ, therefore, an appropriate correction must be applied, otherwise
     # the mesh will look "chirally opposite" when loaded in Unity, and this has been the
     # source of many headaches.
-    # The "-" sign in front of point[0] takes care of this conversion.
+    # Negating the X coordinate of every point takes care of this conversion.
+
+    local_positions = np.array(mesh.vertices, dtype=np.float64).reshape(-1, 3)
+    local_positions[:, 0] *= -1
 
-    vertices = [
-        GeoFixedVertex(
-            mesh_geo_position, mesh_color,
-            Vector3(-point[0], point[1], point[2]), mesh_local_rotation
-        ) for point in mesh.vertices
-    ]
+    vertices = GeoFixedVertexBuffer.from_arrays(
+        [
+            mesh_geo_position.latitude_rad, mesh_geo_position.longitude_rad,
+            mesh_geo_position.altitude_meters
+        ],
+        [mesh_color.red, mesh_color.green, mesh_color.blue],
+        local_positions,
+        [
+            mesh_local_rotation.localx_radians, mesh_local_rotation.localy_radians,
+            mesh_local_rotation.localz_radians
+        ]
+    )
 
-    flattened_indices = list(itertools.chain.from_iterable(mesh.lines))
-    indices_in_base_zero = [i - 1 for i in flattened_indices]
+    indices_in_base_zero = (np.asarray(mesh.lines).reshape(-1) - 1).tolist()
 
     return (vertices, indices_in_base_zero)
@@ -0,0 +1,309 @@
+import asyncio
+import functools
+import json
+import time
+
+from .holo_assist_service import HoloAssistService, MeshBatch, DEFAULT_MAX_DATAGRAM_BYTES
+from .flow_control import TokenBucket, DEFAULT_ACK_PORT, DEFAULT_BURST_BYTES
+from .flow_control import DEFAULT_RATE_BYTES_PER_SECOND, RATE_INCREASE_BYTES_PER_SECOND
+from .flow_control import DEFAULT_SYNC_EVERY_DATAGRAMS, DEFAULT_ACK_TIMEOUT_SECONDS
+from .flow_control import MIN_RATE_BYTES_PER_SECOND, MAX_RATE_BYTES_PER_SECOND
+
+# asyncio version of `HoloAssistService`, for apps that upload several meshes
+# at the same time, or animate meshes while reacting to the simulator, in a
+# single event loop. Every command is a coroutine that returns once all its
+# datagrams have been handed to the socket:
+#
+#     service = await AsyncHoloAssistService.connect(ip, port)
+#     await asyncio.gather(upload(service, "A"), upload(service, "B"))
+#
+# The commands are encoded exactly like `HoloAssistService` does (same
+# options, same splitting in datagrams). Sending is subject to back-pressure:
+# a command waits while the socket buffer is full, while the token bucket is
+# empty (with `send_rate_bytes_per_second`) and, with `acknowledged`, while
+# HoloAssist has not acknowledged the previous window (as in `flow_control`).
+# The datagrams of concurrent commands are interleaved.
+#
+# The existing scripts keep using the synchronous `HoloAssistService`.
+
+class _SenderProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        # Cleared while the transport asks to stop writing (its buffer is full)
+        self.writable = asyncio.Event()
+        self.writable.set()
+        # Called with the datagrams received on the socket, if set
+        self.on_reply = None
+
+    def datagram_received(self, data, addr):
+        if self.on_reply is not None:
+            self.on_reply(data)
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+class _HandlerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        self.handler(data)
+
+async def listen_udp(address, handler):
+    """
+        Calls `handler(packet)` for each packet received on `address`
+        (ip, port), e.g. the simulator position, from the running event
+        loop. Returns the transport: close it to stop listening.
+    """
+    (transport, _) = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _HandlerProtocol(handler), local_addr=address
+    )
+    return transport
+
+async def ainput(prompt = ""):
+    """
+        `input` that lets the event loop run while waiting for the user
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, input, prompt)
+
+class AsyncMeshBatch:
+    """
+        `async with service.batch(mesh_id) as b:` see `HoloAssistService.batch`.
+        The commands are gathered without awaiting, and sent when the block ends.
+    """
+
+    def __init__(self, batch: MeshBatch, send_encoded):
+        self.__batch = batch
+        self.__send_encoded = send_encoded
+
+    async def __aenter__(self):
+        return self.__batch.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.__send_encoded(lambda: self.__batch.__exit__(exc_type, exc_value, traceback))
+        return False
+
+class AsyncHoloAssistService:
+    def __init__(
+        self, transport, protocol: _SenderProtocol, encoder_options, rate_bytes_per_second
+    ):
+        """
+            Use `connect`
+        """
+        self.__transport = transport
+        self.__protocol = protocol
+        self.__captured = None
+        self.__encoder = HoloAssistService(
+            *transport.get_extra_info("peername"), **encoder_options, send_datagram=self.__capture
+        )
+
+        self.__bucket = None
+        if rate_bytes_per_second is not None:
+            self.__bucket = TokenBucket(rate_bytes_per_second, DEFAULT_BURST_BYTES)
+
+        self.__acknowledged = False
+        self.__ack_transport = None
+        self.sync_every_datagrams = DEFAULT_SYNC_EVERY_DATAGRAMS
+        self.ack_timeout_seconds = DEFAULT_ACK_TIMEOUT_SECONDS
+        self.__datagrams_since_sync = 0
+        self.__next_sequence = 0
+        self.__acked_sequence = -1
+        self.__ack_received = asyncio.Event()
+        # Only one SYNC is in flight at a time, as in `PacedSender`
+        self.__sync_lock = asyncio.Lock()
+        self.__awaited_sync = None
+
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.ack_timeouts = 0
+        self.round_trip_seconds = None
+
+    @classmethod
+    async def connect(
+        cls, hololens_ip, hololens_port, binary_encoding = False,
+        max_datagram_bytes = DEFAULT_MAX_DATAGRAM_BYTES,
+        send_rate_bytes_per_second = None, acknowledged = False,
+        ack_port = DEFAULT_ACK_PORT, shared_vertex_attributes = False
+    ):
+        """
+            Same options as `HoloAssistService` (except reliable mode).
+            Without `ack_port`, the acks are received on the sending socket.
+        """
+        loop = asyncio.get_running_loop()
+        (transport, protocol) = await loop.create_datagram_endpoint(
+            _SenderProtocol, remote_addr=(hololens_ip, hololens_port)
+        )
+
+        if acknowledged and send_rate_bytes_per_second is None:
+            send_rate_bytes_per_second = DEFAULT_RATE_BYTES_PER_SECOND
+
+        service = cls(transport, protocol, {
+            "binary_encoding": binary_encoding,
+            "max_datagram_bytes": max_datagram_bytes,
+            "shared_vertex_attributes": shared_vertex_attributes,
+        }, send_rate_bytes_per_second)
+
+        service.__acknowledged = acknowledged
+        if acknowledged and ack_port is None:
+            protocol.on_reply = service.__on_reply
+        elif acknowledged:
+            (service.__ack_transport, _) = await loop.create_datagram_endpoint(
+                lambda: _HandlerProtocol(service.__on_reply), local_addr=("0.0.0.0", ack_port)
+            )
+
+        return service
+
+    @property
+    def rate_bytes_per_second(self):
+        return None if self.__bucket is None else self.__bucket.rate_per_second
+
+    def close(self):
+        self.__transport.close()
+        if self.__ack_transport is not None:
+            self.__ack_transport.close()
+
+    async def flush(self):
+        """
+            With `acknowledged`, waits until HoloAssist processed
+            everything sent so far. Does nothing otherwise.
+        """
+        if not self.__acknowledged:
+            return
+
+        async with self.__sync_lock:
+            if self.__datagrams_since_sync > 0:
+                await self.__sync()
+            await self.__wait_for_ack()
+
+    def batch(self, mesh_id):
+        return AsyncMeshBatch(self.__encoder.batch(mesh_id), self.__send_encoded)
+
+    def __capture(self, data: bytes, _mesh_id):
+        self.__captured.append(data)
+
+    async def __send_encoded(self, encode):
+        # Encoding does not await, so the datagrams of concurrent
+        # commands cannot end up in the same list
+        self.__captured = []
+        try:
+            encode()
+            datagrams = self.__captured
+        finally:
+            self.__captured = None
+
+        for data in datagrams:
+            # Once a window is complete, every command waits
+            # until its SYNC is sent (see `__sync`)
+            if self.__acknowledged:
+                while self.__datagrams_since_sync >= self.sync_every_datagrams:
+                    async with self.__sync_lock:
+                        if self.__datagrams_since_sync >= self.sync_every_datagrams:
+                            await self.__sync()
+                self.__datagrams_since_sync += 1
+
+            await self.__send_paced(data)
+
+    async def __command(self, name, *args, **kwargs):
+        await self.__send_encoded(lambda: getattr(self.__encoder, name)(*args, **kwargs))
+
+    async def __send_paced(self, data: bytes):
+        await self.__protocol.writable.wait()
+
+        # Waiting, even for no time, lets the other commands send
+        # their datagrams in between
+        delay_seconds = 0 if self.__bucket is None else self.__bucket.reserve(len(data))
+        await asyncio.sleep(delay_seconds)
+
+        self.__transport.sendto(data)
+        self.sent_datagrams += 1
+        self.sent_bytes += len(data)
+
+    async def __sync(self):
+        # The previous window must have been absorbed before sending more
+        await self.__wait_for_ack()
+
+        self.__awaited_sync = (self.__next_sequence, time.monotonic())
+        self.__next_sequence += 1
+        self.__datagrams_since_sync = 0
+
+        msg = {"type": "SYNC", "sequence": self.__awaited_sync[0]}
+        await self.__send_paced(json.dumps(msg).encode("utf-8"))
+
+    async def __wait_for_ack(self):
+        if self.__awaited_sync is None:
+            return
+
+        (sequence, sent_at) = self.__awaited_sync
+        self.__awaited_sync = None
+        deadline = sent_at + self.ack_timeout_seconds
+
+        while self.__acked_sequence < sequence:
+            self.__ack_received.clear()
+            try:
+                await asyncio.wait_for(
+                    self.__ack_received.wait(), max(deadline - time.monotonic(), 0)
+                )
+            except asyncio.TimeoutError:
+                self.ack_timeouts += 1
+                self.__bucket.rate_per_second = max(
+                    self.__bucket.rate_per_second / 2, MIN_RATE_BYTES_PER_SECOND
+                )
+                return
+
+        self.round_trip_seconds = time.monotonic() - sent_at
+        self.__bucket.rate_per_second = min(
+            self.__bucket.rate_per_second + RATE_INCREASE_BYTES_PER_SECOND,
+            MAX_RATE_BYTES_PER_SECOND
+        )
+
+    def __on_reply(self, reply: bytes):
+        # HoloAssist also sends plain-text debug messages on the same channel
+        try:
+            msg = json.loads(reply.decode("utf-8"))
+        except ValueError:
+            return
+
+        # An ack for a later SYNC also acknowledges the previous ones
+        if isinstance(msg, dict) and msg.get("type") == "SYNC_ACK":
+            self.__acked_sequence = max(self.__acked_sequence, msg.get("sequence", -1))
+            self.__ack_received.set()
+
+    # The commands, see `HoloAssistService`
+    create_mesh = functools.partialmethod(__command, "create_mesh")
+    activate_mesh = functools.partialmethod(__command, "activate_mesh")
+    deactivate_mesh = functools.partialmethod(__command, "deactivate_mesh")
+    delete_mesh = functools.partialmethod(__command, "delete_mesh")
+    commit_mesh_changes = functools.partialmethod(__command, "commit_mesh_changes")
+    add_mesh_vertices = functools.partialmethod(__command, "add_mesh_vertices")
+    replace_mesh_vertices = functools.partialmethod(__command, "replace_mesh_vertices")
+    add_mesh_vertex_offsets = functools.partialmethod(__command, "add_mesh_vertex_offsets")
+    replace_mesh_vertex_offsets = functools.partialmethod(__command, "replace_mesh_vertex_offsets")
+    add_mesh_indices = functools.partialmethod(__command, "add_mesh_indices")
+    replace_mesh_indices = functools.partialmethod(__command, "replace_mesh_indices")
+
+    plane_fixed_create_mesh = functools.partialmethod(__command, "plane_fixed_create_mesh")
+    plane_fixed_activate_mesh = functools.partialmethod(__command, "plane_fixed_activate_mesh")
+    plane_fixed_deactivate_mesh = functools.partialmethod(__command, "plane_fixed_deactivate_mesh")
+    plane_fixed_delete_mesh = functools.partialmethod(__command, "plane_fixed_delete_mesh")
+    plane_fixed_commit_mesh_changes = functools.partialmethod(
+        __command, "plane_fixed_commit_mesh_changes"
+    )
+    plane_fixed_add_mesh_vertices = functools.partialmethod(
+        __command, "plane_fixed_add_mesh_vertices"
+    )
+    plane_fixed_replace_mesh_vertices = functools.partialmethod(
+        __command, "plane_fixed_replace_mesh_vertices"
+    )
+    plane_fixed_add_mesh_indices = functools.partialmethod(
+        __command, "plane_fixed_add_mesh_indices"
+    )
+    plane_fixed_replace_mesh_indices = functools.partialmethod(
+        __command, "plane_fixed_replace_mesh_indices"
+    )
+    plane_fixed_update_mesh_origin = functools.partialmethod(
+        __command, "plane_fixed_update_mesh_origin"
+    )
+
+    register_with_daemon = functools.partialmethod(__command, "register_with_daemon")
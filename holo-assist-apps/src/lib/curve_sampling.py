@@ -0,0 +1,70 @@
+import numpy as np
+import scipy.interpolate
+
+# Placement of the slices of a tunnel along a spline (as fitted by
+# `scipy.interpolate.splprep`). Sampling the spline parameter uniformly
+# spends as many slices on straight legs as on turns, and the parameter
+# is not even proportional to the distance along the curve. Instead, the
+# slices are placed so that between two consecutive slices the direction
+# of the curve turns by at most a given angle, and the straight line that
+# joins them strays from the curve by at most a given (chordal) error.
+
+DEFAULT_MAX_TURN_DEGREES = 3
+DEFAULT_MAX_CHORD_ERROR_METERS = 2
+# Resolution at which the curvature and the length of the curve are measured
+DEFAULT_DENSE_SAMPLES = 16384
+
+def curvature(d1, d2):
+    """
+        Curvature (1 / radius of curvature) from the first and second
+        derivatives of a curve, both with shape (N, 3)
+    """
+    speed = np.linalg.norm(d1, axis=-1)
+    return np.linalg.norm(np.cross(d1, d2), axis=-1) / \
+        np.maximum(speed ** 3, np.finfo(np.float64).tiny)
+
+def adaptive_spline_parameters(
+    tck, max_samples,
+    max_turn_radians = np.radians(DEFAULT_MAX_TURN_DEGREES),
+    max_chord_error_meters = DEFAULT_MAX_CHORD_ERROR_METERS,
+    max_spacing_meters = None,
+    dense_samples = DEFAULT_DENSE_SAMPLES
+):
+    """
+        Returns the (increasing) spline parameters, from 0 to 1, at which to
+        place the slices: as few as possible to meet `max_turn_radians` and
+        `max_chord_error_meters` (and `max_spacing_meters`, if given), but
+        never more than `max_samples`. When the budget is too small for the
+        tolerances, the slices keep the same relative density, so that the
+        error is spread evenly along the curve.
+    """
+    assert max_samples >= 2
+
+    u = np.linspace(0, 1, dense_samples)
+    d1 = np.stack(scipy.interpolate.splev(u, tck, der=1), axis=-1)
+    d2 = np.stack(scipy.interpolate.splev(u, tck, der=2), axis=-1)
+
+    k = curvature(d1, d2)
+
+    # Over a segment of length L on an arc of curvature k, the direction
+    # turns by k L and the chord is k L^2 / 8 away from the arc: hence
+    # the number of segments needed per meter of curve
+    segments_per_meter = np.maximum(k / max_turn_radians, np.sqrt(k / (8 * max_chord_error_meters)))
+    if max_spacing_meters is not None:
+        segments_per_meter = np.maximum(segments_per_meter, 1 / max_spacing_meters)
+
+    # Length of the curve and number of segments needed, from the start
+    # to each dense sample (trapezoidal rule)
+    speed = np.linalg.norm(d1, axis=-1)
+    lengths = np.diff(u) * (speed[1:] + speed[:-1]) / 2
+    mean_segments_per_meter = (segments_per_meter[1:] + segments_per_meter[:-1]) / 2
+    needed = np.concatenate([[0], np.cumsum(lengths * mean_segments_per_meter)])
+
+    if needed[-1] <= 0:
+        # Straight, and no spacing required
+        return np.array([0.0, 1.0])
+
+    segments = int(np.clip(np.ceil(needed[-1]), 1, max_samples - 1))
+
+    # The parameter at which each multiple of the total / segments is reached
+    return np.interp(np.linspace(0, needed[-1], segments + 1), needed, u)
@@ -0,0 +1,202 @@
+import json
+import socket
+import time
+
+# Pacing of the datagrams sent to HoloAssist. Sending faster than HoloAssist
+# can process the commands just fills its receive buffer, and everything
+# past that is silently dropped. Instead of waiting a fixed (worst-case)
+# time after each command, datagrams are sent through a token bucket, and
+# optionally the rate is adapted to what HoloAssist actually absorbs:
+# every few datagrams a SYNC command is sent, which HoloAssist answers (on
+# its debug UDP channel) with a SYNC_ACK once it has processed everything
+# that was sent before it. Timely acks slowly increase the rate, a missing
+# ack halves it.
+
+DEFAULT_RATE_BYTES_PER_SECOND = 256 * 1024
+DEFAULT_BURST_BYTES = 16 * 1024
+
+# Port on which HoloAssist sends its debug messages (`UDPManager.SendUdpPort`)
+DEFAULT_ACK_PORT = 53942
+DEFAULT_SYNC_EVERY_DATAGRAMS = 16
+DEFAULT_ACK_TIMEOUT_SECONDS = 0.5
+
+# A warning is printed when this many SYNCs in a row are not acknowledged:
+# HoloAssist may be sending its acks elsewhere (see `UDPManager.cs`)
+ACK_TIMEOUTS_BEFORE_WARNING = 4
+
+MIN_RATE_BYTES_PER_SECOND = 16 * 1024
+MAX_RATE_BYTES_PER_SECOND = 16 * 1024 * 1024
+RATE_INCREASE_BYTES_PER_SECOND = 32 * 1024
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.__tokens = burst
+        self.__last_refill = time.monotonic()
+
+    def consume(self, amount):
+        """
+            Blocks until `amount` tokens are available, then takes them.
+            Amounts bigger than the burst are allowed: the bucket goes
+            in debt, and the following calls wait for it to be repaid.
+        """
+        delay_seconds = self.reserve(amount)
+        if delay_seconds > 0:
+            time.sleep(delay_seconds)
+
+    def reserve(self, amount):
+        """
+            Takes `amount` tokens right away, and returns how long to wait
+            before using them, for callers that must not block (e.g. in
+            an asyncio event loop). See `consume`.
+        """
+        self.__refill()
+
+        needed = min(amount, self.burst)
+        delay_seconds = max(needed - self.__tokens, 0) / self.rate_per_second
+
+        self.__tokens -= amount
+        return delay_seconds
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(
+            self.__tokens + (now - self.__last_refill) * self.rate_per_second, self.burst
+        )
+        self.__last_refill = now
+
+class PacedSender:
+    def __init__(
+        self, sock: socket.socket, address,
+        rate_bytes_per_second = DEFAULT_RATE_BYTES_PER_SECOND,
+        burst_bytes = DEFAULT_BURST_BYTES,
+        ack_socket: socket.socket = None,
+        sync_every_datagrams = DEFAULT_SYNC_EVERY_DATAGRAMS,
+        ack_timeout_seconds = DEFAULT_ACK_TIMEOUT_SECONDS
+    ):
+        """
+            Without `ack_socket` the datagrams are only paced at
+            `rate_bytes_per_second`, with it the rate is adapted
+            following the SYNC/SYNC_ACK exchange
+        """
+        self.__socket = sock
+        self.__address = address
+        self.__bucket = TokenBucket(rate_bytes_per_second, burst_bytes)
+
+        self.__ack_socket = ack_socket
+        self.sync_every_datagrams = sync_every_datagrams
+        self.ack_timeout_seconds = ack_timeout_seconds
+
+        self.__datagrams_since_sync = 0
+        self.__next_sequence = 0
+        # Sequence number of the SYNC whose ack is still awaited, if any.
+        # Only one SYNC is in flight at a time, which bounds the amount of
+        # data queued in HoloAssist to about two windows of datagrams.
+        self.__awaited_sequence = None
+        self.__sync_sent_at = None
+
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.ack_timeouts = 0
+        self.round_trip_seconds = None
+        self.__consecutive_ack_timeouts = 0
+
+    @property
+    def rate_bytes_per_second(self):
+        return self.__bucket.rate_per_second
+
+    def send(self, data: bytes):
+        self.__send_paced(data)
+
+        if self.__ack_socket is None:
+            return
+
+        self.__datagrams_since_sync += 1
+        if self.__datagrams_since_sync >= self.sync_every_datagrams:
+            self.__sync()
+
+    def flush(self):
+        """
+            Waits until HoloAssist acknowledged everything sent so far
+            (when acknowledgments are enabled)
+        """
+        if self.__ack_socket is None:
+            return
+
+        if self.__datagrams_since_sync > 0:
+            self.__sync()
+        self.__wait_for_ack()
+
+    def __send_paced(self, data: bytes):
+        self.__bucket.consume(len(data))
+        self.__socket.sendto(data, self.__address)
+
+        self.sent_datagrams += 1
+        self.sent_bytes += len(data)
+
+    def __sync(self):
+        # The previous window must have been absorbed before sending more
+        self.__wait_for_ack()
+
+        self.__awaited_sequence = self.__next_sequence
+        self.__next_sequence += 1
+        self.__datagrams_since_sync = 0
+        self.__sync_sent_at = time.monotonic()
+
+        msg = {"type": "SYNC", "sequence": self.__awaited_sequence}
+        self.__send_paced(json.dumps(msg).encode("utf-8"))
+
+    def __wait_for_ack(self):
+        if self.__awaited_sequence is None:
+            return
+
+        deadline = self.__sync_sent_at + self.ack_timeout_seconds
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.ack_timeouts += 1
+                self.__bucket.rate_per_second = max(
+                    self.__bucket.rate_per_second / 2, MIN_RATE_BYTES_PER_SECOND
+                )
+                self.__on_ack_timeout()
+                break
+
+            self.__ack_socket.settimeout(remaining)
+            try:
+                reply = self.__ack_socket.recv(2048)
+            except socket.timeout:
+                continue
+
+            if self.__is_awaited_ack(reply):
+                self.round_trip_seconds = time.monotonic() - self.__sync_sent_at
+                self.__bucket.rate_per_second = min(
+                    self.__bucket.rate_per_second + RATE_INCREASE_BYTES_PER_SECOND,
+                    MAX_RATE_BYTES_PER_SECOND
+                )
+                self.__consecutive_ack_timeouts = 0
+                break
+
+        self.__awaited_sequence = None
+
+    def __on_ack_timeout(self):
+        self.__consecutive_ack_timeouts += 1
+        if self.__consecutive_ack_timeouts == ACK_TIMEOUTS_BEFORE_WARNING:
+            print(
+                f"Warning: the last {ACK_TIMEOUTS_BEFORE_WARNING} SYNCs were not acknowledged, " +
+                f"sending at {self.__bucket.rate_per_second / 1024:.0f} KiB/s. Check that " +
+                f"HoloAssist can reach this host on port {self.__ack_socket.getsockname()[1]}.",
+                flush=True
+            )
+
+    def __is_awaited_ack(self, reply: bytes):
+        # HoloAssist also sends plain-text debug messages on the same channel
+        try:
+            msg = json.loads(reply.decode("utf-8"))
+        except ValueError:
+            return False
+
+        # An ack for a later SYNC also acknowledges the previous ones
+        return isinstance(msg, dict) and msg.get("type") == "SYNC_ACK" and \
+            msg.get("sequence", -1) >= self.__awaited_sequence
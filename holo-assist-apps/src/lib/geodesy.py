@@ -0,0 +1,176 @@
+import functools
+
+import numpy as np
+import scipy.spatial.transform
+
+from .holo_assist_types import GeoFixedVertexBuffer
+
+# Batched coordinate conversions. All the functions take and return (N, 3)
+# arrays (a single (3,) point is accepted as well), angles are in radians.
+# WGS84 points are (latitude, longitude, altitude in meters), ECEF and ENU
+# points are in meters.
+#
+# WGS84 <-> ECEF is computed in closed form with NumPy. pyproj is only
+# imported when explicitly requested (`use_pyproj=True`), as importing it
+# and loading the PROJ database is way slower than the conversion itself.
+
+WGS84_SEMI_MAJOR_AXIS = 6378137.0
+WGS84_FLATTENING = 1 / 298.257223563
+WGS84_ECCENTRICITY_SQUARED = WGS84_FLATTENING * (2 - WGS84_FLATTENING)
+
+WGS84_EPSG = 4979
+ECEF_EPSG = 4978
+
+@functools.lru_cache(maxsize=None)
+def get_transformer(source_epsg: int, target_epsg: int):
+    """
+        Creating a transformer is way slower than using it: they
+        are created once and shared by the whole process
+    """
+    import pyproj
+
+    return pyproj.Transformer.from_crs(
+        pyproj.CRS.from_epsg(source_epsg), pyproj.CRS.from_epsg(target_epsg)
+    )
+
+def _transform(source_epsg, target_epsg, points, radians):
+    points = np.asarray(points, dtype=np.float64)
+    flat = points.reshape(-1, 3)
+
+    (a, b, c) = get_transformer(source_epsg, target_epsg).transform(
+        flat[:, 0], flat[:, 1], flat[:, 2], radians=radians
+    )
+    return np.stack([a, b, c], axis=-1).reshape(points.shape)
+
+def wgs84_to_ecef(points_wgs, use_pyproj = False):
+    if use_pyproj:
+        return _transform(WGS84_EPSG, ECEF_EPSG, points_wgs, True)
+
+    points_wgs = np.asarray(points_wgs, dtype=np.float64)
+    phi = points_wgs[..., 0]
+    llambda = points_wgs[..., 1]
+    h = points_wgs[..., 2]
+
+    (sin_phi, cos_phi) = (np.sin(phi), np.cos(phi))
+
+    # Radius of curvature in the prime vertical
+    n = WGS84_SEMI_MAJOR_AXIS / np.sqrt(1 - WGS84_ECCENTRICITY_SQUARED * sin_phi ** 2)
+
+    return np.stack([
+        (n + h) * cos_phi * np.cos(llambda),
+        (n + h) * cos_phi * np.sin(llambda),
+        (n * (1 - WGS84_ECCENTRICITY_SQUARED) + h) * sin_phi
+    ], axis=-1)
+
+def ecef_to_wgs84(points_ecef, use_pyproj = False):
+    """
+        Uses the exact closed-form solution by Vermeille, "Direct transformation
+        from geocentric coordinates to geodetic coordinates" (2002), valid
+        everywhere but in a small region around the center of the Earth
+    """
+    if use_pyproj:
+        return _transform(ECEF_EPSG, WGS84_EPSG, points_ecef, True)
+
+    points_ecef = np.asarray(points_ecef, dtype=np.float64)
+    (x, y, z) = (points_ecef[..., 0], points_ecef[..., 1], points_ecef[..., 2])
+
+    a = WGS84_SEMI_MAJOR_AXIS
+    e2 = WGS84_ECCENTRICITY_SQUARED
+    e4 = e2 ** 2
+
+    distance_from_axis = np.hypot(x, y)
+
+    p = distance_from_axis ** 2 / a ** 2
+    q = (1 - e2) / a ** 2 * z ** 2
+    r = (p + q - e4) / 6
+    s = e4 * p * q / (4 * r ** 3)
+    t = np.cbrt(1 + s + np.sqrt(s * (2 + s)))
+    u = r * (1 + t + 1 / t)
+    v = np.sqrt(u ** 2 + e4 * q)
+    w = e2 * (u + v - q) / (2 * v)
+    k = np.sqrt(u + v + w ** 2) - w
+    d = k * distance_from_axis / (k + e2)
+
+    return np.stack([
+        2 * np.arctan2(z, d + np.hypot(d, z)),
+        np.arctan2(y, x),
+        (k + e2 - 1) / k * np.hypot(d, z)
+    ], axis=-1)
+
+def wgs84_degrees_to_radians(points_wgs_degrees):
+    """
+        Converts latitude and longitude from degrees to radians, keeping the altitude
+    """
+    points = np.array(points_wgs_degrees, dtype=np.float64)
+    points[..., 0:2] = np.radians(points[..., 0:2])
+    return points
+
+def enu_axes(origins_wgs):
+    """
+        Returns the unit vectors (in ECEF) of the East, North and Up axes
+        of the ENU systems centered at `origins_wgs`, each with shape (N, 3)
+    """
+    origins_wgs = np.asarray(origins_wgs, dtype=np.float64)
+    phi = origins_wgs[..., 0]
+    llambda = origins_wgs[..., 1]
+
+    (sin_phi, cos_phi) = (np.sin(phi), np.cos(phi))
+    (sin_lambda, cos_lambda) = (np.sin(llambda), np.cos(llambda))
+
+    east = np.stack([-sin_lambda, cos_lambda, np.zeros_like(phi)], axis=-1)
+    north = np.stack([-sin_phi * cos_lambda, -sin_phi * sin_lambda, cos_phi], axis=-1)
+    up = np.stack([cos_phi * cos_lambda, cos_phi * sin_lambda, sin_phi], axis=-1)
+
+    return (east, north, up)
+
+def enu_to_ecef(points_enu, origins_wgs):
+    """
+        `points_enu` rows are (east, north, up) in meters. `origins_wgs` can
+        be a single origin shared by all points or one origin per point.
+    """
+    points_enu = np.asarray(points_enu, dtype=np.float64)
+    (east, north, up) = enu_axes(origins_wgs)
+
+    return wgs84_to_ecef(origins_wgs) + \
+        points_enu[..., 0:1] * east + \
+        points_enu[..., 1:2] * north + \
+        points_enu[..., 2:3] * up
+
+def ecef_to_enu(points_ecef, origins_wgs):
+    """
+        Inverse of `enu_to_ecef`, returns rows of (east, north, up) in meters
+    """
+    offsets = np.asarray(points_ecef, dtype=np.float64) - wgs84_to_ecef(origins_wgs)
+    (east, north, up) = enu_axes(origins_wgs)
+
+    return np.stack([
+        np.sum(offsets * east, axis=-1),
+        np.sum(offsets * north, axis=-1),
+        np.sum(offsets * up, axis=-1)
+    ], axis=-1)
+
+def geo_fixed_vertices_to_ecef(vertices: GeoFixedVertexBuffer):
+    """
+        Computes where HoloAssist places each vertex of a geo-fixed mesh:
+        the local position (in Unity axes: X east, Y up, Z north) is
+        rotated by the local rotation and then offset from the origin.
+    """
+    local_positions = vertices.local_positions
+    local_rotations = vertices.local_rotations
+
+    if np.any(local_rotations != 0):
+        # HoloAssist composes the local rotation as Z * X * Y
+        rotations = scipy.spatial.transform.Rotation.from_euler(
+            "ZXY", local_rotations[:, [2, 0, 1]]
+        )
+        local_positions = rotations.apply(local_positions)
+
+    points_enu = local_positions[:, [0, 2, 1]]
+
+    # Most meshes share a single origin, there is no need to
+    # compute the same ENU axes for each of their vertices
+    (origins, inverse) = np.unique(vertices.origin_wgs, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    return enu_to_ecef(points_enu, origins[inverse]) if len(origins) > 1 else \
+        enu_to_ecef(points_enu, origins[0])
@@ -0,0 +1,205 @@
+import struct
+
+from typing import List, Optional
+
+import numpy as np
+
+from .holo_assist_types import GeoFixedVertex, ColoredVertex
+from .holo_assist_types import GeoFixedVertexBuffer, ColoredVertexBuffer
+
+# Compact binary alternative to the JSON encoding of the commands that carry
+# vertices and indices, which are by far the largest messages sent to
+# HoloAssist. A binary command has the following layout (little-endian):
+#
+#   magic         2 bytes   b"HA"
+#   version       uint8     FORMAT_VERSION
+#   kind          uint8     one of the *_KIND constants below
+#   id length     uint16    length in bytes of the UTF-8 encoded mesh id
+#   id            bytes     UTF-8 encoded mesh id
+#   start index   int32     -1 when the elements must be appended
+#   count         uint32    number of elements that follow
+#   elements      ...       `count` packed records, see the Struct below
+#
+# Geo-fixed vertices that share their origin, color and rotation can instead
+# be sent as groups (GEO_FIXED_VERTEX_OFFSETS_KIND): `count` is then the total
+# number of vertices, and the elements are replaced by a sequence of groups,
+# each made of a GEO_FIXED_GROUP_HEADER_STRUCT (number of vertices in the
+# group and their shared attributes) followed by that many local positions.
+#
+# Several commands (JSON or binary) can be sent together as a batch, in one
+# or more batch packets (see `HoloAssistService.batch`):
+#
+#   magic         2 bytes   b"HB"
+#   version       uint8     FORMAT_VERSION
+#   batch id      uint32    the same in all the packets of the batch
+#   sequence      uint16    index of this packet in the batch, from 0
+#   packet count  uint16    number of packets in the batch
+#   commands      ...       each a uint16 length followed by the command
+#
+# HoloAssist applies the commands of a batch, in order, only once it has
+# received all of its packets: a batch with a lost packet is not applied.
+#
+# The first byte of a JSON command is always "{" and the first byte of a
+# simulator position update is always 0, so HoloAssist can tell the kinds
+# of packets apart by looking at the first bytes only.
+
+HEADER_MAGIC = b"HA"
+BATCH_MAGIC = b"HB"
+FORMAT_VERSION = 1
+
+GEO_FIXED_VERTICES_KIND = 1
+GEO_FIXED_INDICES_KIND = 2
+PLANE_FIXED_VERTICES_KIND = 3
+PLANE_FIXED_INDICES_KIND = 4
+GEO_FIXED_VERTEX_OFFSETS_KIND = 5
+
+KIND_FOR_MESSAGE_TYPE = {
+    "SET_MESH_VERTICES": GEO_FIXED_VERTICES_KIND,
+    "SET_MESH_INDICES": GEO_FIXED_INDICES_KIND,
+    "PF_SET_MESH_VERTICES": PLANE_FIXED_VERTICES_KIND,
+    "PF_SET_MESH_INDICES": PLANE_FIXED_INDICES_KIND,
+    "SET_MESH_VERTEX_OFFSETS": GEO_FIXED_VERTEX_OFFSETS_KIND,
+}
+
+_HEADER = struct.Struct("<2sBBH")
+_START_INDEX_AND_COUNT = struct.Struct("<iI")
+BATCH_HEADER_STRUCT = struct.Struct("<2sBIHH")
+BATCH_COMMAND_LENGTH_STRUCT = struct.Struct("<H")
+
+# Latitude and longitude need double precision (a float32 radian has a
+# resolution of a few meters on the Earth surface), everything else
+# is converted to float32 by HoloAssist anyway.
+GEO_FIXED_VERTEX_STRUCT = struct.Struct("<3d4f3f3f")
+COLORED_VERTEX_STRUCT = struct.Struct("<3f4f")
+INDEX_STRUCT = struct.Struct("<I")
+GEO_FIXED_GROUP_HEADER_STRUCT = struct.Struct("<I3d4f3f")
+LOCAL_POSITION_STRUCT = struct.Struct("<3f")
+
+# The same layouts as NumPy dtypes, used to encode vertex buffers in one go
+GEO_FIXED_VERTEX_WIRE_DTYPE = np.dtype([
+    ("origin_wgs", "<f8", (3,)),
+    ("color", "<f4", (4,)),
+    ("local_position", "<f4", (3,)),
+    ("local_rotation", "<f4", (3,)),
+])
+
+COLORED_VERTEX_WIRE_DTYPE = np.dtype([
+    ("position", "<f4", (3,)),
+    ("color", "<f4", (4,)),
+])
+
+def encode_header(kind: int, mesh_id: str, start_index: Optional[int], count: int):
+    encoded_id = mesh_id.encode("utf-8")
+    return b"".join([
+        _HEADER.pack(HEADER_MAGIC, FORMAT_VERSION, kind, len(encoded_id)),
+        encoded_id,
+        _START_INDEX_AND_COUNT.pack(-1 if start_index is None else start_index, count)
+    ])
+
+def decode_header(data: bytes):
+    """
+        Returns `(kind, mesh_id, start_index, count, header_size)`,
+        with `start_index` None when the elements must be appended
+    """
+    (magic, version, kind, id_length) = _HEADER.unpack_from(data, 0)
+    if magic != HEADER_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a binary command (magic {magic}, version {version})")
+
+    id_end = _HEADER.size + id_length
+    mesh_id = data[_HEADER.size:id_end].decode("utf-8")
+    (start_index, count) = _START_INDEX_AND_COUNT.unpack_from(data, id_end)
+
+    header_size = id_end + _START_INDEX_AND_COUNT.size
+    return (kind, mesh_id, None if start_index == -1 else start_index, count, header_size)
+
+def encode_geo_fixed_vertices(
+    mesh_id: str, start_index: Optional[int], vertices: List[GeoFixedVertex]
+):
+    if isinstance(vertices, GeoFixedVertexBuffer):
+        header = encode_header(GEO_FIXED_VERTICES_KIND, mesh_id, start_index, len(vertices))
+        return header + vertices.array.astype(GEO_FIXED_VERTEX_WIRE_DTYPE).tobytes()
+
+    pack = GEO_FIXED_VERTEX_STRUCT.pack
+    records = [
+        pack(
+            v.origin_wgs.latitude_rad, v.origin_wgs.longitude_rad, v.origin_wgs.altitude_meters,
+            v.color.red, v.color.green, v.color.blue, 1.0,
+            v.local_position.x, v.local_position.y, v.local_position.z,
+            v.local_rotation.localx_radians, v.local_rotation.localy_radians,
+            v.local_rotation.localz_radians
+        ) for v in vertices
+    ]
+
+    header = encode_header(GEO_FIXED_VERTICES_KIND, mesh_id, start_index, len(records))
+    return header + b"".join(records)
+
+def encode_geo_fixed_vertex_groups(
+    mesh_id: str, start_index: Optional[int], vertices: GeoFixedVertexBuffer, groups
+):
+    """
+        `groups` are consecutive ranges `(begin, end)` of `vertices`,
+        in which all the vertices share the attributes of the first one
+    """
+    count = groups[-1][1] - groups[0][0]
+    encoded = [encode_header(GEO_FIXED_VERTEX_OFFSETS_KIND, mesh_id, start_index, count)]
+
+    for (begin, end) in groups:
+        first = vertices.array[begin]
+        encoded.append(GEO_FIXED_GROUP_HEADER_STRUCT.pack(
+            end - begin, *first["origin_wgs"].tolist(),
+            *first["color"].tolist(), *first["local_rotation"].tolist()
+        ))
+        encoded.append(vertices.local_positions[begin:end].astype("<f4").tobytes())
+
+    return b"".join(encoded)
+
+def encode_colored_vertices(
+    mesh_id: str, start_index: Optional[int], vertices: List[ColoredVertex]
+):
+    if isinstance(vertices, ColoredVertexBuffer):
+        header = encode_header(PLANE_FIXED_VERTICES_KIND, mesh_id, start_index, len(vertices))
+        return header + vertices.array.astype(COLORED_VERTEX_WIRE_DTYPE).tobytes()
+
+    pack = COLORED_VERTEX_STRUCT.pack
+    records = [
+        pack(
+            v.position.x, v.position.y, v.position.z,
+            v.color.red, v.color.green, v.color.blue, 1.0
+        ) for v in vertices
+    ]
+
+    header = encode_header(PLANE_FIXED_VERTICES_KIND, mesh_id, start_index, len(records))
+    return header + b"".join(records)
+
+def encode_indices(kind: int, mesh_id: str, start_index: Optional[int], indices: List[int]):
+    header = encode_header(kind, mesh_id, start_index, len(indices))
+    return header + struct.pack(f"<{len(indices)}I", *map(int, indices))
+
+def encode_batch_packet(batch_id: int, sequence: int, packet_count: int, commands: List[bytes]):
+    encoded = [
+        BATCH_HEADER_STRUCT.pack(BATCH_MAGIC, FORMAT_VERSION, batch_id, sequence, packet_count)
+    ]
+
+    for command in commands:
+        encoded.append(BATCH_COMMAND_LENGTH_STRUCT.pack(len(command)))
+        encoded.append(command)
+
+    return b"".join(encoded)
+
+def decode_batch_packet(data: bytes):
+    """
+        Returns `(batch_id, sequence, packet_count, commands)`
+    """
+    (magic, version, batch_id, sequence, packet_count) = BATCH_HEADER_STRUCT.unpack_from(data, 0)
+    if magic != BATCH_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a batch packet (magic {magic}, version {version})")
+
+    commands = []
+    offset = BATCH_HEADER_STRUCT.size
+    while offset < len(data):
+        (length,) = BATCH_COMMAND_LENGTH_STRUCT.unpack_from(data, offset)
+        offset += BATCH_COMMAND_LENGTH_STRUCT.size
+        commands.append(data[offset:offset + length])
+        offset += length
+
+    return (batch_id, sequence, packet_count, commands)
@@ -1,16 +1,504 @@
+import functools
+import random
 import socket
 import json
 
 from typing import List
-from .holo_assist_types import GeoFixedVertex, ColoredVertex, Vector3, Rotation
+
+import numpy as np
+
+from .holo_assist_types import GeoFixedVertex, ColoredVertex, Vector3, Rotation, GeoFixedMeshHeader
+from .holo_assist_types import ZERO_VECTOR3, ZERO_ROTATION
+from .holo_assist_types import GeoFixedVertexBuffer, ColoredVertexBuffer
+from . import holo_assist_binary, multiplexer
+from .flow_control import PacedSender, DEFAULT_ACK_PORT, DEFAULT_RATE_BYTES_PER_SECOND
+from .reliable_delivery import ReliableSender, frame_overhead
+
+# Largest UDP payload that fits in a single 1500 bytes Ethernet/Wi-Fi frame
+# (1500 - 20 bytes of IPv4 header - 8 bytes of UDP header = 1472), minus some
+# headroom for IP options and VPN/tunnel encapsulation. Bigger datagrams are
+# fragmented at the IP layer, and losing any fragment loses the whole command.
+DEFAULT_MAX_DATAGRAM_BYTES = 1400
+
+def split_in_datagrams(element_sizes: List[int], overhead: int, max_datagram_bytes: int, step = 1):
+    """
+        Splits a list of encoded elements into the ranges `(begin, end)` that
+        must be sent in the same datagram, so that each datagram (elements plus
+        `overhead`) is at most `max_datagram_bytes` long. Elements are kept in
+        groups of `step` (e.g. the two indices of a line). Filling each datagram
+        as much as possible before starting the next one gives the fewest
+        datagrams for an ordered sequence. A group that does not fit on its own
+        is still sent, alone, in its own datagram.
+    """
+    ranges = []
+    begin = 0
+    size = overhead
+
+    for i in range(0, len(element_sizes), step):
+        group_size = sum(element_sizes[i:i + step])
+
+        if i > begin and size + group_size > max_datagram_bytes:
+            ranges.append((begin, i))
+            begin = i
+            size = overhead
+
+        size += group_size
+
+    if begin < len(element_sizes) or len(ranges) == 0:
+        ranges.append((begin, len(element_sizes)))
+
+    return ranges
+
+def split_groups_in_datagrams(
+    runs, group_overheads: List[int], element_sizes: List[int],
+    overhead: int, max_datagram_bytes: int
+):
+    """
+        Like `split_in_datagrams`, for elements sent in groups: `runs` are
+        the ranges `(begin, end)` of elements that can be sent in the same
+        group, and each group costs `group_overheads[run]` on top of its
+        elements. Returns, for each datagram, the list of its groups
+        `(begin, end)`: a run that does not fit in what is left of a
+        datagram continues in a new group in the next one.
+    """
+    datagrams = []
+    groups = []
+    size = overhead
+
+    for ((begin, end), group_overhead) in zip(runs, group_overheads):
+        while begin < end:
+            group_end = begin
+            group_size = group_overhead
+            while group_end < end and \
+                size + group_size + element_sizes[group_end] <= max_datagram_bytes:
+                group_size += element_sizes[group_end]
+                group_end += 1
+
+            if group_end == begin:
+                if len(groups) > 0:
+                    datagrams.append(groups)
+                    (groups, size) = ([], overhead)
+                    continue
+
+                # An element that does not fit on its own is still sent, alone
+                group_size += element_sizes[begin]
+                group_end = begin + 1
+
+            groups.append((begin, group_end))
+            size += group_size
+            begin = group_end
+
+    if len(groups) > 0:
+        datagrams.append(groups)
+
+    return datagrams
+
+class MeshBatch:
+    """
+        Commands for a single mesh, gathered by `HoloAssistService.batch` and
+        sent when the `with` block ends. The methods are the ones of
+        `HoloAssistService`, without the mesh id. Commands are sent in the
+        order they are called, except the commit, which is always sent last.
+    """
+
+    def __init__(self, service, mesh_id, send):
+        self.__service = service
+        self.__send = send
+        self.__commands = []
+        self.__commit = False
+        self.mesh_id = mesh_id
+
+        # Number of packets the batch was sent in, once sent
+        self.packets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Nothing is sent when the block raises: HoloAssist never
+        # sees the first half of an update
+        if exc_type is None:
+            if self.__commit:
+                self.__add(self.__service.commit_mesh_changes)
+            self.packets = self.__send(self.mesh_id, self.__commands)
+
+        return False
+
+    def __add(self, method, *args, **kwargs):
+        self.__commands.append(functools.partial(method, self.mesh_id, *args, **kwargs))
+
+    def create_mesh(self, *args, **kwargs):
+        self.__add(self.__service.create_mesh, *args, **kwargs)
+
+    def activate_mesh(self):
+        self.__add(self.__service.activate_mesh)
+
+    def deactivate_mesh(self):
+        self.__add(self.__service.deactivate_mesh)
+
+    def delete_mesh(self):
+        self.__add(self.__service.delete_mesh)
+
+    def commit_mesh_changes(self):
+        self.__commit = True
+
+    def add_mesh_vertices(self, vertices):
+        self.__add(self.__service.add_mesh_vertices, vertices)
+
+    def replace_mesh_vertices(self, start_index, vertices):
+        self.__add(self.__service.replace_mesh_vertices, start_index, vertices)
+
+    def add_mesh_vertex_offsets(self, header: GeoFixedMeshHeader, local_positions):
+        self.__add(self.__service.add_mesh_vertex_offsets, header, local_positions)
+
+    def replace_mesh_vertex_offsets(self, start_index, header: GeoFixedMeshHeader, local_positions):
+        self.__add(self.__service.replace_mesh_vertex_offsets, start_index, header, local_positions)
+
+    def add_mesh_indices(self, indices: List[int]):
+        self.__add(self.__service.add_mesh_indices, indices)
+
+    def replace_mesh_indices(self, start_index, indices: List[int]):
+        self.__add(self.__service.replace_mesh_indices, start_index, indices)
 
 class HoloAssistService:
-    def __init__(self, hololens_ip, hololens_port):
-        self.__socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    def __init__(
+        self, hololens_ip, hololens_port, binary_encoding = False,
+        max_datagram_bytes = DEFAULT_MAX_DATAGRAM_BYTES,
+        send_rate_bytes_per_second = None, acknowledged = False,
+        ack_port = DEFAULT_ACK_PORT, shared_vertex_attributes = False,
+        reliable = False, send_datagram = None
+    ):
+        # When given, `send_datagram(data, mesh_id)` is called with each
+        # datagram instead of sending it (`AsyncHoloAssistService` only
+        # uses this class to encode the commands), so no socket is opened
+        self.__send_datagram = send_datagram
+        if send_datagram is not None and (reliable or acknowledged or send_rate_bytes_per_second):
+            raise ValueError("send_datagram cannot be combined with reliable or paced sending")
+
+        self.__socket = None if send_datagram is not None else \
+            socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
         self.__hololens_address = (hololens_ip, hololens_port)
 
+        # Reliable mode: every datagram is acknowledged by HoloAssist on
+        # `ack_port`, and retransmitted when lost (see `reliable_delivery`).
+        # Its congestion window also paces the datagrams, so it takes the
+        # place of paced mode.
+        self.__reliable = None
+        if reliable:
+            self.__reliable = ReliableSender(
+                self.__socket, self.__hololens_address, self.__bind_ack_socket(ack_port)
+            )
+            (send_rate_bytes_per_second, acknowledged) = (None, False)
+
+        # Paced mode: datagrams go through a token bucket (see `flow_control`)
+        # instead of being sent as fast as possible. With `acknowledged`, the
+        # rate is adapted to what HoloAssist acknowledges on `ack_port`.
+        self.__pacer = None
+        if send_rate_bytes_per_second is not None or acknowledged:
+            ack_socket = self.__bind_ack_socket(ack_port) if acknowledged else None
+
+            if send_rate_bytes_per_second is None:
+                send_rate_bytes_per_second = DEFAULT_RATE_BYTES_PER_SECOND
+
+            self.__pacer = PacedSender(
+                self.__socket, self.__hololens_address,
+                send_rate_bytes_per_second, ack_socket=ack_socket
+            )
+
+        # When enabled, vertices and indices are sent with the compact
+        # encoding defined in `holo_assist_binary`, every other command
+        # (and everything, when disabled) is still sent as JSON.
+        self.binary_encoding = binary_encoding
+
+        # When enabled, geo-fixed vertices are sent in groups of consecutive
+        # vertices with the same origin, color and rotation: these are sent
+        # once per group, followed by the local position of each vertex
+        # (see `add_mesh_vertex_offsets`), with either encoding.
+        self.shared_vertex_attributes = shared_vertex_attributes
+
+        # Vertices and indices are automatically split in as many commands as
+        # needed to keep each datagram within this size. When replacing
+        # elements, each command carries its own (shifted) start index, when
+        # adding elements each command is appended after the previous one.
+        self.max_datagram_bytes = max_datagram_bytes
+
+        # Commands gathered while a batch is being encoded (see `batch`).
+        # Batch ids start at random, so that HoloAssist does not mistake the
+        # batches of a restarted app for the ones it has already applied.
+        self.__batched = None
+        self.__next_batch_id = random.getrandbits(32)
+
+    def __bind_ack_socket(self, ack_port):
+        # Without `ack_port`, the acks are sent back to the socket that sends
+        # the commands (e.g. by `holo_assist_daemon.py`, to each of its apps)
+        if ack_port is None:
+            return self.__socket
+
+        ack_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        ack_socket.bind(("", ack_port))
+        return ack_socket
+
     def __send(self, msg):
-        self.__socket.sendto(json.dumps(msg).encode('utf-8'), self.__hololens_address)
+        self.__send_raw(json.dumps(msg).encode('utf-8'), msg["id"])
+
+    def __send_raw(self, data: bytes, mesh_id):
+        if self.__batched is not None:
+            self.__batched.append(data)
+        elif self.__send_datagram is not None:
+            self.__send_datagram(data, mesh_id)
+        elif self.__reliable is not None:
+            self.__reliable.send(mesh_id, data)
+        elif self.__pacer is not None:
+            self.__pacer.send(data)
+        else:
+            self.__socket.sendto(data, self.__hololens_address)
+
+    def __max_command_bytes(self, mesh_id):
+        # In reliable mode each datagram also carries its frame
+        if self.__reliable is not None:
+            return self.max_datagram_bytes - frame_overhead(mesh_id)
+        return self.max_datagram_bytes
+
+    @property
+    def pacer(self):
+        """
+            The `PacedSender` used in paced mode (e.g. to read its counters), None otherwise
+        """
+        return self.__pacer
+
+    @property
+    def reliable_sender(self):
+        """
+            The `ReliableSender` used in reliable mode (e.g. to read its
+            loss and retransmission counters), None otherwise
+        """
+        return self.__reliable
+
+    def flush(self):
+        """
+            In reliable mode, and in paced mode with acknowledgments, waits
+            until HoloAssist processed everything sent so far. Does nothing
+            otherwise.
+        """
+        if self.__reliable is not None:
+            self.__reliable.flush()
+        if self.__pacer is not None:
+            self.__pacer.flush()
+
+    def poll(self):
+        """
+            In reliable mode, retransmits what HoloAssist has not acknowledged
+            in time, without waiting (see `ReliableSender.poll`). Does nothing
+            otherwise.
+        """
+        if self.__reliable is not None:
+            self.__reliable.poll()
+
+    def register_with_daemon(self, name = None, namespace = None, weight = 1):
+        """
+            When sending to `holo_assist_daemon.py`: reserves every mesh id
+            that starts with `namespace` for this app, and gives it `weight`
+            times the bandwidth share of the other apps, up to
+            `multiplexer.MAX_WEIGHT` (see `multiplexer`).
+            `name` is only used in the statistics of the daemon.
+        """
+        msg = {
+            "type": multiplexer.HELLO_TYPE, "name": name, "namespace": namespace, "weight": weight
+        }
+        self.__send_raw(json.dumps(msg).encode("utf-8"), None)
+
+    def batch(self, mesh_id, all_or_nothing = True):
+        """
+            Returns a `MeshBatch` that gathers the commands for a mesh
+
+                with service.batch(mesh_id) as b:
+                    b.create_mesh()
+                    b.add_mesh_vertices(vertices)
+                    b.add_mesh_indices(indices)
+                    b.commit_mesh_changes()
+                    b.activate_mesh()
+
+            and sends them, when the block ends, in as few batch packets as
+            possible (see `holo_assist_binary`). HoloAssist applies all the
+            commands of a batch at once, when it has received all its packets.
+            Without `all_or_nothing`, the commands are sent one by one instead,
+            so that a lost datagram only loses its own command (and `packets`
+            stays None).
+        """
+        return MeshBatch(self, mesh_id, self.__send_batch if all_or_nothing else self.__send_each)
+
+    @staticmethod
+    def __send_each(_mesh_id, commands):
+        for command in commands:
+            command()
+
+    def __send_batch(self, mesh_id, commands):
+        if len(commands) == 0:
+            return 0
+
+        # Each command must fit in a batch packet, next to the packet header
+        command_overhead = holo_assist_binary.BATCH_HEADER_STRUCT.size + \
+            holo_assist_binary.BATCH_COMMAND_LENGTH_STRUCT.size
+        max_datagram_bytes = self.max_datagram_bytes
+        self.max_datagram_bytes -= command_overhead
+        self.__batched = []
+
+        try:
+            for command in commands:
+                command()
+            encoded = self.__batched
+        finally:
+            self.max_datagram_bytes = max_datagram_bytes
+            self.__batched = None
+
+        sizes = [holo_assist_binary.BATCH_COMMAND_LENGTH_STRUCT.size + len(e) for e in encoded]
+        packets = split_in_datagrams(
+            sizes, holo_assist_binary.BATCH_HEADER_STRUCT.size, self.__max_command_bytes(mesh_id)
+        )
+
+        batch_id = self.__next_batch_id
+        self.__next_batch_id = (batch_id + 1) % 2 ** 32
+
+        for (sequence, (begin, end)) in enumerate(packets):
+            self.__send_raw(holo_assist_binary.encode_batch_packet(
+                batch_id, sequence, len(packets), encoded[begin:end]
+            ), mesh_id)
+
+        return len(packets)
+
+    def __send_json_elements(self, msg_type, mesh_id, start_index, field, encoded_elements, step):
+        def prefix(start):
+            # Everything up to and including the opening bracket of the element list
+            return json.dumps({
+                "type": msg_type,
+                "id": mesh_id,
+                "startIndex": start,
+                field: []
+            }, separators=(",", ":"))[:-2]
+
+        last_start = None if start_index is None else start_index + len(encoded_elements)
+        overhead = max(len(prefix(start_index)), len(prefix(last_start))) + len("]}")
+
+        # +1 for the comma that separates each element from the next one
+        sizes = [len(e) + 1 for e in encoded_elements]
+
+        max_command_bytes = self.__max_command_bytes(mesh_id)
+        for (begin, end) in split_in_datagrams(sizes, overhead, max_command_bytes, step):
+            start = None if start_index is None else start_index + begin
+            msg = prefix(start) + ",".join(encoded_elements[begin:end]) + "]}"
+            self.__send_raw(msg.encode('utf-8'), mesh_id)
+
+    def __send_binary_elements(
+        self, kind, mesh_id, start_index, elements, record_size, encode, step
+    ):
+        overhead = len(holo_assist_binary.encode_header(kind, mesh_id, 0, 0))
+        sizes = [record_size] * len(elements)
+
+        max_command_bytes = self.__max_command_bytes(mesh_id)
+        for (begin, end) in split_in_datagrams(sizes, overhead, max_command_bytes, step):
+            start = None if start_index is None else start_index + begin
+            self.__send_raw(encode(mesh_id, start, elements[begin:end]), mesh_id)
+
+    def __send_vertex_groups(self, mesh_id, start_index, vertices: GeoFixedVertexBuffer):
+        runs = vertices.shared_attribute_runs()
+        if len(runs) == 0:
+            return
+
+        if self.binary_encoding:
+            kind = holo_assist_binary.GEO_FIXED_VERTEX_OFFSETS_KIND
+            overhead = len(holo_assist_binary.encode_header(kind, mesh_id, 0, 0))
+            group_overheads = [holo_assist_binary.GEO_FIXED_GROUP_HEADER_STRUCT.size] * len(runs)
+            element_sizes = [holo_assist_binary.LOCAL_POSITION_STRUCT.size] * len(vertices)
+
+            for groups in split_groups_in_datagrams(
+                runs, group_overheads, element_sizes, overhead, self.__max_command_bytes(mesh_id)
+            ):
+                start = None if start_index is None else start_index + groups[0][0]
+                self.__send_raw(holo_assist_binary.encode_geo_fixed_vertex_groups(
+                    mesh_id, start, vertices, groups
+                ), mesh_id)
+            return
+
+        def prefix(start):
+            # Everything up to and including the opening bracket of the group list
+            return json.dumps({
+                "type": "SET_MESH_VERTEX_OFFSETS",
+                "id": mesh_id,
+                "startIndex": start,
+                "groups": []
+            }, separators=(",", ":"))[:-2]
+
+        # Each group is its header, without the closing brace, followed by the positions
+        group_prefixes = [
+            json.dumps(vertices.header(begin).prepare_for_json(), separators=(",", ":"))[:-1] +
+            ',"localPositionsMeters":[' for (begin, _) in runs
+        ]
+        encoded_positions = [
+            json.dumps(p, separators=(",", ":")) for p in vertices.local_positions.tolist()
+        ]
+        run_of_vertex = np.repeat(np.arange(len(runs)), [end - begin for (begin, end) in runs])
+
+        last_start = None if start_index is None else start_index + len(vertices)
+        overhead = max(len(prefix(start_index)), len(prefix(last_start))) + len("]}")
+        # +1 for the comma that separates each group (or position) from the next one
+        group_overheads = [len(p) + len("]}") + 1 for p in group_prefixes]
+        element_sizes = [len(e) + 1 for e in encoded_positions]
+
+        for groups in split_groups_in_datagrams(
+            runs, group_overheads, element_sizes, overhead, self.__max_command_bytes(mesh_id)
+        ):
+            start = None if start_index is None else start_index + groups[0][0]
+            encoded_groups = [
+                group_prefixes[run_of_vertex[begin]] + ",".join(encoded_positions[begin:end]) + "]}"
+                for (begin, end) in groups
+            ]
+            msg = prefix(start) + ",".join(encoded_groups) + "]}"
+            self.__send_raw(msg.encode('utf-8'), mesh_id)
+
+    def __send_vertices(self, msg_type, mesh_id, start_index, vertices):
+        if msg_type == "SET_MESH_VERTICES" and self.shared_vertex_attributes:
+            if not isinstance(vertices, GeoFixedVertexBuffer):
+                vertices = GeoFixedVertexBuffer.from_vertices(vertices)
+            self.__send_vertex_groups(mesh_id, start_index, vertices)
+            return
+
+        if not self.binary_encoding:
+            if isinstance(vertices, (GeoFixedVertexBuffer, ColoredVertexBuffer)):
+                as_json = vertices.prepare_for_json()
+            else:
+                as_json = [c.prepare_for_json() for c in vertices]
+
+            encoded = [json.dumps(c, separators=(",", ":")) for c in as_json]
+            self.__send_json_elements(msg_type, mesh_id, start_index, "vertices", encoded, 1)
+            return
+
+        if msg_type == "SET_MESH_VERTICES":
+            record_size = holo_assist_binary.GEO_FIXED_VERTEX_STRUCT.size
+            encode = holo_assist_binary.encode_geo_fixed_vertices
+        else:
+            record_size = holo_assist_binary.COLORED_VERTEX_STRUCT.size
+            encode = holo_assist_binary.encode_colored_vertices
+
+        kind = holo_assist_binary.KIND_FOR_MESSAGE_TYPE[msg_type]
+        self.__send_binary_elements(kind, mesh_id, start_index, vertices, record_size, encode, 1)
+
+    def __send_indices(self, msg_type, mesh_id, start_index, indices):
+        # Indices are always split in pairs, as HoloAssist refuses to
+        # add an odd number of indices (i.e. half a line)
+        if not self.binary_encoding:
+            encoded = [str(int(i)) for i in indices]
+            self.__send_json_elements(msg_type, mesh_id, start_index, "indices", encoded, 2)
+            return
+
+        kind = holo_assist_binary.KIND_FOR_MESSAGE_TYPE[msg_type]
+
+        def encode(mesh_id, start, chunk):
+            return holo_assist_binary.encode_indices(kind, mesh_id, start, chunk)
+
+        self.__send_binary_elements(
+            kind, mesh_id, start_index, indices,
+            holo_assist_binary.INDEX_STRUCT.size, encode, 2
+        )
 
     def create_mesh(
         self, mesh_id, interpolate_on_commit = True,
@@ -50,41 +538,46 @@ class HoloAssistService:
         })
 
     def add_mesh_vertices(self, mesh_id, vertices):
-        self.__send({
-            "type": "SET_MESH_VERTICES",
-            "id": mesh_id,
-            "startIndex": None,
-            "vertices": [c.prepare_for_json() for c in vertices]
-        })
+        self.__send_vertices("SET_MESH_VERTICES", mesh_id, None, vertices)
 
     def replace_mesh_vertices(self, mesh_id, start_index, vertices: List[GeoFixedVertex]):
-        self.__send({
-            "type": "SET_MESH_VERTICES",
-            "id": mesh_id,
-            "startIndex": start_index,
-            "vertices": [c.prepare_for_json() for c in vertices]
-        })
+        self.__send_vertices("SET_MESH_VERTICES", mesh_id, start_index, vertices)
+
+    def add_mesh_vertex_offsets(self, mesh_id, header: GeoFixedMeshHeader, local_positions):
+        """
+            Adds vertices that all share the origin, color and rotation in
+            `header`, and only differ by their `local_positions` (a list of
+            `Vector3` or an array with one row per vertex). The header is
+            only sent once per datagram, whatever `shared_vertex_attributes`.
+        """
+        self.__send_vertex_groups(mesh_id, None, self.__offsets_to_buffer(header, local_positions))
+
+    def replace_mesh_vertex_offsets(
+        self, mesh_id, start_index, header: GeoFixedMeshHeader, local_positions
+    ):
+        self.__send_vertex_groups(
+            mesh_id, start_index, self.__offsets_to_buffer(header, local_positions)
+        )
+
+    @staticmethod
+    def __offsets_to_buffer(header: GeoFixedMeshHeader, local_positions):
+        return GeoFixedVertexBuffer.from_arrays(
+            list(header.origin_wgs),
+            [header.color.red, header.color.green, header.color.blue],
+            np.asarray(local_positions, dtype=np.float64),
+            list(header.local_rotation)
+        )
 
     def add_mesh_indices(self, mesh_id, indices: List[int]):
-        self.__send({
-            "type": "SET_MESH_INDICES",
-            "id": mesh_id,
-            "startIndex": None,
-            "indices": indices
-        })
+        self.__send_indices("SET_MESH_INDICES", mesh_id, None, indices)
 
     def replace_mesh_indices(self, mesh_id, start_index, indices: List[int]):
-        self.__send({
-            "type": "SET_MESH_INDICES",
-            "id": mesh_id,
-            "startIndex": start_index,
-            "indices": indices
-        })
+        self.__send_indices("SET_MESH_INDICES", mesh_id, start_index, indices)
 
     def plane_fixed_create_mesh(
         self, mesh_id,
-        origin_position = Vector3(0, 0, 0),
-        origin_rotation = Rotation(0, 0, 0)
+        origin_position = ZERO_VECTOR3,
+        origin_rotation = ZERO_ROTATION
     ):
         self.__send({
             "type": "PF_CREATE_MESH",
@@ -120,38 +613,18 @@ class HoloAssistService:
         })
 
     def plane_fixed_add_mesh_vertices(self, mesh_id, vertices):
-        self.__send({
-            "type": "PF_SET_MESH_VERTICES",
-            "id": mesh_id,
-            "startIndex": None,
-            "vertices": [c.prepare_for_json() for c in vertices]
-        })
+        self.__send_vertices("PF_SET_MESH_VERTICES", mesh_id, None, vertices)
 
     def plane_fixed_replace_mesh_vertices(
         self, mesh_id, start_index, vertices: List[ColoredVertex]
     ):
-        self.__send({
-            "type": "PF_SET_MESH_VERTICES",
-            "id": mesh_id,
-            "startIndex": start_index,
-            "vertices": [c.prepare_for_json() for c in vertices]
-        })
+        self.__send_vertices("PF_SET_MESH_VERTICES", mesh_id, start_index, vertices)
 
     def plane_fixed_add_mesh_indices(self, mesh_id, indices: List[int]):
-        self.__send({
-            "type": "PF_SET_MESH_INDICES",
-            "id": mesh_id,
-            "startIndex": None,
-            "indices": indices
-        })
+        self.__send_indices("PF_SET_MESH_INDICES", mesh_id, None, indices)
 
     def plane_fixed_replace_mesh_indices(self, mesh_id, start_index, indices: List[int]):
-        self.__send({
-            "type": "PF_SET_MESH_INDICES",
-            "id": mesh_id,
-            "startIndex": start_index,
-            "indices": indices
-        })
+        self.__send_indices("PF_SET_MESH_INDICES", mesh_id, start_index, indices)
 
     def plane_fixed_update_mesh_origin(
         self, mesh_id,
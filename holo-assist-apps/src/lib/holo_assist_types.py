@@ -1,10 +1,34 @@
 import math
 
-class WGS84Point:
-    def __init__(self, latitude_rad, longitude_rad, altitude_meters):
-        self.latitude_rad = latitude_rad
-        self.longitude_rad = longitude_rad
-        self.altitude_meters = altitude_meters
+from typing import NamedTuple
+
+import numpy as np
+
+# All the types below are immutable values: they are tuples underneath (no
+# per-instance `__dict__`), they can be compared, hashed and used as
+# dictionary keys, and the same instance can be safely shared by any number
+# of vertices. Use `_replace` to get a modified copy.
+
+class _ValueType:
+    __slots__ = ()
+
+    # Plain tuples compare equal to any other tuple with the same values,
+    # but a Vector3 should never be equal to a Rotation with the same numbers.
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+class _WGS84PointFields(NamedTuple):
+    latitude_rad: float
+    longitude_rad: float
+    altitude_meters: float
+
+class WGS84Point(_ValueType, _WGS84PointFields):
+    __slots__ = ()
 
     @staticmethod
     def from_degrees(latitude_degrees, longitude_degrees, altitude_meters):
@@ -29,11 +53,13 @@ class WGS84Point:
     def __repr__(self):
         return f"WGS84Point({self.latitude_rad}, {self.longitude_rad}, {self.altitude_meters})"
 
-class Vector3:
-    def __init__(self, x, y, z):
-        self.x = x
-        self.y = y
-        self.z = z
+class _Vector3Fields(NamedTuple):
+    x: float
+    y: float
+    z: float
+
+class Vector3(_ValueType, _Vector3Fields):
+    __slots__ = ()
 
     def prepare_for_json(self):
         return [self.x, self.y, self.z]
@@ -41,15 +67,20 @@ class Vector3:
     def __repr__(self):
         return f"Vector3({self.x}, {self.y}, {self.z})"
 
-class Color:
-    def __init__(self, red, green, blue):
+class _ColorFields(NamedTuple):
+    red: float
+    green: float
+    blue: float
+
+class Color(_ValueType, _ColorFields):
+    __slots__ = ()
+
+    def __new__(cls, red, green, blue):
         assert 0 <= red <= 1.0
         assert 0 <= green <= 1.0
         assert 0 <= blue <= 1.0
 
-        self.red = red
-        self.green = green
-        self.blue = blue
+        return super().__new__(cls, red, green, blue)
 
     def prepare_for_json(self):
         return [self.red, self.green, self.blue, 1.0]
@@ -57,11 +88,13 @@ class Color:
     def __repr__(self):
         return f"Color({self.red}, {self.green}, {self.blue})"
 
-class Rotation:
-    def __init__(self, localx_radians, localy_radians, localz_radians):
-        self.localx_radians = localx_radians
-        self.localy_radians = localy_radians
-        self.localz_radians = localz_radians
+class _RotationFields(NamedTuple):
+    localx_radians: float
+    localy_radians: float
+    localz_radians: float
+
+class Rotation(_ValueType, _RotationFields):
+    __slots__ = ()
 
     @staticmethod
     def from_degrees(localx_degrees, localy_degrees, localz_degrees):
@@ -79,14 +112,17 @@ class Rotation:
     def __repr__(self):
         return f"Rotation({self.localx_radians}, {self.localy_radians}, {self.localz_radians})"
 
-class GeoFixedVertex:
-    def __init__(self, origin_wgs: WGS84Point, color: Color,
-                local_position: Vector3 = Vector3(0, 0, 0),
-                local_rotation: Rotation = Rotation(0, 0, 0)):
-        self.origin_wgs = origin_wgs
-        self.color = color
-        self.local_position = local_position
-        self.local_rotation = local_rotation
+ZERO_VECTOR3 = Vector3(0, 0, 0)
+ZERO_ROTATION = Rotation(0, 0, 0)
+
+class _GeoFixedVertexFields(NamedTuple):
+    origin_wgs: WGS84Point
+    color: Color
+    local_position: Vector3 = ZERO_VECTOR3
+    local_rotation: Rotation = ZERO_ROTATION
+
+class GeoFixedVertex(_ValueType, _GeoFixedVertexFields):
+    __slots__ = ()
 
     def prepare_for_json(self):
         return {
@@ -100,10 +136,34 @@ class GeoFixedVertex:
         return f"Vertex({self.origin_wgs}, {self.color}, " + \
             f"{self.local_position}, {self.local_rotation})"
 
-class ColoredVertex:
-    def __init__(self, position: Vector3, color: Color):
-        self.position = position
-        self.color = color
+class _GeoFixedMeshHeaderFields(NamedTuple):
+    origin_wgs: WGS84Point
+    color: Color
+    local_rotation: Rotation = ZERO_ROTATION
+
+class GeoFixedMeshHeader(_ValueType, _GeoFixedMeshHeaderFields):
+    """
+        Attributes shared by a group of geo-fixed vertices, which then only
+        differ by their local position (see `add_mesh_vertex_offsets`)
+    """
+    __slots__ = ()
+
+    def prepare_for_json(self):
+        return {
+            "originWgs": self.origin_wgs.prepare_for_json(),
+            "color": self.color.prepare_for_json(),
+            "localRotationRadians": self.local_rotation.prepare_for_json()
+        }
+
+    def __repr__(self):
+        return f"GeoFixedMeshHeader({self.origin_wgs}, {self.color}, {self.local_rotation})"
+
+class _ColoredVertexFields(NamedTuple):
+    position: Vector3
+    color: Color
+
+class ColoredVertex(_ValueType, _ColoredVertexFields):
+    __slots__ = ()
 
     def prepare_for_json(self):
         return {
@@ -112,4 +172,195 @@ class ColoredVertex:
         }
 
     def __repr__(self):
-        return f"ColoredVertex({self.position}, {self.color})"
\ No newline at end of file
+        return f"ColoredVertex({self.position}, {self.color})"
+
+# Array-backed alternatives to lists of `GeoFixedVertex` and `ColoredVertex`.
+# Each vertex is a record of a NumPy structured array instead of a tree of
+# five Python objects, which makes a big difference for meshes with thousands
+# of vertices. Values are kept in double precision, exactly like in the
+# per-vertex classes, and are only narrowed when they are encoded.
+# `HoloAssistService` accepts buffers wherever it accepts lists of vertices.
+
+GEO_FIXED_VERTEX_DTYPE = np.dtype([
+    ("origin_wgs", "<f8", (3,)),
+    ("color", "<f8", (4,)),
+    ("local_position", "<f8", (3,)),
+    ("local_rotation", "<f8", (3,)),
+])
+
+COLORED_VERTEX_DTYPE = np.dtype([
+    ("position", "<f8", (3,)),
+    ("color", "<f8", (4,)),
+])
+
+class GeoFixedVertexBuffer:
+    def __init__(self, array: np.ndarray):
+        assert array.dtype == GEO_FIXED_VERTEX_DTYPE
+        self.array = array
+
+    @staticmethod
+    def from_arrays(origin_wgs, color, local_positions, local_rotations = (0, 0, 0)):
+        """
+            Every argument can be either an array with one row per vertex or a
+            single value shared by all vertices. `origin_wgs` is in radians and
+            meters (latitude, longitude, altitude), `color` is RGB.
+        """
+        local_positions = np.asarray(local_positions, dtype=np.float64).reshape(-1, 3)
+
+        array = np.empty(len(local_positions), dtype=GEO_FIXED_VERTEX_DTYPE)
+        array["origin_wgs"] = origin_wgs
+        array["color"][:, 0:3] = color
+        array["color"][:, 3] = 1.0
+        array["local_position"] = local_positions
+        array["local_rotation"] = local_rotations
+
+        return GeoFixedVertexBuffer(array)
+
+    @staticmethod
+    def from_vertices(vertices):
+        return GeoFixedVertexBuffer.from_arrays(
+            [[
+                v.origin_wgs.latitude_rad, v.origin_wgs.longitude_rad, v.origin_wgs.altitude_meters
+            ] for v in vertices],
+            [[v.color.red, v.color.green, v.color.blue] for v in vertices],
+            [[v.local_position.x, v.local_position.y, v.local_position.z] for v in vertices],
+            [[
+                v.local_rotation.localx_radians, v.local_rotation.localy_radians,
+                v.local_rotation.localz_radians
+            ] for v in vertices]
+        )
+
+    @property
+    def origin_wgs(self):
+        return self.array["origin_wgs"]
+
+    @property
+    def colors(self):
+        return self.array["color"]
+
+    @property
+    def local_positions(self):
+        return self.array["local_position"]
+
+    @property
+    def local_rotations(self):
+        return self.array["local_rotation"]
+
+    def shared_attribute_runs(self):
+        """
+            Splits the buffer in the ranges `(begin, end)` of consecutive
+            vertices with the same origin, color and rotation
+        """
+        if len(self.array) == 0:
+            return []
+
+        shared = np.concatenate([self.origin_wgs, self.colors, self.local_rotations], axis=1)
+        changes = np.flatnonzero(np.any(shared[1:] != shared[:-1], axis=1)) + 1
+        bounds = [0] + changes.tolist() + [len(self.array)]
+
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def header(self, i):
+        """
+            The `GeoFixedMeshHeader` of the i-th vertex
+        """
+        vertex = self[i]
+        return GeoFixedMeshHeader(vertex.origin_wgs, vertex.color, vertex.local_rotation)
+
+    def prepare_for_json(self):
+        return [{
+            "originWgs": {
+                "latitudeRadians": o[0],
+                "longitudeRadians": o[1],
+                "altitudeMeters": o[2]
+            },
+            "color": c,
+            "localPositionMeters": p,
+            "localRotationRadians": r
+        } for (o, c, p, r) in zip(
+            self.origin_wgs.tolist(), self.colors.tolist(),
+            self.local_positions.tolist(), self.local_rotations.tolist()
+        )]
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return GeoFixedVertexBuffer(self.array[key])
+
+        record = self.array[key]
+        (red, green, blue, _) = record["color"].tolist()
+
+        return GeoFixedVertex(
+            WGS84Point(*record["origin_wgs"].tolist()), Color(red, green, blue),
+            Vector3(*record["local_position"].tolist()),
+            Rotation(*record["local_rotation"].tolist())
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"GeoFixedVertexBuffer({len(self)} vertices)"
+
+class ColoredVertexBuffer:
+    def __init__(self, array: np.ndarray):
+        assert array.dtype == COLORED_VERTEX_DTYPE
+        self.array = array
+
+    @staticmethod
+    def from_arrays(positions, color):
+        """
+            `color` (RGB) can be either an array with one row per
+            vertex or a single color shared by all vertices.
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        array = np.empty(len(positions), dtype=COLORED_VERTEX_DTYPE)
+        array["position"] = positions
+        array["color"][:, 0:3] = color
+        array["color"][:, 3] = 1.0
+
+        return ColoredVertexBuffer(array)
+
+    @staticmethod
+    def from_vertices(vertices):
+        return ColoredVertexBuffer.from_arrays(
+            [[v.position.x, v.position.y, v.position.z] for v in vertices],
+            [[v.color.red, v.color.green, v.color.blue] for v in vertices]
+        )
+
+    @property
+    def positions(self):
+        return self.array["position"]
+
+    @property
+    def colors(self):
+        return self.array["color"]
+
+    def prepare_for_json(self):
+        return [
+            {"position": p, "color": c}
+            for (p, c) in zip(self.positions.tolist(), self.colors.tolist())
+        ]
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return ColoredVertexBuffer(self.array[key])
+
+        record = self.array[key]
+        (red, green, blue, _) = record["color"].tolist()
+
+        return ColoredVertex(Vector3(*record["position"].tolist()), Color(red, green, blue))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"ColoredVertexBuffer({len(self)} vertices)"
@@ -0,0 +1,150 @@
+import time
+
+import numpy as np
+
+from .holo_assist_service import HoloAssistService
+
+# Two runs of changed lines separated by at most this many unchanged lines are
+# sent as a single command: re-sending a few unchanged lines costs less than
+# the header of another command (and often than another datagram).
+DEFAULT_MAX_GAP_LINES = 8
+
+# The datagrams of an update may be lost (unless the service is in reliable
+# mode), leaving HoloAssist with other indices than the ones recorded as sent.
+# So every this many updates, or once this many seconds passed since the last
+# full send (see `poll`), the whole index buffer is sent again. Both should be
+# disabled (None) in reliable mode, where nothing is lost.
+DEFAULT_FULL_RESYNC_EVERY_UPDATES = 100
+DEFAULT_FULL_RESYNC_SECONDS = 30
+
+def changed_line_ranges(old_lines: np.ndarray, new_lines: np.ndarray, max_gap_lines: int):
+    """
+        Compares two (M, 2) arrays of line indices and returns the ranges of
+        lines `(begin, end)` that must be re-sent to turn `old_lines` into
+        `new_lines`. Runs of changes closer than `max_gap_lines` are merged.
+    """
+    changed = np.flatnonzero(np.any(old_lines != new_lines, axis=1))
+    if changed.size == 0:
+        return []
+
+    is_run_start = np.diff(changed) > max_gap_lines + 1
+    begins = changed[np.concatenate([[True], is_run_start])]
+    ends = changed[np.concatenate([is_run_start, [True]])] + 1
+
+    return list(zip(begins.tolist(), ends.tolist()))
+
+class IndexDeltaSender:
+    """
+        Keeps the last indices sent for each mesh and, on update, only sends
+        the lines that changed since then. Meant for meshes whose index buffer
+        keeps the same size and is rewritten over and over (e.g. lines that
+        get disabled by being replaced with the degenerate line (0, 0)).
+        Every `full_resync_every_updates` updates, all the lines are sent
+        instead, and `poll` sends them once `full_resync_seconds` passed
+        since the last full send (None disables either).
+    """
+
+    def __init__(
+        self, service: HoloAssistService, max_gap_lines = DEFAULT_MAX_GAP_LINES,
+        plane_fixed = False,
+        full_resync_every_updates = DEFAULT_FULL_RESYNC_EVERY_UPDATES,
+        full_resync_seconds = DEFAULT_FULL_RESYNC_SECONDS
+    ):
+        self.service = service
+        self.max_gap_lines = max_gap_lines
+        self.plane_fixed = plane_fixed
+        self.full_resync_every_updates = full_resync_every_updates
+        self.full_resync_seconds = full_resync_seconds
+        self.__sent_lines = {}
+        # Mesh id -> (time of the last full send, updates sent since then)
+        self.__last_full_send = {}
+
+    def add_indices(self, mesh_id, indices):
+        """
+            Same as `add_mesh_indices`, and keeps track of the added indices
+        """
+        lines = np.array(indices, dtype=np.int64).reshape(-1, 2)
+
+        if self.plane_fixed:
+            self.service.plane_fixed_add_mesh_indices(mesh_id, lines.reshape(-1))
+        else:
+            self.service.add_mesh_indices(mesh_id, lines.reshape(-1))
+
+        previous = self.__sent_lines.get(mesh_id, np.zeros((0, 2), dtype=np.int64))
+        self.__sent_lines[mesh_id] = np.concatenate([previous, lines])
+        self.__last_full_send[mesh_id] = (time.monotonic(), 0)
+
+    def update_indices(self, mesh_id, indices):
+        """
+            Replaces the indices of the mesh with `indices`, sending only the
+            changed lines, and commits the changes. Nothing is sent (not even
+            the commit) when nothing changed, unless a full resync is due.
+            Returns whether anything was sent.
+        """
+        lines = np.array(indices, dtype=np.int64).reshape(-1, 2)
+        sent_lines = self.__sent_lines.get(mesh_id)
+
+        if sent_lines is None or sent_lines.shape != lines.shape:
+            raise ValueError(
+                f"Mesh {mesh_id} has {0 if sent_lines is None else len(sent_lines)} " +
+                f"lines, cannot update them with {len(lines)} lines"
+            )
+
+        (last_full_send_time, updates) = self.__last_full_send[mesh_id]
+        is_resync_due = self.full_resync_every_updates is not None and \
+            updates + 1 >= self.full_resync_every_updates
+
+        if is_resync_due and len(lines) > 0:
+            self.__send_full(mesh_id, lines)
+            return True
+
+        ranges = changed_line_ranges(sent_lines, lines, self.max_gap_lines)
+        if len(ranges) == 0:
+            return False
+
+        self.__send_ranges(mesh_id, lines, ranges)
+        self.__last_full_send[mesh_id] = (last_full_send_time, updates + 1)
+        return True
+
+    def poll(self):
+        """
+            Sends all the lines of the meshes whose last full send is older
+            than `full_resync_seconds`. To be called periodically (e.g. from
+            a `Reactor` timer), so that a lost update is repaired even when
+            the indices stop changing.
+        """
+        if self.full_resync_seconds is None:
+            return
+
+        now = time.monotonic()
+        for (mesh_id, (last_full_send_time, _)) in list(self.__last_full_send.items()):
+            lines = self.__sent_lines[mesh_id]
+            if now - last_full_send_time >= self.full_resync_seconds and len(lines) > 0:
+                self.__send_full(mesh_id, lines)
+
+    def forget(self, mesh_id):
+        """
+            To be called when the mesh is deleted
+        """
+        self.__sent_lines.pop(mesh_id, None)
+        self.__last_full_send.pop(mesh_id, None)
+
+    def __send_full(self, mesh_id, lines):
+        self.__send_ranges(mesh_id, lines, [(0, len(lines))])
+        self.__last_full_send[mesh_id] = (time.monotonic(), 0)
+
+    def __send_ranges(self, mesh_id, lines, ranges):
+        for (begin, end) in ranges:
+            if self.plane_fixed:
+                self.service.plane_fixed_replace_mesh_indices(
+                    mesh_id, begin * 2, lines[begin:end].reshape(-1)
+                )
+            else:
+                self.service.replace_mesh_indices(mesh_id, begin * 2, lines[begin:end].reshape(-1))
+
+        if self.plane_fixed:
+            self.service.plane_fixed_commit_mesh_changes(mesh_id)
+        else:
+            self.service.commit_mesh_changes(mesh_id)
+
+        self.__sent_lines[mesh_id] = lines
@@ -0,0 +1,20 @@
+import numpy as np
+
+def filter_lines_by_distance(
+    vertices: np.ndarray, lines: np.ndarray,
+    point: np.ndarray, max_distance_meters: float
+):
+    """
+        `vertices` is a (N, 3) array of positions (e.g. in ECEF) and `lines`
+        a (M, 2) array of zero-based vertex indices. Returns a copy of `lines`
+        in which every line that does not have both endpoints within
+        `max_distance_meters` from `point` is replaced by the degenerate
+        line (0, 0), which HoloAssist does not draw. Keeping the disabled
+        lines in place means that the index buffer never changes size.
+    """
+    offsets = vertices - point
+    squared_distances = np.einsum("ij,ij->i", offsets, offsets)
+    is_vertex_near = squared_distances <= max_distance_meters ** 2
+
+    is_line_near = is_vertex_near[lines[:, 0]] & is_vertex_near[lines[:, 1]]
+    return np.where(is_line_near[:, np.newaxis], lines, 0)
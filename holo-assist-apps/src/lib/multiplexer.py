@@ -0,0 +1,370 @@
+import collections
+import json
+import random
+import struct
+import time
+
+from typing import List, Optional
+from . import holo_assist_binary
+from .reliable_delivery import ReliableReceiver
+
+# Core of `holo_assist_daemon.py`, which sits between the apps and HoloAssist
+# so that several of them can run at the same time over a single connection.
+# Apps send the daemon, on localhost, exactly the datagrams they would send to
+# HoloAssist (started with --daemon, see `prepare_holo_assist_instance`), and
+# each app is told apart by the address of its socket. The daemon:
+# - queues the datagrams of each app separately, and forwards them in deficit
+#   round robin: every app with something to send gets the same share of the
+#   bandwidth (times its weight), so a big upload cannot starve an app that
+#   sends a few small updates (e.g. the terrain culling loop)
+# - merges consecutive small commands, even from different apps, into a
+#   single batch packet of one datagram (see `holo_assist_binary`)
+# - keeps apps from touching each other's meshes (see `MeshNamespaces`)
+# - answers the SYNC of an app once everything the app sent before it has
+#   been forwarded, so that apps started with --ack slow down to their share
+# Apps can first send a hello, to declare their name, namespace and weight:
+#
+#     {"type": "DAEMON_HELLO", "name": "tunnel_generator.py",
+#      "namespace": "TG_TUNNEL_", "weight": 1}
+
+DEFAULT_DAEMON_PORT = 53945
+HELLO_TYPE = "DAEMON_HELLO"
+
+# Bytes added to the deficit of an app at each round: at least one datagram
+DEFAULT_QUANTUM_BYTES = 1500
+# Datagrams of an app that are received while this much is queued are dropped
+DEFAULT_MAX_QUEUED_BYTES = 1024 * 1024
+# Apps that sent nothing for this long are forgotten, and their meshes released
+APP_IDLE_TIMEOUT_SECONDS = 300
+# Highest weight an app can ask for, so that it cannot take the whole link
+MAX_WEIGHT = 8
+
+CREATE_TYPES = {"CREATE_MESH", "PF_CREATE_MESH"}
+DELETE_TYPES = {"DELETE_MESH", "PF_DELETE_MESH"}
+
+_TYPE_FOR_KIND = {
+    kind: msg_type for (msg_type, kind) in holo_assist_binary.KIND_FOR_MESSAGE_TYPE.items()
+}
+
+def command_mesh_ids(packet: bytes):
+    """
+        Returns the `(type, mesh_id)` of each command in `packet` (a JSON or
+        binary command, or a batch packet), binary commands getting the type
+        of the JSON command they replace. Commands without a mesh id (e.g.
+        SYNC) are skipped, and other packets (e.g. the simulator position)
+        have none. Raises a `ValueError` for malformed commands.
+    """
+    if packet[0:2] == holo_assist_binary.BATCH_MAGIC:
+        (_, _, _, commands) = holo_assist_binary.decode_batch_packet(packet)
+        if any(c[0:2] == holo_assist_binary.BATCH_MAGIC for c in commands):
+            raise ValueError("batch packet inside a batch packet")
+        return [c for command in commands for c in command_mesh_ids(command)]
+
+    if packet[0:2] == holo_assist_binary.HEADER_MAGIC:
+        (kind, mesh_id, _, _, _) = holo_assist_binary.decode_header(packet)
+        return [(_TYPE_FOR_KIND[kind], mesh_id)]
+
+    if packet[0:1] == b"{":
+        msg = json.loads(packet.decode("utf-8"))
+        if "id" in msg:
+            if not isinstance(msg["id"], str) or not isinstance(msg.get("type"), str):
+                raise ValueError("the type and the mesh id of a command must be strings")
+            return [(msg["type"], msg["id"])]
+
+    return []
+
+def _control_message(packet: bytes):
+    """
+        Returns the SYNC or the hello in `packet`, None for any other packet
+    """
+    # Both are small, only those are parsed
+    if packet[0:1] != b"{" or len(packet) > 256 or not (b"SYNC" in packet or b"HELLO" in packet):
+        return None
+
+    msg = json.loads(packet.decode("utf-8"))
+    return msg if msg.get("type") in ["SYNC", HELLO_TYPE] else None
+
+class MultiplexedApp:
+    def __init__(self, address, now):
+        self.address = address
+        self.name = f"{address[0]}:{address[1]}"
+        self.namespace = None
+        self.weight = 1
+        self.last_seen = now
+
+        # (datagram, None) or, for a SYNC, (None, its SYNC_ACK)
+        self.queue = collections.deque()
+        self.queued_bytes = 0
+        self.deficit = 0
+
+        self.received_datagrams = 0
+        self.forwarded_datagrams = 0
+        self.forwarded_bytes = 0
+        self.rejected_datagrams = 0
+        self.dropped_datagrams = 0
+
+class MeshNamespaces:
+    """
+        Which app each mesh id belongs to. An app owns the ids it creates,
+        until it deletes them, and, when it declares a namespace, every id
+        that starts with it. Ids that nobody owns can be used by any app
+        (e.g. `delete_meshes.py`, or meshes created before the daemon).
+    """
+
+    def __init__(self):
+        self.__owners = {}
+        self.__prefixes = {}
+
+    def owner(self, mesh_id):
+        if mesh_id in self.__owners:
+            return self.__owners[mesh_id]
+
+        for (prefix, app) in self.__prefixes.items():
+            if mesh_id.startswith(prefix):
+                return app
+
+        return None
+
+    def claim_prefix(self, app: MultiplexedApp, prefix: str):
+        """
+            Returns the app that already owns part of the namespace, if any
+        """
+        for (other_prefix, other) in self.__prefixes.items():
+            overlaps = other_prefix.startswith(prefix) or prefix.startswith(other_prefix)
+            if other is not app and overlaps:
+                return other
+
+        for (mesh_id, other) in self.__owners.items():
+            if other is not app and mesh_id.startswith(prefix):
+                return other
+
+        self.__prefixes[prefix] = app
+        return None
+
+    def check(self, app: MultiplexedApp, commands):
+        """
+            Returns the first mesh id of `commands` (see `command_mesh_ids`)
+            owned by another app, and None when `app` may send them all
+        """
+        for (_, mesh_id) in commands:
+            owner = self.owner(mesh_id)
+            if owner is not None and owner is not app:
+                return mesh_id
+
+        return None
+
+    def apply(self, app: MultiplexedApp, commands):
+        for (msg_type, mesh_id) in commands:
+            if msg_type in CREATE_TYPES:
+                self.__owners[mesh_id] = app
+            elif msg_type in DELETE_TYPES:
+                self.__owners.pop(mesh_id, None)
+
+    def release(self, app: MultiplexedApp):
+        self.__owners = {k: v for (k, v) in self.__owners.items() if v is not app}
+        self.__prefixes = {k: v for (k, v) in self.__prefixes.items() if v is not app}
+
+class Multiplexer:
+    def __init__(
+        self, max_datagram_bytes, quantum_bytes = DEFAULT_QUANTUM_BYTES,
+        max_queued_bytes = DEFAULT_MAX_QUEUED_BYTES
+    ):
+        """
+            Merged datagrams are at most `max_datagram_bytes` long
+        """
+        self.max_datagram_bytes = max_datagram_bytes
+        self.quantum_bytes = quantum_bytes
+        self.max_queued_bytes = max_queued_bytes
+
+        self.apps = {}
+        self.namespaces = MeshNamespaces()
+
+        # Apps with queued datagrams, the next one to send first
+        self.__active = collections.deque()
+        self.__replies = []
+        self.__next_batch_id = random.getrandbits(32)
+
+        self.forwarded_datagrams = 0
+        self.merged_datagrams = 0
+
+    @property
+    def has_queued(self):
+        return len(self.__active) > 0
+
+    def receive(self, packet: bytes, address, now = None) -> Optional[str]:
+        """
+            Queues a datagram received from the app at `address`. Returns
+            why the datagram was not queued, None when it was.
+        """
+        now = time.monotonic() if now is None else now
+
+        app = self.apps.get(address)
+        if app is None:
+            app = MultiplexedApp(address, now)
+            self.apps[address] = app
+
+        app.last_seen = now
+        app.received_datagrams += 1
+
+        if len(packet) == 0:
+            return None
+
+        if ReliableReceiver.is_frame(packet):
+            app.rejected_datagrams += 1
+            return "reliable frames cannot be multiplexed"
+
+        try:
+            control = _control_message(packet)
+            if control is not None and control["type"] == HELLO_TYPE:
+                return self.__hello(app, control)
+            if control is not None:
+                self.__enqueue(app, None, {"type": "SYNC_ACK", "sequence": control["sequence"]})
+                return None
+
+            commands = command_mesh_ids(packet)
+        except (ValueError, KeyError, struct.error, RecursionError) as e:
+            # RecursionError: JSON nested too deeply
+            app.rejected_datagrams += 1
+            return f"invalid datagram ({e})"
+
+        mesh_id = self.namespaces.check(app, commands)
+        if mesh_id is not None:
+            app.rejected_datagrams += 1
+            return f"mesh {mesh_id} belongs to {self.namespaces.owner(mesh_id).name}"
+
+        if app.queued_bytes + len(packet) > self.max_queued_bytes:
+            app.dropped_datagrams += 1
+            return "queue full"
+
+        self.namespaces.apply(app, commands)
+        self.__enqueue(app, packet, None)
+        return None
+
+    def next_datagram(self) -> Optional[bytes]:
+        """
+            The next datagram to send to HoloAssist, None when nothing is queued
+        """
+        first = self.__pop(lambda data: True)
+        if first is None:
+            return None
+        if not self.__can_merge(first):
+            return first
+
+        commands = [first]
+        size = holo_assist_binary.BATCH_HEADER_STRUCT.size + \
+            holo_assist_binary.BATCH_COMMAND_LENGTH_STRUCT.size + len(first)
+
+        def fits(data):
+            merged_size = size + holo_assist_binary.BATCH_COMMAND_LENGTH_STRUCT.size + len(data)
+            return self.__can_merge(data) and merged_size <= self.max_datagram_bytes
+
+        while True:
+            data = self.__pop(fits)
+            if data is None:
+                break
+            commands.append(data)
+            size += holo_assist_binary.BATCH_COMMAND_LENGTH_STRUCT.size + len(data)
+
+        if len(commands) == 1:
+            return first
+
+        batch_id = self.__next_batch_id
+        self.__next_batch_id = (batch_id + 1) % 2 ** 32
+        self.merged_datagrams += 1
+        return holo_assist_binary.encode_batch_packet(batch_id, 0, 1, commands)
+
+    def take_replies(self):
+        """
+            Returns the `(address, reply)` to send to the apps since the previous call
+        """
+        (replies, self.__replies) = (self.__replies, [])
+        return replies
+
+    def expire(self, now = None) -> List[MultiplexedApp]:
+        """
+            Forgets the apps idle for too long, and returns them
+        """
+        now = time.monotonic() if now is None else now
+
+        expired = [
+            app for app in self.apps.values()
+            if len(app.queue) == 0 and now - app.last_seen > APP_IDLE_TIMEOUT_SECONDS
+        ]
+        for app in expired:
+            del self.apps[app.address]
+            self.namespaces.release(app)
+
+        return expired
+
+    def __hello(self, app: MultiplexedApp, msg):
+        (name, namespace, weight) = (msg.get("name"), msg.get("namespace"), msg.get("weight", 1))
+        if not all(value is None or isinstance(value, str) for value in (name, namespace)):
+            raise ValueError("the name and the namespace must be strings")
+        if isinstance(weight, bool) or not isinstance(weight, int) or not 1 <= weight <= MAX_WEIGHT:
+            raise ValueError(f"the weight must be an integer from 1 to {MAX_WEIGHT}")
+
+        if name:
+            app.name = f"{name} ({app.address[0]}:{app.address[1]})"
+        app.weight = weight
+
+        if namespace:
+            owner = self.namespaces.claim_prefix(app, namespace)
+            if owner is not None:
+                app.rejected_datagrams += 1
+                return f"namespace {namespace} overlaps with the one of {owner.name}"
+            app.namespace = namespace
+
+        return None
+
+    @staticmethod
+    def __can_merge(data: bytes):
+        # Batch packets may be part of a multi-packet batch, and anything
+        # else than a command (e.g. the simulator position) is left alone
+        return data[0:1] == b"{" or data[0:2] == holo_assist_binary.HEADER_MAGIC
+
+    def __enqueue(self, app: MultiplexedApp, data, reply):
+        if len(app.queue) == 0:
+            self.__active.append(app)
+
+        app.queue.append((data, reply))
+        if data is not None:
+            app.queued_bytes += len(data)
+
+    def __pop(self, accepts):
+        # Deficit round robin: the app in front sends while its deficit
+        # covers its next datagram, and otherwise gets one more quantum
+        # and waits for its next turn
+        while len(self.__active) > 0:
+            app = self.__active[0]
+            (data, reply) = app.queue[0]
+
+            if data is None:
+                app.queue.popleft()
+                self.__replies.append((app.address, json.dumps(reply).encode("utf-8")))
+                self.__retire_if_idle(app)
+                continue
+
+            if app.deficit < len(data):
+                app.deficit += self.quantum_bytes * app.weight
+                self.__active.rotate(-1)
+                continue
+
+            if not accepts(data):
+                return None
+
+            app.queue.popleft()
+            app.deficit -= len(data)
+            app.queued_bytes -= len(data)
+            app.forwarded_datagrams += 1
+            app.forwarded_bytes += len(data)
+            self.forwarded_datagrams += 1
+            self.__retire_if_idle(app)
+            return data
+
+        return None
+
+    def __retire_if_idle(self, app: MultiplexedApp):
+        # An app that has nothing left to send does not keep its deficit
+        if len(app.queue) == 0:
+            app.deficit = 0
+            self.__active.popleft()
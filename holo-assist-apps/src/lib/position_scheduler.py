@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+
+# The simulator sends its position way more often than an app can (or needs
+# to) update its augmentation. The scheduler decides which positions are
+# worth processing:
+# - updates are never more frequent than what the processing time allows
+#   (see DEFAULT_MAX_LOAD)
+# - updates are skipped while the aircraft moved less than `min_move_meters`
+#   since the last update
+# - when moving, an update is due whenever the aircraft is expected to have
+#   moved `min_move_meters`, and at least every `latency_budget_seconds`
+# The speed used is the 3D speed computed from the received positions.
+
+DEFAULT_MIN_MOVE_METERS = 20
+DEFAULT_LATENCY_BUDGET_SECONDS = 0.5
+
+# Maximum fraction of time spent processing updates, the rest is left to
+# receiving packets (and to everything else running on the same machine)
+DEFAULT_MAX_LOAD = 0.5
+
+# Weight of the newest sample in the moving averages
+_SMOOTHING = 0.2
+
+class PositionUpdateScheduler:
+    def __init__(
+        self, min_move_meters = DEFAULT_MIN_MOVE_METERS,
+        latency_budget_seconds = DEFAULT_LATENCY_BUDGET_SECONDS,
+        max_load = DEFAULT_MAX_LOAD
+    ):
+        self.min_move_meters = min_move_meters
+        self.latency_budget_seconds = latency_budget_seconds
+        self.max_load = max_load
+
+        self.processing_seconds = 0
+        self.speed_meters_per_second = 0
+
+        self.__last_position = None
+        self.__last_position_time = None
+        self.__last_update_position = None
+        self.__last_update_time = -math.inf
+        self.__is_update_requested = True
+
+    def request_update(self):
+        """
+            Makes the next update due as soon as the processing time allows,
+            even if the aircraft did not move (e.g. because the settings of
+            the augmentation changed)
+        """
+        self.__is_update_requested = True
+
+    def update_interval(self):
+        """
+            Seconds between two updates, given the current processing
+            time and speed of the aircraft
+        """
+        fastest = self.processing_seconds / self.max_load
+
+        if self.speed_meters_per_second > 0:
+            time_to_move = self.min_move_meters / self.speed_meters_per_second
+        else:
+            time_to_move = math.inf
+
+        return max(fastest, min(time_to_move, self.latency_budget_seconds))
+
+    @property
+    def is_update_requested(self):
+        return self.__is_update_requested
+
+    @property
+    def last_position(self):
+        return self.__last_position
+
+    def position_received(self, now, position):
+        """
+            To be called with each received position (ECEF, meters) and the
+            time at which it was received (seconds, monotonic)
+        """
+        position = np.asarray(position, dtype=np.float64)
+
+        if self.__last_position is not None and now > self.__last_position_time:
+            distance = np.linalg.norm(position - self.__last_position)
+            speed = distance / (now - self.__last_position_time)
+
+            self.speed_meters_per_second = \
+                (1 - _SMOOTHING) * self.speed_meters_per_second + _SMOOTHING * speed
+
+        self.__last_position = position
+        self.__last_position_time = now
+
+    def is_update_due(self, now):
+        """
+            Whether the last received position should be processed now
+        """
+        if self.__last_position is None:
+            return False
+
+        elapsed = now - self.__last_update_time
+
+        if self.__is_update_requested:
+            return elapsed >= self.processing_seconds / self.max_load
+
+        if elapsed < self.update_interval():
+            return False
+
+        moved = np.linalg.norm(self.__last_position - self.__last_update_position)
+        return moved >= self.min_move_meters
+
+    def update_done(self, now, position, processing_seconds):
+        """
+            To be called after each update, with the position it was done for
+        """
+        self.__last_update_time = now
+        self.__last_update_position = np.asarray(position, dtype=np.float64)
+        self.__is_update_requested = False
+
+        self.processing_seconds = processing_seconds if self.processing_seconds == 0 else \
+            (1 - _SMOOTHING) * self.processing_seconds + _SMOOTHING * processing_seconds
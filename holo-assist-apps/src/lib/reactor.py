@@ -0,0 +1,218 @@
+import heapq
+import itertools
+import selectors
+import socket
+import struct
+import time
+
+# Single-threaded event loop for HoloAssist apps: handlers are registered
+# for UDP sockets (e.g. the simulator position, the cockpit buttons), TCP
+# connections and timers, and each one is called as soon as its data is ready (or its timer
+# expires), instead of polling the sockets one after the other.
+
+DEFAULT_RECEIVE_BUFFER_BYTES = 2048
+
+class Timer:
+    def __init__(self, interval_seconds, handler, repeat):
+        self.interval_seconds = interval_seconds
+        self.handler = handler
+        self.repeat = repeat
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+class _UdpListener:
+    def __init__(self, sock, handler, buffer_size, latest_only, with_address):
+        self.sock = sock
+        self.handler = handler
+        self.buffer_size = buffer_size
+        self.latest_only = latest_only
+        self.with_address = with_address
+
+class _TcpServer:
+    def __init__(self, sock, connection_handler, buffer_size):
+        self.sock = sock
+        self.connection_handler = connection_handler
+        self.buffer_size = buffer_size
+
+class _TcpConnection:
+    def __init__(self, sock, handler, buffer_size):
+        self.sock = sock
+        self.handler = handler
+        self.buffer_size = buffer_size
+
+class Reactor:
+    def __init__(self):
+        self.__selector = selectors.DefaultSelector()
+        self.__timers = []
+        # Breaks ties between timers that expire at the same time
+        self.__timer_sequence = itertools.count()
+        self.__is_running = False
+
+    def add_udp_socket(
+        self, sock: socket.socket, handler,
+        buffer_size = DEFAULT_RECEIVE_BUFFER_BYTES, latest_only = False,
+        with_address = False
+    ):
+        """
+            Calls `handler(packet)` for each packet received on `sock`. With
+            `latest_only`, all the packets already queued are read and the
+            handler is only called with the most recent one: useful for
+            streams in which each packet supersedes the previous ones (e.g.
+            the simulator position), when the handler is slower than the stream.
+            With `with_address`, the handler is called with `(packet, address)`.
+        """
+        sock.setblocking(False)
+        listener = _UdpListener(sock, handler, buffer_size, latest_only, with_address)
+        self.__selector.register(sock, selectors.EVENT_READ, listener)
+        return sock
+
+    def add_udp_listener(self, address, handler, **kwargs):
+        """
+            Binds a new UDP socket to `address` (ip, port), see `add_udp_socket`
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(address)
+        return self.add_udp_socket(sock, handler, **kwargs)
+
+    def add_multicast_listener(self, group, port, handler, interface_ip = None, **kwargs):
+        """
+            Joins the multicast `group` (on all the interfaces, unless
+            `interface_ip` is given), see `add_udp_socket`
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", port))
+
+        if interface_ip is None:
+            mreq = struct.pack("4sl", socket.inet_aton(group), socket.INADDR_ANY)
+        else:
+            mreq = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface_ip))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+        return self.add_udp_socket(sock, handler, **kwargs)
+
+    def add_tcp_listener(self, address, connection_handler, buffer_size = 65536):
+        """
+            Accepts TCP connections on `address` (ip, port). For each one,
+            `connection_handler(peer_address)` is called and must return the
+            handler of its data: it is called with each chunk of bytes
+            received (with no framing), and with b"" when the peer closes.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(address)
+        sock.listen()
+        sock.setblocking(False)
+
+        server = _TcpServer(sock, connection_handler, buffer_size)
+        self.__selector.register(sock, selectors.EVENT_READ, server)
+        return sock
+
+    def remove_socket(self, sock: socket.socket):
+        self.__selector.unregister(sock)
+
+    def add_timer(self, interval_seconds, handler, repeat = True):
+        """
+            Calls `handler()` after `interval_seconds`, and then every
+            `interval_seconds` if `repeat`. Returns the timer, to cancel it.
+        """
+        timer = Timer(interval_seconds, handler, repeat)
+        self.__schedule(timer, time.monotonic() + interval_seconds)
+        return timer
+
+    def stop(self):
+        """
+            Makes `run` return, can be called from any handler
+        """
+        self.__is_running = False
+
+    def run(self):
+        self.__is_running = True
+
+        while self.__is_running:
+            self.__run_expired_timers()
+            if not self.__is_running:
+                break
+
+            for (key, _) in self.__selector.select(self.__time_to_next_timer()):
+                if isinstance(key.data, _UdpListener):
+                    self.__receive(key.data)
+                elif isinstance(key.data, _TcpServer):
+                    self.__accept(key.data)
+                else:
+                    self.__receive_stream(key.data)
+
+    def __accept(self, server: _TcpServer):
+        try:
+            (sock, peer_address) = server.sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+
+        sock.setblocking(False)
+
+        handler = server.connection_handler(peer_address)
+        connection = _TcpConnection(sock, handler, server.buffer_size)
+        self.__selector.register(sock, selectors.EVENT_READ, connection)
+
+    def __receive_stream(self, connection: _TcpConnection):
+        try:
+            data = connection.sock.recv(connection.buffer_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionError:
+            data = b""
+
+        if len(data) == 0:
+            self.__selector.unregister(connection.sock)
+            connection.sock.close()
+
+        connection.handler(data)
+
+    def __receive(self, listener: _UdpListener):
+        latest = None
+
+        while True:
+            try:
+                (packet, address) = listener.sock.recvfrom(listener.buffer_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # On Windows, a datagram sent from this socket was refused
+                # by its destination (e.g. an app that exited)
+                continue
+
+            arguments = (packet, address) if listener.with_address else (packet,)
+
+            if listener.latest_only:
+                latest = arguments
+            else:
+                listener.handler(*arguments)
+
+        if latest is not None:
+            listener.handler(*latest)
+
+    def __schedule(self, timer, due_time):
+        heapq.heappush(self.__timers, (due_time, next(self.__timer_sequence), timer))
+
+    def __time_to_next_timer(self):
+        if len(self.__timers) == 0:
+            return None
+
+        return max(self.__timers[0][0] - time.monotonic(), 0)
+
+    def __run_expired_timers(self):
+        now = time.monotonic()
+
+        while len(self.__timers) > 0 and self.__timers[0][0] <= now:
+            (due_time, _, timer) = heapq.heappop(self.__timers)
+            if timer.is_cancelled:
+                continue
+
+            timer.handler()
+
+            if timer.repeat and not timer.is_cancelled:
+                # Scheduled from the previous due time, so that the timer does
+                # not drift, unless it is late by more than a whole interval
+                self.__schedule(timer, max(due_time + timer.interval_seconds, now))
@@ -0,0 +1,448 @@
+import json
+import random
+import socket
+import struct
+import time
+
+from typing import List
+
+# Optional reliable delivery of the commands sent to HoloAssist. Each
+# datagram is wrapped in a frame that carries the id of the mesh it is
+# about and a sequence number, counted separately for each mesh:
+#
+#   magic         2 bytes   b"HR"
+#   version       uint8     FORMAT_VERSION
+#   session       uint32    chosen at random by each sender
+#   id length     uint16    length in bytes of the UTF-8 encoded mesh id
+#   id            bytes     UTF-8 encoded mesh id
+#   sequence      uint32    0, 1, 2, ... for each mesh of a session
+#   command       ...       the JSON, binary or batch datagram
+#
+# HoloAssist applies the commands of each mesh exactly once and in order:
+# duplicates are dropped, and a command received before the ones that
+# precede it is held back until they arrive. Meshes are independent, so a
+# lost command only holds back the commands of its own mesh. Once per frame,
+# for each mesh it received frames for, HoloAssist answers on its debug UDP
+# channel with a selective ack:
+#
+#   {"type": "RELIABLE_ACK", "session": ..., "id": ..., "next": n, "ranges": [[begin, end], ...]}
+#
+# where `next` is the first sequence number not received yet, and `ranges`
+# are the (half-open) ranges of sequence numbers received after it.
+#
+# The sender keeps each frame until it is acknowledged. It retransmits it
+# when no ack arrives within a timeout derived from the measured round trip
+# time, or as soon as DUPLICATE_ACK_THRESHOLD later frames of the same mesh
+# are acknowledged. The number of frames in flight is bounded by a congestion
+# window that grows with every ack (as TCP does), up to `window_datagrams`.
+# On Wi-Fi most losses are not caused by congestion, so instead of halving
+# the window on loss, it is reduced to the rate at which frames are actually
+# being acknowledged times the round trip time (as TCP Westwood does): a
+# random loss barely slows the sender down, while HoloAssist processing
+# fewer commands (hence acknowledging fewer) does. The sender goes as fast as
+# the link and HoloAssist absorb, without fixed delays.
+
+FRAME_MAGIC = b"HR"
+FORMAT_VERSION = 1
+
+_FRAME_HEADER = struct.Struct("<2sBIH")
+_SEQUENCE = struct.Struct("<I")
+
+DEFAULT_WINDOW_DATAGRAMS = 64
+DEFAULT_MAX_RETRANSMITS = 10
+INITIAL_CONGESTION_WINDOW = 4
+DUPLICATE_ACK_THRESHOLD = 3
+
+INITIAL_RETRANSMIT_TIMEOUT_SECONDS = 0.5
+MIN_RETRANSMIT_TIMEOUT_SECONDS = 0.1
+MAX_RETRANSMIT_TIMEOUT_SECONDS = 2
+
+# Frames received this far ahead of the first missing one are dropped, which
+# bounds the memory used by the receiver (the sender retransmits them)
+DEFAULT_MAX_BUFFERED_FRAMES = 1024
+MAX_ACK_RANGES = 16
+
+def frame_overhead(mesh_id: str):
+    """
+        Bytes added to a command of the mesh by its frame
+    """
+    return _FRAME_HEADER.size + len(mesh_id.encode("utf-8")) + _SEQUENCE.size
+
+def encode_frame(session: int, mesh_id: str, sequence: int, command: bytes):
+    encoded_id = mesh_id.encode("utf-8")
+    return b"".join([
+        _FRAME_HEADER.pack(FRAME_MAGIC, FORMAT_VERSION, session, len(encoded_id)),
+        encoded_id,
+        _SEQUENCE.pack(sequence),
+        command
+    ])
+
+def decode_frame(data: bytes):
+    """
+        Returns `(session, mesh_id, sequence, command)`
+    """
+    (magic, version, session, id_length) = _FRAME_HEADER.unpack_from(data, 0)
+    if magic != FRAME_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a reliable frame (magic {magic}, version {version})")
+
+    id_end = _FRAME_HEADER.size + id_length
+    mesh_id = data[_FRAME_HEADER.size:id_end].decode("utf-8")
+    (sequence,) = _SEQUENCE.unpack_from(data, id_end)
+
+    return (session, mesh_id, sequence, data[id_end + _SEQUENCE.size:])
+
+class _Frame:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.sent_at = None
+        self.retransmits = 0
+        self.fast_retransmitted = False
+
+class ReliableSender:
+    def __init__(
+        self, sock: socket.socket, address, ack_socket: socket.socket,
+        window_datagrams = DEFAULT_WINDOW_DATAGRAMS,
+        max_retransmits = DEFAULT_MAX_RETRANSMITS
+    ):
+        """
+            Sends the datagrams to `address` and reads the acks of HoloAssist
+            from `ack_socket`. At most `window_datagrams` are in flight, and a
+            datagram that is still not acknowledged after `max_retransmits`
+            raises a `TimeoutError`.
+        """
+        self.__socket = sock
+        self.__address = address
+        self.__ack_socket = ack_socket
+        self.window_datagrams = window_datagrams
+        self.max_retransmits = max_retransmits
+
+        self.__session = random.getrandbits(32)
+        self.__next_sequence = {}
+        # Mesh id -> sequence number -> frame, for the frames not acknowledged yet
+        self.__in_flight = {}
+        self.__in_flight_count = 0
+
+        self.__congestion_window = float(INITIAL_CONGESTION_WINDOW)
+        self.__slow_start_threshold = float(window_datagrams)
+        # Losses of frames sent before this time were caused by the same
+        # congestion as a loss already handled, and do not shrink the window again
+        self.__recovered_at = 0
+
+        self.__smoothed_round_trip = None
+        self.__round_trip_variation = None
+        self.retransmit_timeout_seconds = INITIAL_RETRANSMIT_TIMEOUT_SECONDS
+
+        # Rate at which frames are acknowledged (frames per second), measured
+        # over one round trip at a time
+        self.__ack_rate = None
+        self.__ack_rate_sample_start = None
+        self.__ack_rate_sample_frames = 0
+
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.retransmitted_datagrams = 0
+        self.lost_datagrams = 0
+        self.acked_datagrams = 0
+        self.round_trip_seconds = None
+
+    @property
+    def congestion_window(self):
+        return self.__congestion_window
+
+    @property
+    def in_flight_datagrams(self):
+        return self.__in_flight_count
+
+    def send(self, mesh_id: str, data: bytes):
+        self.__wait_until(
+            lambda: self.__in_flight_count < min(self.__congestion_window, self.window_datagrams)
+        )
+
+        # The ack rate is only measured while there are frames in flight
+        if self.__in_flight_count == 0:
+            (self.__ack_rate_sample_start, self.__ack_rate_sample_frames) = (time.monotonic(), 0)
+
+        sequence = self.__next_sequence.get(mesh_id, 0)
+        self.__next_sequence[mesh_id] = sequence + 1
+
+        frame = _Frame(encode_frame(self.__session, mesh_id, sequence, data))
+        self.__in_flight.setdefault(mesh_id, {})[sequence] = frame
+        self.__in_flight_count += 1
+        self.__transmit(frame)
+
+    def flush(self):
+        """
+            Waits until HoloAssist acknowledged everything sent so far
+        """
+        self.__wait_until(lambda: self.__in_flight_count == 0)
+
+    def poll(self):
+        """
+            Handles the acks already received and retransmits the frames
+            whose timeout expired, without waiting: frames are otherwise
+            only retransmitted while sending or flushing, so apps that stay
+            idle between updates (e.g. in a `Reactor`) call it periodically
+        """
+        self.__receive_acks(0)
+        self.__retransmit_expired(time.monotonic())
+
+    def __transmit(self, frame: _Frame):
+        frame.sent_at = time.monotonic()
+        self.__socket.sendto(frame.data, self.__address)
+
+        self.sent_datagrams += 1
+        self.sent_bytes += len(frame.data)
+
+    def __retransmit(self, mesh_id, sequence, frame: _Frame, timeout: bool):
+        if frame.retransmits >= self.max_retransmits:
+            raise TimeoutError(
+                f"HoloAssist did not acknowledge command {sequence} of mesh {mesh_id!r} " +
+                f"after {frame.retransmits} retransmissions"
+            )
+
+        # Frames that needed retransmissions, however many
+        if frame.retransmits == 0:
+            self.lost_datagrams += 1
+        self.__on_loss(frame, timeout)
+
+        frame.retransmits += 1
+        self.retransmitted_datagrams += 1
+        self.__transmit(frame)
+
+    def __on_loss(self, frame: _Frame, timeout: bool):
+        if frame.sent_at < self.__recovered_at:
+            return
+
+        if self.__ack_rate is not None:
+            frames_per_round_trip = self.__ack_rate * self.__smoothed_round_trip
+            self.__slow_start_threshold = min(
+                max(frames_per_round_trip, 2), self.__congestion_window
+            )
+        else:
+            self.__slow_start_threshold = max(self.__congestion_window / 2, 2)
+        self.__congestion_window = 1.0 if timeout else self.__slow_start_threshold
+        self.__recovered_at = time.monotonic()
+
+    def __wait_until(self, condition):
+        self.__receive_acks(0)
+
+        while not condition():
+            deadline = self.__retransmit_expired(time.monotonic())
+            self.__receive_acks(max(deadline - time.monotonic(), 0))
+
+    def __retransmit_expired(self, now):
+        """
+            Returns when the next frame in flight expires
+        """
+        deadline = now + self.retransmit_timeout_seconds
+
+        for (mesh_id, frames) in list(self.__in_flight.items()):
+            for (sequence, frame) in list(frames.items()):
+                if self.__expires_at(frame) <= now:
+                    frame.fast_retransmitted = False
+                    self.__retransmit(mesh_id, sequence, frame, timeout=True)
+                deadline = min(deadline, self.__expires_at(frame))
+
+        return deadline
+
+    def __expires_at(self, frame: _Frame):
+        # Exponential backoff for the frames retransmitted already
+        backoff = min(
+            self.retransmit_timeout_seconds * 2 ** frame.retransmits, MAX_RETRANSMIT_TIMEOUT_SECONDS
+        )
+        return frame.sent_at + max(backoff, self.retransmit_timeout_seconds)
+
+    def __receive_acks(self, timeout_seconds):
+        """
+            Handles all the acks already received, waiting
+            at most `timeout_seconds` for the first one
+        """
+        self.__ack_socket.settimeout(timeout_seconds if timeout_seconds > 0 else 0)
+
+        while True:
+            try:
+                reply = self.__ack_socket.recv(65536)
+            except (socket.timeout, BlockingIOError):
+                return
+
+            self.__on_ack(reply)
+            self.__ack_socket.settimeout(0)
+
+    def __on_ack(self, reply: bytes):
+        # HoloAssist also sends plain-text debug messages on the same channel
+        try:
+            msg = json.loads(reply.decode("utf-8"))
+        except ValueError:
+            return
+
+        if not isinstance(msg, dict) or msg.get("type") != "RELIABLE_ACK" or \
+            msg.get("session") != self.__session:
+            return
+
+        frames = self.__in_flight.get(msg["id"])
+        if frames is None:
+            return
+
+        next_sequence = msg["next"]
+        ranges = msg.get("ranges", [])
+
+        def is_acked(sequence):
+            if sequence < next_sequence:
+                return True
+            return any(begin <= sequence < end for (begin, end) in ranges)
+
+        now = time.monotonic()
+        acked = [s for s in frames if is_acked(s)]
+        for sequence in acked:
+            frame = frames.pop(sequence)
+            self.__in_flight_count -= 1
+            self.acked_datagrams += 1
+
+            # Karn's algorithm: the round trip of a retransmitted frame
+            # is ambiguous, as the ack may be for any of its copies
+            if frame.retransmits == 0:
+                self.__on_round_trip(now - frame.sent_at)
+
+            if self.__congestion_window < self.__slow_start_threshold:
+                self.__congestion_window += 1
+            else:
+                self.__congestion_window += 1 / self.__congestion_window
+            self.__congestion_window = min(self.__congestion_window, self.window_datagrams)
+
+        self.__on_acked_frames(len(acked), now)
+
+        # Fast retransmit: a frame is considered lost when enough later
+        # frames of the same mesh were received
+        for (sequence, frame) in list(frames.items()):
+            later = sum(max(end - max(begin, sequence + 1), 0) for (begin, end) in ranges)
+            if later >= DUPLICATE_ACK_THRESHOLD and not frame.fast_retransmitted:
+                frame.fast_retransmitted = True
+                self.__retransmit(msg["id"], sequence, frame, timeout=False)
+
+        if len(frames) == 0:
+            del self.__in_flight[msg["id"]]
+
+    def __on_acked_frames(self, count, now):
+        if self.__ack_rate_sample_start is None or self.__smoothed_round_trip is None:
+            self.__ack_rate_sample_start = now
+            return
+
+        self.__ack_rate_sample_frames += count
+        elapsed = now - self.__ack_rate_sample_start
+        if elapsed < self.__smoothed_round_trip:
+            return
+
+        sample = self.__ack_rate_sample_frames / elapsed
+        if self.__ack_rate is None:
+            self.__ack_rate = sample
+        else:
+            self.__ack_rate = 0.875 * self.__ack_rate + 0.125 * sample
+
+        self.__ack_rate_sample_start = now
+        self.__ack_rate_sample_frames = 0
+
+    def __on_round_trip(self, seconds):
+        # As in RFC 6298
+        self.round_trip_seconds = seconds
+        if self.__smoothed_round_trip is None:
+            self.__smoothed_round_trip = seconds
+            self.__round_trip_variation = seconds / 2
+        else:
+            deviation = abs(self.__smoothed_round_trip - seconds)
+            self.__round_trip_variation = 0.75 * self.__round_trip_variation + 0.25 * deviation
+            self.__smoothed_round_trip = 0.875 * self.__smoothed_round_trip + 0.125 * seconds
+
+        self.retransmit_timeout_seconds = min(max(
+            self.__smoothed_round_trip + 4 * self.__round_trip_variation,
+            MIN_RETRANSMIT_TIMEOUT_SECONDS
+        ), MAX_RETRANSMIT_TIMEOUT_SECONDS)
+
+class _Stream:
+    def __init__(self, session):
+        self.session = session
+        self.next_sequence = 0
+        self.buffered = {}
+        self.source_host = None
+
+class ReliableReceiver:
+    """
+        The receiving side, as implemented by HoloAssist (see
+        `ReliableReceiver.cs`), used by `holo_assist_stand_in.py`
+    """
+
+    def __init__(self, max_buffered_frames = DEFAULT_MAX_BUFFERED_FRAMES):
+        self.max_buffered_frames = max_buffered_frames
+        self.__streams = {}
+        self.__to_ack = set()
+
+        self.received_frames = 0
+        self.duplicate_frames = 0
+        self.out_of_order_frames = 0
+
+    @staticmethod
+    def is_frame(packet: bytes):
+        return packet[0:2] == FRAME_MAGIC
+
+    def receive(self, packet: bytes, source_host = None) -> List[bytes]:
+        """
+            Returns the commands that can now be applied, in order.
+            `source_host` is where the acks of the mesh of the frame are sent.
+        """
+        (session, mesh_id, sequence, command) = decode_frame(packet)
+        self.received_frames += 1
+
+        # A new session (e.g. the app was restarted) starts over
+        stream = self.__streams.get(mesh_id)
+        if stream is None or stream.session != session:
+            stream = _Stream(session)
+            self.__streams[mesh_id] = stream
+
+        stream.source_host = source_host
+        self.__to_ack.add(mesh_id)
+
+        if sequence < stream.next_sequence or sequence in stream.buffered:
+            self.duplicate_frames += 1
+            return []
+
+        if sequence >= stream.next_sequence + self.max_buffered_frames:
+            return []
+
+        if sequence > stream.next_sequence:
+            self.out_of_order_frames += 1
+
+        stream.buffered[sequence] = command
+
+        ready = []
+        while stream.next_sequence in stream.buffered:
+            ready.append(stream.buffered.pop(stream.next_sequence))
+            stream.next_sequence += 1
+
+        return ready
+
+    def take_acks(self):
+        """
+            Returns the acks to send for the frames received since the previous
+            call, as `(host to send it to, ack)`
+        """
+        acks = []
+
+        for mesh_id in self.__to_ack:
+            stream = self.__streams[mesh_id]
+
+            ranges = []
+            for sequence in sorted(stream.buffered):
+                if len(ranges) > 0 and ranges[-1][1] == sequence:
+                    ranges[-1][1] += 1
+                else:
+                    ranges.append([sequence, sequence + 1])
+
+            acks.append((stream.source_host, {
+                "type": "RELIABLE_ACK",
+                "session": stream.session,
+                "id": mesh_id,
+                "next": stream.next_sequence,
+                "ranges": ranges[:MAX_ACK_RANGES]
+            }))
+
+        self.__to_ack.clear()
+        return acks
@@ -1,43 +1,204 @@
-import re
+import hashlib
+import os
+import struct
+import tempfile
+
+import numpy as np
 
 class ObjLineMesh:
-    def __init__(self):
-        self.vertices = []
-        self.lines = []
+    def __init__(self, vertices = None, lines = None):
+        # (N, 3) array with the coordinates of each vertex
+        self.vertices = np.zeros((0, 3)) if vertices is None else vertices
+        # (M, 2) array with the vertex indices of each line segment.
+        # Indices start from 1, as in the OBJ file.
+        self.lines = np.zeros((0, 2), dtype=np.int64) if lines is None else lines
+
+# Parsing an OBJ file is only needed once: the resulting arrays are stored in
+# a cache file next to it, which is then memory-mapped on the following loads.
+# The cache is keyed by the modification time and size of the OBJ file, and
+# by its SHA-256 when those do not match (e.g. after a fresh checkout).
+# A cache that cannot be used (e.g. truncated by an interrupted write from an
+# older version) is ignored, and replaced by a new one.
+_CACHE_EXTENSION = ".linecache"
+_CACHE_MAGIC = b"OBJLINE1"
+_CACHE_HEADER = struct.Struct("<8sqq32sQQ")
 
-def load_obj_line_mesh(path):
+def load_obj_line_mesh(path, use_cache = True):
     """
         Apparently there isn't a single Python library that is
         able to handle a OBJ file with line elements
     """
-    vertex_regex = re.compile("^v ([\\d+-.]+) ([\\d+-.]+) ([\\d+-.]+)$")
-    line_regex = re.compile("^l (\\d+) (\\d+)$")
-
-    mesh = ObjLineMesh()
-
-    with open(path, "r", encoding="UTF-8") as mesh_file:
-        while True:
-            line = mesh_file.readline()
-
-            if not line:
-                #End of file
-                break
-
-            matcher = vertex_regex.match(line)
-            if matcher:
-                mesh.vertices.append([
-                    float(matcher.group(1)),
-                    float(matcher.group(2)),
-                    float(matcher.group(3))
-                ])
-                continue
-
-            matcher = line_regex.match(line)
-            if matcher:
-                mesh.lines.append([
-                    int(matcher.group(1)),
-                    int(matcher.group(2))
-                ])
-                continue
+    if not use_cache:
+        with open(path, "rb") as mesh_file:
+            return parse_obj_line_mesh(mesh_file.read())
+
+    cache_path = path + _CACHE_EXTENSION
+    stat = os.stat(path)
+
+    try:
+        (mesh, digest) = _load_cache(path, cache_path, stat)
+    except (OSError, ValueError):
+        (mesh, digest) = (None, None)
+
+    if mesh is not None:
+        return mesh
+
+    with open(path, "rb") as mesh_file:
+        data = mesh_file.read()
+
+    mesh = parse_obj_line_mesh(data)
+
+    try:
+        _write_cache(cache_path, stat, digest or hashlib.sha256(data).digest(), mesh)
+    except OSError:
+        # The cache is only an optimization (e.g. the folder might be read-only)
+        pass
 
     return mesh
+
+def _load_cache(path, cache_path, stat):
+    """
+        Returns `(mesh, digest)`: the mesh is None when there is no valid
+        cache, the digest of the OBJ file is None when it was not computed
+    """
+    if not os.path.exists(cache_path):
+        return (None, None)
+
+    with open(cache_path, "rb") as cache_file:
+        header = cache_file.read(_CACHE_HEADER.size)
+
+    if len(header) != _CACHE_HEADER.size:
+        return (None, None)
+
+    (magic, mtime_ns, size, cached_digest, n_vertices, n_lines) = _CACHE_HEADER.unpack(header)
+
+    if magic != _CACHE_MAGIC or size != stat.st_size:
+        return (None, None)
+
+    # A truncated cache would make the memmaps fail on every load
+    expected_cache_size = _CACHE_HEADER.size + n_vertices * 3 * 8 + n_lines * 2 * 8
+    if os.path.getsize(cache_path) != expected_cache_size:
+        return (None, None)
+
+    digest = None
+    if mtime_ns != stat.st_mtime_ns:
+        digest = _file_digest(path)
+        if digest != cached_digest:
+            return (None, digest)
+
+        # Same content, only the timestamp changed: refresh it so
+        # that the next load does not need to hash the file again
+        _refresh_cache_header(cache_path, stat, digest, n_vertices, n_lines)
+
+    return (_map_cache(cache_path, n_vertices, n_lines), digest)
+
+def parse_obj_line_mesh(data: bytes):
+    """
+        Only `v` and `l` records are taken into account, everything else
+        (normals, texture coordinates, faces, ...) is ignored. Polylines
+        (`l 1 2 3 4`) are split into their segments and negative (relative)
+        indices are resolved to absolute ones.
+    """
+    records = [r.strip() for r in data.splitlines()]
+
+    is_vertex = [r[:2] in (b"v ", b"v\t") for r in records]
+    is_line = [r[:2] in (b"l ", b"l\t") for r in records]
+
+    vertex_records = [r[2:] for (r, v) in zip(records, is_vertex) if v]
+    line_records = [r[2:] for (r, l) in zip(records, is_line) if l]
+
+    # Fast path: every vertex has exactly three coordinates (no `w`)
+    tokens = b" ".join(vertex_records).split()
+    if len(tokens) != 3 * len(vertex_records):
+        tokens = [t for r in vertex_records for t in r.split()[0:3]]
+    vertices = np.array(tokens, dtype=np.float64).reshape(-1, 3)
+
+    # Fast path: every line is a single segment with plain vertex indices
+    tokens = b" ".join(line_records).split()
+    if len(tokens) == 2 * len(line_records) and b"/" not in b"".join(tokens):
+        lines = np.array(tokens, dtype=np.int64).reshape(-1, 2)
+        first_index_of_record = np.arange(0, len(lines) * 2, 2)
+    else:
+        (lines, first_index_of_record) = _parse_polylines(line_records)
+
+    if np.any(lines < 0):
+        # A negative index -k refers to the k-th last vertex
+        # defined before the line that uses it
+        vertices_before = np.cumsum(is_vertex)[np.flatnonzero(is_line)]
+        vertices_before_each_index = np.repeat(
+            vertices_before, np.diff(np.append(first_index_of_record, lines.size))
+        ).reshape(-1, 2)
+
+        lines = np.where(lines < 0, lines + vertices_before_each_index + 1, lines)
+
+    return ObjLineMesh(vertices, lines)
+
+def _parse_polylines(line_records):
+    segments = []
+    first_index_of_record = []
+
+    for record in line_records:
+        # Line elements can also be written as `v/vt`
+        indices = [int(t.split(b"/")[0]) for t in record.split()]
+
+        first_index_of_record.append(len(segments) * 2)
+        for i in range(0, len(indices) - 1):
+            segments.append((indices[i], indices[i + 1]))
+
+    lines = np.array(segments, dtype=np.int64).reshape(-1, 2)
+    return (lines, np.array(first_index_of_record, dtype=np.int64))
+
+def _file_digest(path):
+    with open(path, "rb") as mesh_file:
+        return hashlib.sha256(mesh_file.read()).digest()
+
+def _write_cache(cache_path, stat, digest, mesh: ObjLineMesh):
+    header = _CACHE_HEADER.pack(
+        _CACHE_MAGIC, stat.st_mtime_ns, stat.st_size, digest,
+        len(mesh.vertices), len(mesh.lines)
+    )
+
+    # Written next to the cache and renamed once complete, so that an
+    # interrupted write (or a full disk) never leaves a truncated cache
+    (handle, temporary_path) = tempfile.mkstemp(
+        prefix=os.path.basename(cache_path) + ".", dir=os.path.dirname(cache_path) or "."
+    )
+
+    try:
+        with os.fdopen(handle, "wb") as cache_file:
+            cache_file.write(header)
+            cache_file.write(np.ascontiguousarray(mesh.vertices, dtype="<f8").tobytes())
+            cache_file.write(np.ascontiguousarray(mesh.lines, dtype="<i8").tobytes())
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        os.remove(temporary_path)
+        raise
+
+def _refresh_cache_header(cache_path, stat, digest, n_vertices, n_lines):
+    try:
+        with open(cache_path, "r+b") as cache_file:
+            cache_file.write(_CACHE_HEADER.pack(
+                _CACHE_MAGIC, stat.st_mtime_ns, stat.st_size, digest, n_vertices, n_lines
+            ))
+    except OSError:
+        pass
+
+def _map_cache(cache_path, n_vertices, n_lines):
+    if n_vertices == 0 or n_lines == 0:
+        # Zero-sized memory maps are not supported
+        with open(cache_path, "rb") as cache_file:
+            cache_file.seek(_CACHE_HEADER.size)
+            vertices = np.frombuffer(cache_file.read(n_vertices * 3 * 8), dtype="<f8")
+            lines = np.frombuffer(cache_file.read(n_lines * 2 * 8), dtype="<i8")
+        return ObjLineMesh(vertices.reshape(-1, 3), lines.reshape(-1, 2))
+
+    vertices = np.memmap(
+        cache_path, dtype="<f8", mode="r",
+        offset=_CACHE_HEADER.size, shape=(n_vertices, 3)
+    )
+    lines = np.memmap(
+        cache_path, dtype="<i8", mode="r",
+        offset=_CACHE_HEADER.size + n_vertices * 3 * 8, shape=(n_lines, 2)
+    )
+
+    return ObjLineMesh(vertices, lines)
@@ -0,0 +1,88 @@
+import numpy as np
+import scipy.spatial
+
+from .geodesy import geo_fixed_vertices_to_ecef
+from .holo_assist_types import GeoFixedVertexBuffer
+
+class LineProximityIndex:
+    """
+        Answers "which lines of this mesh are near this point" without
+        looking at every vertex of the mesh. The vertices are stored in a
+        KD-tree, so that only the ones within the radius are visited, and
+        the lines using each vertex are stored in a CSR-like adjacency list
+        (`line_ids[first_line[v]:first_line[v + 1]]` are the lines of vertex v).
+
+        The index is built once per mesh: queries cost roughly as much as the
+        number of vertices they return, not as much as the size of the mesh.
+    """
+
+    def __init__(self, vertices: np.ndarray, lines: np.ndarray):
+        """
+            `vertices` is a (N, 3) array of positions (in meters, e.g. ECEF)
+            and `lines` a (M, 2) array of zero-based vertex indices
+        """
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.lines = np.asarray(lines, dtype=np.int64).reshape(-1, 2)
+        self.__tree = scipy.spatial.cKDTree(self.vertices)
+
+        endpoints = self.lines.reshape(-1)
+        order = np.argsort(endpoints, kind="stable")
+
+        self.__line_ids = order // 2
+        self.__first_line = np.searchsorted(
+            endpoints[order], np.arange(len(self.vertices) + 1)
+        )
+
+    @staticmethod
+    def from_geo_fixed_mesh(vertices: GeoFixedVertexBuffer, indices):
+        """
+            Builds the index of a mesh in the form returned by
+            `convert_obj_to_geo_fixed_mesh`, with the vertices in ECEF
+        """
+        return LineProximityIndex(geo_fixed_vertices_to_ecef(vertices), indices)
+
+    def vertices_within(self, point, radius_meters: float):
+        """
+            Zero-based indices of the vertices within `radius_meters` from `point`
+        """
+        near = self.__tree.query_ball_point(point, radius_meters)
+        return np.asarray(near, dtype=np.int64)
+
+    def lines_within(self, point, radius_meters: float):
+        """
+            Sorted ids (rows of `lines`) of the lines that have both
+            endpoints within `radius_meters` from `point`
+        """
+        near_vertices = self.vertices_within(point, radius_meters)
+
+        begins = self.__first_line[near_vertices]
+        counts = self.__first_line[near_vertices + 1] - begins
+
+        # Concatenation of the adjacency ranges of all the near vertices
+        offsets = np.repeat(begins - np.cumsum(counts) + counts, counts)
+        candidates = self.__line_ids[offsets + np.arange(offsets.size)]
+
+        # A line is reached once from each of its near endpoints
+        (line_ids, reached) = np.unique(candidates, return_counts=True)
+        return line_ids[reached == 2]
+
+    def enabled_and_disabled_lines(self, point, radius_meters: float):
+        """
+            Returns two arrays with the ids of the lines within `radius_meters`
+            from `point` and of all the other lines
+        """
+        is_enabled = np.zeros(len(self.lines), dtype=bool)
+        is_enabled[self.lines_within(point, radius_meters)] = True
+        return (np.flatnonzero(is_enabled), np.flatnonzero(~is_enabled))
+
+    def filter_lines(self, point, radius_meters: float):
+        """
+            Returns a copy of `lines` in which every line that does not have
+            both endpoints within `radius_meters` from `point` is replaced by
+            the degenerate line (0, 0), which HoloAssist does not draw.
+            Same result as `line_culling.filter_lines_by_distance`.
+        """
+        filtered = np.zeros_like(self.lines)
+        enabled = self.lines_within(point, radius_meters)
+        filtered[enabled] = self.lines[enabled]
+        return filtered
@@ -0,0 +1,198 @@
+import numpy as np
+
+from .holo_assist_service import HoloAssistService
+from .holo_assist_types import Color, Rotation, GeoFixedVertexBuffer, GEO_FIXED_VERTEX_DTYPE
+from .tunnel_commands import TunnelCommand
+
+# Each slice of a tunnel is a rectangle (4 vertices, 4 lines) plus the 4
+# lines that connect it to the previous slice: slice k (starting from 1)
+# owns vertices [4 (k - 1), 4 k) and indices [16 (k - 1), 16 k).
+VERTICES_PER_SLICE = 4
+INDICES_PER_SLICE = 16
+
+DEFAULT_TUNNEL_MESH_ID_FORMAT = "TG_TUNNEL_{}"
+DEFAULT_TUNNEL_COLOR = Color(1.0, 1.0, 1.0)
+
+def slice_vertices(cmd: TunnelCommand, color: Color):
+    width = cmd.rectangle_width_m
+    height = cmd.rectangle_height_m
+
+    rotation = Rotation.from_degrees(cmd.pitch_deg, cmd.roll_deg, -cmd.heading_deg)
+
+    return GeoFixedVertexBuffer.from_arrays(
+        [
+            cmd.position_wgs.latitude_rad, cmd.position_wgs.longitude_rad,
+            cmd.position_wgs.altitude_meters
+        ],
+        [color.red, color.green, color.blue],
+        [
+            [-width / 2, 0, +height / 2],
+            [+width / 2, 0, +height / 2],
+            [+width / 2, 0, -height / 2],
+            [-width / 2, 0, -height / 2],
+        ],
+        [rotation.localx_radians, rotation.localy_radians, rotation.localz_radians]
+    ).array
+
+def slice_indices(cmd: TunnelCommand):
+    current_index = (cmd.slice_id - 1) * VERTICES_PER_SLICE
+
+    rectangle = np.array([0, 1, 1, 2, 2, 3, 3, 0]) + current_index
+
+    if cmd.slice_id == 1:
+        # The first slice cannot "link back" to the previous tunnel rectangle,
+        # but the four slots for the indices must still be taken
+        link = np.zeros(8, dtype=np.int64)
+    else:
+        link = np.array([-4, 0, -3, 1, -2, 2, -1, 3]) + current_index
+
+    if not cmd.should_draw_rectangle():
+        rectangle[:] = 0
+
+    if not cmd.should_draw_line_to_previous_rectangle():
+        link[:] = 0
+
+    return np.concatenate([rectangle, link])
+
+class _Tunnel:
+    def __init__(self, color):
+        self.color = color
+        self.vertices = np.zeros(0, dtype=GEO_FIXED_VERTEX_DTYPE)
+        self.indices = np.zeros(0, dtype=np.int64)
+
+        # What HoloAssist already has
+        self.is_created = False
+        self.sent_slices = 0
+
+        # Changes not sent yet: slices [first, end) of the ones
+        # already sent have been replaced, a commit is requested,
+        # the mesh must be deleted before anything else
+        self.replaced_slices = None
+        self.is_commit_pending = False
+        self.is_delete_pending = False
+
+    @property
+    def slices(self):
+        return len(self.vertices) // VERTICES_PER_SLICE
+
+class TunnelBuilder:
+    """
+        Applies a stream of `TunnelCommand`s to client-side copies of the
+        tunnel meshes, and only sends them to HoloAssist on `flush`: all the
+        slices added (or replaced) since the previous flush are sent with a
+        single vertex upload and a single index upload per tunnel (which
+        `HoloAssistService` splits in as few datagrams as possible).
+
+        With `all_or_nothing`, all the changes of a tunnel are sent as a
+        single batch, which HoloAssist applies only once it has received
+        every datagram of it. Nothing re-sends a lost datagram but reliable
+        mode, so without it a single loss would drop the whole flush of the
+        tunnel, even its creation, and every later flush would then update a
+        mesh HoloAssist does not have. It is only meant for reliable mode.
+    """
+
+    def __init__(
+        self, service: HoloAssistService, mesh_id_format = DEFAULT_TUNNEL_MESH_ID_FORMAT,
+        all_or_nothing = False
+    ):
+        self.service = service
+        self.mesh_id_format = mesh_id_format
+        self.all_or_nothing = all_or_nothing
+        self.__tunnels = {}
+
+    def mesh_id(self, tunnel_id):
+        return self.mesh_id_format.format(tunnel_id)
+
+    def apply(self, cmd: TunnelCommand):
+        tunnel = self.__tunnels.get(cmd.tunnel_id)
+        if tunnel is None:
+            tunnel = _Tunnel(DEFAULT_TUNNEL_COLOR)
+            self.__tunnels[cmd.tunnel_id] = tunnel
+
+        if cmd.is_delete_stored_tunnel_data():
+            # Whatever was not sent yet is simply dropped. The color is
+            # kept, as it is not stored by HoloAssist anyway.
+            replacement = _Tunnel(tunnel.color)
+            replacement.is_delete_pending = tunnel.is_created or tunnel.is_delete_pending
+            self.__tunnels[cmd.tunnel_id] = replacement
+            return
+
+        if cmd.is_end_of_data():
+            tunnel.is_commit_pending = True
+            return
+
+        if cmd.is_change_tunnel_color():
+            # Line width is ignored, as it is not supported by HoloAssist
+            (tunnel.color, _) = cmd.get_color_and_line_width()
+            return
+
+        if not (cmd.should_draw_rectangle() or cmd.should_draw_line_to_previous_rectangle()):
+            raise ValueError(f"Unsupported tunnel setting {cmd.setting}")
+
+        if cmd.slice_id < 1 or cmd.slice_id > tunnel.slices + 1:
+            raise ValueError(
+                f"Tunnel {cmd.tunnel_id} has {tunnel.slices} slices, " +
+                f"cannot set slice {cmd.slice_id}"
+            )
+
+        vertices = slice_vertices(cmd, tunnel.color)
+        indices = slice_indices(cmd)
+
+        if cmd.slice_id == tunnel.slices + 1:
+            tunnel.vertices = np.concatenate([tunnel.vertices, vertices])
+            tunnel.indices = np.concatenate([tunnel.indices, indices])
+        else:
+            first_vertex = (cmd.slice_id - 1) * VERTICES_PER_SLICE
+            first_index = (cmd.slice_id - 1) * INDICES_PER_SLICE
+            tunnel.vertices[first_vertex:first_vertex + VERTICES_PER_SLICE] = vertices
+            tunnel.indices[first_index:first_index + INDICES_PER_SLICE] = indices
+
+        if cmd.slice_id <= tunnel.sent_slices:
+            (first, end) = tunnel.replaced_slices or (cmd.slice_id - 1, cmd.slice_id)
+            tunnel.replaced_slices = (min(first, cmd.slice_id - 1), max(end, cmd.slice_id))
+
+    def flush(self):
+        """
+            Sends all the changes applied since the previous flush
+        """
+        for (tunnel_id, tunnel) in self.__tunnels.items():
+            self.__flush_tunnel(self.mesh_id(tunnel_id), tunnel)
+
+    def __flush_tunnel(self, mesh_id, tunnel: _Tunnel):
+        # With `all_or_nothing`, HoloAssist never draws a tunnel that is
+        # only partially updated
+        with self.service.batch(mesh_id, self.all_or_nothing) as batch:
+            if tunnel.is_delete_pending:
+                batch.delete_mesh()
+                tunnel.is_delete_pending = False
+
+            if not tunnel.is_created and tunnel.slices > 0:
+                batch.create_mesh()
+                batch.activate_mesh()
+                tunnel.is_created = True
+
+            if tunnel.replaced_slices is not None:
+                (first, end) = tunnel.replaced_slices
+                batch.replace_mesh_vertices(
+                    first * VERTICES_PER_SLICE,
+                    GeoFixedVertexBuffer(
+                        tunnel.vertices[first * VERTICES_PER_SLICE:end * VERTICES_PER_SLICE]
+                    )
+                )
+                batch.replace_mesh_indices(
+                    first * INDICES_PER_SLICE,
+                    tunnel.indices[first * INDICES_PER_SLICE:end * INDICES_PER_SLICE]
+                )
+                tunnel.replaced_slices = None
+
+            if tunnel.sent_slices < tunnel.slices:
+                first = tunnel.sent_slices
+                batch.add_mesh_vertices(
+                    GeoFixedVertexBuffer(tunnel.vertices[first * VERTICES_PER_SLICE:])
+                )
+                batch.add_mesh_indices(tunnel.indices[first * INDICES_PER_SLICE:])
+                tunnel.sent_slices = tunnel.slices
+
+            if tunnel.is_commit_pending and tunnel.is_created:
+                batch.commit_mesh_changes()
+                tunnel.is_commit_pending = False
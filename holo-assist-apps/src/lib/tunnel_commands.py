@@ -0,0 +1,212 @@
+import csv
+import struct
+import sys
+import time
+from typing import Iterable, Iterator, List
+
+from .holo_assist_types import WGS84Point, Color
+
+# Commands of the tunnel API, as produced by the flight-management component
+# (see data/test-tunnel-for-tunnel-api.csv for the description of the fields).
+# Commands can be read from a file, from stdin, or from a file that is still
+# being written (e.g. by the simulator), and are parsed as they are read:
+# the first slices can be sent before the rest of the tunnel even exists.
+
+FEET_TO_METERS = 0.3048
+DEFAULT_FOLLOW_POLL_INTERVAL_SECONDS = 0.05
+
+csv.register_dialect("tunnel_api", skipinitialspace=True, strict=True)
+
+# Packed form of a command, for producers that compute the tunnel on the fly:
+# magic, tunnel_id, slice_id, the 8 float columns (in CSV order), setting,
+# and the time at which the command was computed (Unix seconds, 0 if unknown),
+# used to measure the latency up to HoloAssist.
+TUNNEL_COMMAND_MAGIC = b"TC"
+TUNNEL_COMMAND_STRUCT = struct.Struct("<2sii8did")
+
+def permissive_float_conversion(n: str):
+    # Technically this is wrong, as it will mess
+    # up a number like "1,234.56", but it is good
+    # enough given the current pipeline
+    return float(n.replace(",", "."))
+
+class TunnelCommand:
+    # Commands are created for every row of a (possibly long, or endless)
+    # stream, so they only keep the parsed columns, in slots
+    __slots__ = (
+        "tunnel_id", "slice_id", "latitude_deg", "longitude_deg", "altitude_ft",
+        "roll_deg", "pitch_deg", "heading_deg", "rectangle_width_m",
+        "rectangle_height_m", "setting", "computed_at"
+    )
+
+    def __init__(self, csv_line: List[str]):
+        self.tunnel_id = int(csv_line[0])
+        self.slice_id = int(csv_line[1])
+
+        # Columns 2 to 9 are only parsed once, even though color
+        # commands give a different meaning to columns 2 to 5
+        (
+            self.latitude_deg, self.longitude_deg, self.altitude_ft,
+            self.roll_deg, self.pitch_deg, self.heading_deg,
+            self.rectangle_width_m, self.rectangle_height_m
+        ) = [permissive_float_conversion(c) for c in csv_line[2:10]]
+
+        self.setting = int(csv_line[10])
+        self.computed_at = None
+
+    @staticmethod
+    def from_binary(data: bytes, offset = 0):
+        cmd = TunnelCommand.__new__(TunnelCommand)
+        (
+            magic, cmd.tunnel_id, cmd.slice_id,
+            cmd.latitude_deg, cmd.longitude_deg, cmd.altitude_ft,
+            cmd.roll_deg, cmd.pitch_deg, cmd.heading_deg,
+            cmd.rectangle_width_m, cmd.rectangle_height_m,
+            cmd.setting, computed_at
+        ) = TUNNEL_COMMAND_STRUCT.unpack_from(data, offset)
+
+        if magic != TUNNEL_COMMAND_MAGIC:
+            raise ValueError("Not a packed tunnel command")
+
+        cmd.computed_at = computed_at if computed_at > 0 else None
+        return cmd
+
+    def to_binary(self):
+        return TUNNEL_COMMAND_STRUCT.pack(
+            TUNNEL_COMMAND_MAGIC, self.tunnel_id, self.slice_id,
+            self.latitude_deg, self.longitude_deg, self.altitude_ft,
+            self.roll_deg, self.pitch_deg, self.heading_deg,
+            self.rectangle_width_m, self.rectangle_height_m,
+            self.setting, self.computed_at or 0
+        )
+
+    @property
+    def position_wgs(self):
+        return WGS84Point.from_degrees(
+            self.latitude_deg, self.longitude_deg, self.altitude_ft * FEET_TO_METERS
+        )
+
+    def is_end_of_data(self):
+        return self.setting == 90
+
+    def is_delete_stored_tunnel_data(self):
+        return self.setting == 99
+
+    def is_change_tunnel_color(self):
+        return self.setting == 80
+
+    def get_color_and_line_width(self):
+        assert self.is_change_tunnel_color()
+        # (lat, lon, alt, roll) hold (r, g, b, line width). Green and blue are
+        # passed swapped, as the existing tunnels have always been drawn this way.
+        c = Color(self.latitude_deg, self.altitude_ft, self.longitude_deg)
+        return (c, self.roll_deg)
+
+    def should_draw_rectangle(self):
+        return self.setting in [0, 2]
+
+    def should_draw_line_to_previous_rectangle(self):
+        return self.setting in [0, 1]
+
+def read_tunnel_commands(lines: Iterable[str]) -> Iterator[TunnelCommand]:
+    """
+        Yields the commands in `lines` (an open file, `sys.stdin`,
+        `follow_file(...)`, ...) as soon as each row is read,
+        skipping empty rows and comments
+    """
+    for row in csv.reader(lines, dialect="tunnel_api"):
+        if len(row) == 0 or row[0].startswith("#"):
+            continue
+        yield TunnelCommand(row)
+
+def follow_file(
+    file, poll_interval_seconds = DEFAULT_FOLLOW_POLL_INTERVAL_SECONDS
+) -> Iterator[str]:
+    """
+        Like `tail -f`: yields the lines already in `file`, then the lines
+        appended to it, forever. A line is only yielded once it is complete,
+        so rows that are still being written are never parsed.
+    """
+    partial_line = ""
+
+    while True:
+        line = file.readline()
+        if line == "":
+            time.sleep(poll_interval_seconds)
+            continue
+
+        partial_line += line
+        if partial_line.endswith("\n"):
+            yield partial_line
+            partial_line = ""
+
+def tunnel_command_lines(path: str, follow = False) -> Iterator[str]:
+    """
+        Lines of the file at `path` ("-" for stdin),
+        see `follow_file` for `follow`
+    """
+    if path == "-":
+        yield from sys.stdin
+        return
+
+    with open(path, encoding="UTF-8", newline="") as file:
+        yield from follow_file(file) if follow else file
+
+class TunnelCommandDecoder:
+    """
+        Splits a byte stream (e.g. from a TCP connection) into commands,
+        each being either a CSV line (ending with a newline) or a packed
+        command, in any mix. Partial rows are kept until the rest arrives.
+        Invalid rows are skipped, and passed to `on_error(row, exception)`.
+    """
+
+    def __init__(self, on_error = None):
+        self.on_error = on_error
+        self.__pending = b""
+
+    def feed(self, data: bytes) -> List[TunnelCommand]:
+        self.__pending += data
+        commands = []
+        start = 0
+
+        while start < len(self.__pending):
+            if self.__pending.startswith(TUNNEL_COMMAND_MAGIC, start):
+                end = start + TUNNEL_COMMAND_STRUCT.size
+                if end > len(self.__pending):
+                    break
+            else:
+                end = self.__pending.find(b"\n", start) + 1
+                if end == 0:
+                    break
+
+            self.__decode(self.__pending[start:end], commands)
+            start = end
+
+        self.__pending = self.__pending[start:]
+        return commands
+
+    def finish(self) -> List[TunnelCommand]:
+        """
+            Decodes what is left at the end of the stream (or of a datagram),
+            where the last CSV line does not need a newline
+        """
+        (pending, self.__pending) = (self.__pending, b"")
+        commands = []
+
+        if len(pending) > 0:
+            self.__decode(pending, commands)
+
+        return commands
+
+    def __decode(self, row: bytes, commands: List[TunnelCommand]):
+        try:
+            if row.startswith(TUNNEL_COMMAND_MAGIC):
+                if len(row) < TUNNEL_COMMAND_STRUCT.size:
+                    raise ValueError("Truncated packed tunnel command")
+                commands.append(TunnelCommand.from_binary(row))
+            else:
+                commands.extend(read_tunnel_commands(row.decode("utf-8").splitlines()))
+        except (ValueError, IndexError, csv.Error) as e:
+            if self.on_error is None:
+                raise
+            self.on_error(row, e)
@@ -17,12 +17,14 @@ map_pin_obj = simple_obj_importer.load_obj_line_mesh(os.path.join("data", "map-p
 service = prepare_holo_assist_instance()
 
 print("Creating mesh...")
-service.create_mesh(MESH_ID, interpolated_segment_max_length_meters=3)
-service.add_mesh_vertices(MESH_ID, vertices)
-service.add_mesh_indices(MESH_ID, indices)
-service.commit_mesh_changes(MESH_ID)
-service.activate_mesh(MESH_ID)
-
+with service.batch(MESH_ID) as batch:
+    batch.create_mesh(interpolated_segment_max_length_meters=3)
+    batch.add_mesh_vertices(vertices)
+    batch.add_mesh_indices(indices)
+    batch.commit_mesh_changes()
+    batch.activate_mesh()
+
+service.flush()
 input("Press a key to continue")
 print("Rotating mesh...")
 for i in range (0, 361, 20):
@@ -30,19 +32,25 @@ for i in range (0, 361, 20):
     (vertices, _) = convert_obj_to_geo_fixed_mesh(
         map_pin_obj, PIN_COLOR, PIN_POSITION, new_rotation
     )
-    service.replace_mesh_vertices(MESH_ID, 0, vertices)
-    service.commit_mesh_changes(MESH_ID)
+    with service.batch(MESH_ID) as batch:
+        batch.replace_mesh_vertices(0, vertices)
+        batch.commit_mesh_changes()
     sleep(0.2)
 
+service.flush()
 input("Press a key to continue")
 print("Moving point to another place...")
 (vertices, _) = convert_obj_to_geo_fixed_mesh(
     map_pin_obj, PIN_COLOR, PIN_OTHER_POSITION, PIN_ROTATION
 )
-service.replace_mesh_vertices(MESH_ID, 0, vertices)
-service.commit_mesh_changes(MESH_ID)
+with service.batch(MESH_ID) as batch:
+    batch.replace_mesh_vertices(0, vertices)
+    batch.commit_mesh_changes()
 
+service.flush()
 input("Press any key to continue...")
 print("Removing mesh...")
 service.deactivate_mesh(MESH_ID)
 service.delete_mesh(MESH_ID)
+
+service.flush()
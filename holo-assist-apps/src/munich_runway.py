@@ -14,21 +14,27 @@ indices = [0, 1, 1, 2, 2, 3, 3, 0]
 MESH_ID = "EDDM 08 L"
 
 print("Creating mesh...")
-service.create_mesh(MESH_ID)
-service.add_mesh_vertices(MESH_ID, vertices)
-service.add_mesh_indices(MESH_ID, indices)
-service.commit_mesh_changes(MESH_ID)
-service.activate_mesh(MESH_ID)
-
+with service.batch(MESH_ID) as batch:
+    batch.create_mesh()
+    batch.add_mesh_vertices(vertices)
+    batch.add_mesh_indices(indices)
+    batch.commit_mesh_changes()
+    batch.activate_mesh()
+
+service.flush()
 input("Press any key to continue...")
 
 print("Mangling indices...")
 weird_indices = [0, 1, 1, 3, 3, 2, 2, 0]
-service.replace_mesh_indices(MESH_ID, 0, weird_indices)
-service.commit_mesh_changes(MESH_ID)
+with service.batch(MESH_ID) as batch:
+    batch.replace_mesh_indices(0, weird_indices)
+    batch.commit_mesh_changes()
 
+service.flush()
 input("Press any key to continue...")
 
 print("Removing mesh...")
 service.deactivate_mesh(MESH_ID)
 service.delete_mesh(MESH_ID)
+
+service.flush()
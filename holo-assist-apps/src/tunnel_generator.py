@@ -1,157 +1,189 @@
-import csv
+import argparse
 import os
 import time
-from typing import List
 
-from lib.holo_assist_types import GeoFixedVertex, WGS84Point, Color, Rotation, Vector3
 from lib import prepare_holo_assist_instance
+from lib.reactor import Reactor
+from lib.tunnel_commands import read_tunnel_commands, tunnel_command_lines, TunnelCommandDecoder
+from lib.tunnel_builder import TunnelBuilder, DEFAULT_TUNNEL_MESH_ID_FORMAT
+
+# Usage: python src/tunnel_generator.py [--unity] [path | -] [--follow]
+# Commands are read from the test CSV by default, from stdin with "-", and
+# with --follow the file is followed like `tail -f`, so that a tunnel can be
+# drawn while the simulator is still writing it (stop with Ctrl+C).
+#
+# Server mode: python src/tunnel_generator.py [--unity] --listen 53950
+# Commands are received on the port over both UDP and TCP, as CSV lines or
+# packed (see `TUNNEL_COMMAND_STRUCT`), in any mix. Bursts of commands are
+# coalesced: they are sent to HoloAssist when an end-of-data command (90)
+# arrives, once all the commands already received are applied, or at most
+# --max-delay-ms after the first command not sent yet.
+
+DEFAULT_MAX_DELAY_MS = 50
+STATS_INTERVAL_SECONDS = 5
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Draws the tunnels of the tunnel API")
+    parser.add_argument(
+        "path", nargs="?", default=os.path.join("data", "test-tunnel-for-tunnel-api.csv")
+    )
+    parser.add_argument("--follow", action="store_true")
+    parser.add_argument("--listen", type=int, metavar="PORT",
+        help="receive the commands on this UDP and TCP port instead of reading a file")
+    parser.add_argument("--listen-ip", default="127.0.0.1")
+    parser.add_argument("--max-delay-ms", type=float, default=DEFAULT_MAX_DELAY_MS,
+        help="longest time a received command waits before being sent")
+    parser.add_argument("--stats", action="store_true",
+        help=f"print the latency every {STATS_INTERVAL_SECONDS} seconds")
+    # The other options (--unity, --binary, ...) are read by prepare_holo_assist_instance
+    (args, _) = parser.parse_known_args()
+
+    return args
+
+class LatencyStats:
+    """
+        Latency of the flush windows, from the reception of their first
+        command (and from the computation of their oldest packed command,
+        when it is known) to the moment they are sent to HoloAssist
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.windows = 0
+        self.commands = 0
+        self.receive_to_send = []
+        self.compute_to_send = []
+
+    def __str__(self):
+        def summary(name, values):
+            if len(values) == 0:
+                return ""
+            return f", {name} avg {1e3 * sum(values) / len(values):.1f} ms, " + \
+                f"max {1e3 * max(values):.1f} ms"
+
+        return f"{self.commands} commands in {self.windows} windows" + \
+            summary("received to sent", self.receive_to_send) + \
+            summary("computed to sent", self.compute_to_send)
+
+def run_from_file(builder: TunnelBuilder, args):
+    try:
+        for cmd in read_tunnel_commands(tunnel_command_lines(args.path, args.follow)):
+            builder.apply(cmd)
+
+            # The slices received since the previous end of data
+            # are sent all at once, just before the commit
+            if cmd.is_end_of_data():
+                builder.flush()
+    except KeyboardInterrupt:
+        pass
+
+    builder.flush()
+
+def serve(builder: TunnelBuilder, args):
+    reactor = Reactor()
+    stats = LatencyStats()
+
+    flush_timer = None
+    window_received_at = None
+    window_computed_at = None
+
+    def flush():
+        nonlocal flush_timer, window_received_at, window_computed_at
+
+        builder.flush()
+
+        sent_at = time.monotonic()
+        stats.windows += 1
+        stats.receive_to_send.append(sent_at - window_received_at)
+        if window_computed_at is not None:
+            stats.compute_to_send.append(time.time() - window_computed_at)
+
+        (flush_timer, window_received_at, window_computed_at) = (None, None, None)
+
+    def schedule_flush(delay_seconds):
+        nonlocal flush_timer
+
+        if flush_timer is not None:
+            if delay_seconds > 0:
+                return
+            flush_timer.cancel()
+
+        # Even with no delay, the flush only happens once the reactor
+        # has applied all the commands already received
+        flush_timer = reactor.add_timer(delay_seconds, flush, repeat=False)
+
+    def on_commands(commands):
+        nonlocal window_received_at, window_computed_at
+
+        for cmd in commands:
+            try:
+                builder.apply(cmd)
+            except ValueError as e:
+                print(f"Ignored command: {e}", flush=True)
+                continue
+
+            stats.commands += 1
+            if window_received_at is None:
+                window_received_at = time.monotonic()
+            if cmd.computed_at is not None:
+                window_computed_at = min(window_computed_at or cmd.computed_at, cmd.computed_at)
+
+            schedule_flush(0 if cmd.is_end_of_data() else args.max_delay_ms / 1000)
+
+    def on_invalid_row(row, error):
+        print(f"Ignored row {row!r}: {error}", flush=True)
+
+    def on_datagram(packet):
+        decoder = TunnelCommandDecoder(on_invalid_row)
+        on_commands(decoder.feed(packet) + decoder.finish())
+
+    def on_connection(peer_address):
+        print(f"Connection from {peer_address[0]}:{peer_address[1]}", flush=True)
+        decoder = TunnelCommandDecoder(on_invalid_row)
+
+        def on_data(data):
+            on_commands(decoder.feed(data) if len(data) > 0 else decoder.finish())
+
+        return on_data
+
+    def on_stats():
+        print(stats, flush=True)
+        stats.reset()
+
+    address = (args.listen_ip, args.listen)
+    reactor.add_udp_listener(address, on_datagram, buffer_size=65536)
+    reactor.add_tcp_listener(address, on_connection)
+    if args.stats:
+        reactor.add_timer(STATS_INTERVAL_SECONDS, on_stats)
+
+    try:
+        reactor.run()
+    except KeyboardInterrupt:
+        pass
 
-csv.register_dialect("my", skipinitialspace=True, strict=True)
+    builder.flush()
+    if args.stats:
+        print(stats, flush=True)
 
-def permissive_float_conversion(n: str):
-    # Technically this is wrong, as it will mess
-    # up a number like "1,234.56", but it is good
-    # enough given the current pipeline
-    return float(n.replace(",", "."))
+def main():
+    args = parse_arguments()
 
-class TunnelCommand:
-    def __init__(self, csv_line: List[str]):
-        self.tunnel_id = int(csv_line[0])
-        self.slice_id = int(csv_line[1])
+    # With --daemon, every tunnel mesh id is reserved for this app
+    service = prepare_holo_assist_instance(
+        paced=True, mesh_namespace=DEFAULT_TUNNEL_MESH_ID_FORMAT.format("")
+    )
+    # A batch is only applied once all its datagrams arrived, which
+    # only reliable mode makes sure of
+    builder = TunnelBuilder(service, all_or_nothing=service.reliable_sender is not None)
 
-        FEET_TO_METERS = 0.3048
-        self.position_wgs = WGS84Point.from_degrees(
-            permissive_float_conversion(csv_line[2]), permissive_float_conversion(csv_line[3]),
-            permissive_float_conversion(csv_line[4]) * FEET_TO_METERS
-        )
-
-        self.roll_deg = permissive_float_conversion(csv_line[5])
-        self.pitch_deg = permissive_float_conversion(csv_line[6])
-        self.heading_deg = permissive_float_conversion(csv_line[7])
-
-        self.rectangle_width_m = permissive_float_conversion(csv_line[8])
-        self.rectangle_height_m = permissive_float_conversion(csv_line[9])
-
-        self.setting = int(csv_line[10])
-
-        self.__color_r = permissive_float_conversion(csv_line[2])
-        self.__color_g = permissive_float_conversion(csv_line[3])
-        self.__color_b = permissive_float_conversion(csv_line[4])
-        self.__line_width = permissive_float_conversion(csv_line[5])
-
-    def is_end_of_data(self):
-        return self.setting == 90
-
-    def is_delete_stored_tunnel_data(self):
-        return self.setting == 99
-
-    def is_change_tunnel_color(self):
-        return self.setting == 80
-
-    def get_color_and_line_width(self):
-        assert self.is_change_tunnel_color()
-        c = Color(self.__color_r, self.__color_b, self.__color_g)
-        return (c, self.__line_width)
-
-    def should_draw_rectangle(self):
-        return self.setting in [0, 2]
-
-    def should_draw_line_to_previous_rectangle(self):
-        return self.setting in [0, 1]
-
-
-def basic_rectangle(width, height):
-    vertices = [
-        Vector3(-width / 2, 0, +height/2),
-        Vector3(+width / 2, 0, +height/2),
-        Vector3(+width / 2, 0, -height/2),
-        Vector3(-width / 2, 0, -height/2),
-    ]
-
-    indices = [0, 1, 1, 2, 2, 3, 3, 0]
-
-    return (vertices, indices)
-
-tunnel_commands: List[TunnelCommand] = []
-with open(os.path.join("data", "test-tunnel-for-tunnel-api.csv"), encoding="UTF-8") as file:
-    reader = csv.reader(file, dialect="my")
-    for row in reader:
-        if len(row) == 0 or row[0].startswith("#"):
-            continue
-        tunnel_commands.append(TunnelCommand(row))
-
-service = prepare_holo_assist_instance()
-current_color_for_tunnel = {}
-current_slice_for_tunnel = {}
-
-DELAY_SECONDS = 0.3
-
-for cmd in tunnel_commands:
-    tid = f"TG_TUNNEL_{cmd.tunnel_id}"
-
-    if cmd.is_delete_stored_tunnel_data():
-        service.delete_mesh(tid)
-        time.sleep(DELAY_SECONDS)
-        continue
-
-    if cmd.is_end_of_data():
-        service.commit_mesh_changes(tid)
-        time.sleep(DELAY_SECONDS)
-        continue
-
-    if cmd.is_change_tunnel_color():
-        current_color_for_tunnel[cmd.tunnel_id] = cmd.get_color_and_line_width()
-        time.sleep(DELAY_SECONDS)
-        continue
-
-    assert cmd.should_draw_rectangle() or cmd.should_draw_line_to_previous_rectangle()
-
-    (vertices, indices) = basic_rectangle(cmd.rectangle_width_m, cmd.rectangle_height_m)
-    assert len(vertices) == 4
-    assert len(indices) == 8
-
-    wgs = cmd.position_wgs
-    col = current_color_for_tunnel[cmd.tunnel_id][0] #Line width is ignored, as it is not supported by HoloAssist
-    rot = Rotation.from_degrees(cmd.pitch_deg, cmd.roll_deg, -cmd.heading_deg)
-    geo_vertices = [GeoFixedVertex(wgs, col, v, rot) for v in vertices]
+    if args.listen is None:
+        run_from_file(builder, args)
+    else:
+        serve(builder, args)
 
-    current_index = (cmd.slice_id - 1) * 4
-    indices = [i + current_index for i in indices]
+    service.flush()
 
-    if (cmd.slice_id - 1) == 0:
-        # The first slice cannot "link back" to the previous tunnel rectangle,
-        # but the four slots for the indices must still be taken
-        indices.extend([0, 0, 0, 0, 0, 0, 0, 0])
-    else:
-        indices.extend([
-            current_index - 4 + 0, current_index + 0,
-            current_index - 4 + 1, current_index + 1,
-            current_index - 4 + 2, current_index + 2,
-            current_index - 4 + 3, current_index + 3,
-        ])
-
-    if cmd.tunnel_id not in current_slice_for_tunnel:
-        current_slice_for_tunnel[cmd.tunnel_id] = 0
-        service.create_mesh(tid)
-        time.sleep(DELAY_SECONDS)
-        service.activate_mesh(tid)
-        time.sleep(DELAY_SECONDS)
-
-    if not cmd.should_draw_rectangle():
-        indices[0:8] = [0, 0, 0, 0, 0, 0, 0, 0]
-
-    if not cmd.should_draw_line_to_previous_rectangle():
-        indices[8:16] = [0, 0, 0, 0, 0, 0, 0, 0]
-
-    if current_slice_for_tunnel[cmd.tunnel_id] < cmd.slice_id:
-        assert current_slice_for_tunnel[cmd.tunnel_id] + 1 == cmd.slice_id
-        current_slice_for_tunnel[cmd.tunnel_id] = cmd.slice_id
-        service.add_mesh_vertices(tid, geo_vertices)
-        time.sleep(DELAY_SECONDS)
-        service.add_mesh_indices(tid, indices)
-        time.sleep(DELAY_SECONDS)
-    else:
-        service.replace_mesh_vertices(tid, current_index, geo_vertices)
-        time.sleep(DELAY_SECONDS)
-        service.replace_mesh_indices(tid, cmd.slice_id * 16, indices)
-        time.sleep(DELAY_SECONDS)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using UnityEngine;
+
+/*
+    Reassembles the batches of commands (see `holo_assist_binary.py` in
+    holo-assist-apps for the layout of a batch packet). A batch can span
+    several packets, and its commands are only returned once every packet
+    has been received, so that a mesh is never left half-updated when a
+    packet is lost: the whole batch is dropped instead.
+*/
+
+public class BatchAssembler
+{
+    private const byte FormatVersion = 1;
+    private const int HeaderSize = 2 + 1 + 4 + 2 + 2;
+
+    // Incomplete batches older than this are dropped
+    private const float BatchTimeoutSeconds = 5;
+    // Ids of the last batches returned, so that their duplicates are ignored
+    private const int AppliedBatchHistory = 256;
+
+    private class PendingBatch
+    {
+        public float FirstReceivedAt;
+        public List<byte[]>[] Packets;
+    }
+
+    private readonly Dictionary<uint, PendingBatch> _PendingBatches = new Dictionary<uint, PendingBatch>();
+    private readonly Queue<uint> _AppliedBatches = new Queue<uint>();
+
+    public static bool IsBatchPacket(byte[] packet)
+    {
+        return packet.Length >= 2 && packet[0] == (byte)'H' && packet[1] == (byte)'B';
+    }
+
+    /*
+        Returns the commands of the batch, in order, if `packet` was the
+        last one missing, and an empty list otherwise
+    */
+    public List<byte[]> Add(byte[] packet)
+    {
+        var version = packet[2];
+        if (version != FormatVersion)
+            throw new ArgumentException($"Unsupported batch packet version {version}");
+
+        uint batchId = BitConverter.ToUInt32(packet, 3);
+        int sequence = BitConverter.ToUInt16(packet, 7);
+        int packetCount = BitConverter.ToUInt16(packet, 9);
+
+        DropStaleBatches();
+
+        if (_AppliedBatches.Contains(batchId))
+            return new List<byte[]>();
+
+        if (!_PendingBatches.TryGetValue(batchId, out PendingBatch batch))
+        {
+            batch = new PendingBatch
+            {
+                FirstReceivedAt = Time.realtimeSinceStartup,
+                Packets = new List<byte[]>[packetCount]
+            };
+            _PendingBatches[batchId] = batch;
+        }
+
+        if (sequence >= batch.Packets.Length)
+            throw new ArgumentException($"Packet {sequence} of batch {batchId} out of range");
+
+        batch.Packets[sequence] = ReadCommands(packet);
+        if (batch.Packets.Any(p => p == null))
+            return new List<byte[]>();
+
+        _PendingBatches.Remove(batchId);
+        _AppliedBatches.Enqueue(batchId);
+        if (_AppliedBatches.Count > AppliedBatchHistory)
+            _AppliedBatches.Dequeue();
+
+        return batch.Packets.SelectMany(p => p).ToList();
+    }
+
+    private void DropStaleBatches()
+    {
+        var now = Time.realtimeSinceStartup;
+        var stale = _PendingBatches
+            .Where(b => now - b.Value.FirstReceivedAt > BatchTimeoutSeconds)
+            .Select(b => b.Key)
+            .ToList();
+
+        foreach (var batchId in stale)
+        {
+            Debug.LogWarning($"Dropped incomplete batch {batchId}");
+            _PendingBatches.Remove(batchId);
+        }
+    }
+
+    private static List<byte[]> ReadCommands(byte[] packet)
+    {
+        var commands = new List<byte[]>();
+        int offset = HeaderSize;
+
+        while (offset < packet.Length)
+        {
+            int length = BitConverter.ToUInt16(packet, offset);
+            offset += 2;
+
+            var command = new byte[length];
+            Array.Copy(packet, offset, command, 0, length);
+            commands.Add(command);
+            offset += length;
+        }
+
+        return commands;
+    }
+}
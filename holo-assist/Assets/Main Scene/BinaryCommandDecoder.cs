@@ -0,0 +1,169 @@
+using Newtonsoft.Json.Linq;
+using System;
+using System.Text;
+
+/*
+    Decodes the compact binary encoding of the vertex and index commands
+    (see `holo_assist_binary.py` in holo-assist-apps for the layout) into
+    the same `JObject` that the JSON encoding would have produced, so that
+    the drawings managers do not need to know which encoding was used.
+*/
+
+public static class BinaryCommandDecoder
+{
+    private const byte FormatVersion = 1;
+
+    private const byte GeoFixedVerticesKind = 1;
+    private const byte GeoFixedIndicesKind = 2;
+    private const byte PlaneFixedVerticesKind = 3;
+    private const byte PlaneFixedIndicesKind = 4;
+    private const byte GeoFixedVertexOffsetsKind = 5;
+
+    private const int GeoFixedVertexSize = 3 * 8 + 4 * 4 + 3 * 4 + 3 * 4;
+    private const int ColoredVertexSize = 3 * 4 + 4 * 4;
+    private const int GroupHeaderSize = 4 + 3 * 8 + 4 * 4 + 3 * 4;
+    private const int LocalPositionSize = 3 * 4;
+
+    public static bool IsBinaryCommand(byte[] packet)
+    {
+        return packet.Length >= 2 && packet[0] == (byte)'H' && packet[1] == (byte)'A';
+    }
+
+    public static (string, JObject) Decode(byte[] packet)
+    {
+        var version = packet[2];
+        if (version != FormatVersion)
+            throw new ArgumentException($"Unsupported binary command version {version}");
+
+        var kind = packet[3];
+        int idLength = BitConverter.ToUInt16(packet, 4);
+        var id = Encoding.UTF8.GetString(packet, 6, idLength);
+
+        int offset = 6 + idLength;
+        int startIndex = BitConverter.ToInt32(packet, offset);
+        int count = (int)BitConverter.ToUInt32(packet, offset + 4);
+        offset += 8;
+
+        var command = new JObject();
+        command["id"] = id;
+        command["startIndex"] = startIndex < 0 ? null : new JValue(startIndex);
+
+        string type;
+        switch (kind)
+        {
+            case GeoFixedVerticesKind:
+                type = "SET_MESH_VERTICES";
+                command["vertices"] = ReadGeoFixedVertices(packet, offset, count);
+                break;
+            case GeoFixedIndicesKind:
+                type = "SET_MESH_INDICES";
+                command["indices"] = ReadIndices(packet, offset, count);
+                break;
+            case PlaneFixedVerticesKind:
+                type = "PF_SET_MESH_VERTICES";
+                command["vertices"] = ReadColoredVertices(packet, offset, count);
+                break;
+            case PlaneFixedIndicesKind:
+                type = "PF_SET_MESH_INDICES";
+                command["indices"] = ReadIndices(packet, offset, count);
+                break;
+            case GeoFixedVertexOffsetsKind:
+                type = "SET_MESH_VERTEX_OFFSETS";
+                command["groups"] = ReadGeoFixedVertexGroups(packet, offset, count);
+                break;
+            default:
+                throw new ArgumentException($"Unknown binary command kind {kind}");
+        }
+
+        command["type"] = type;
+        return (type, command);
+    }
+
+    private static JArray ReadGeoFixedVertices(byte[] packet, int offset, int count)
+    {
+        var vertices = new JArray();
+        for (int i = 0; i < count; i++, offset += GeoFixedVertexSize)
+        {
+            var v = new JObject();
+            v["originWgs"] = ReadWGS84Point(packet, offset);
+            v["color"] = ReadFloats(packet, offset + 24, 4);
+            v["localPositionMeters"] = ReadFloats(packet, offset + 40, 3);
+            v["localRotationRadians"] = ReadFloats(packet, offset + 52, 3);
+            vertices.Add(v);
+        }
+
+        return vertices;
+    }
+
+    private static JArray ReadGeoFixedVertexGroups(byte[] packet, int offset, int count)
+    {
+        var groups = new JArray();
+        for (int read = 0; read < count; )
+        {
+            int groupCount = (int)BitConverter.ToUInt32(packet, offset);
+
+            var group = new JObject();
+            group["originWgs"] = ReadWGS84Point(packet, offset + 4);
+            group["color"] = ReadFloats(packet, offset + 28, 4);
+            group["localRotationRadians"] = ReadFloats(packet, offset + 44, 3);
+            offset += GroupHeaderSize;
+
+            var localPositions = new JArray();
+            for (int i = 0; i < groupCount; i++, offset += LocalPositionSize)
+            {
+                localPositions.Add(ReadFloats(packet, offset, 3));
+            }
+            group["localPositionsMeters"] = localPositions;
+
+            groups.Add(group);
+            read += groupCount;
+        }
+
+        return groups;
+    }
+
+    private static JObject ReadWGS84Point(byte[] packet, int offset)
+    {
+        var point = new JObject();
+        point["latitudeRadians"] = BitConverter.ToDouble(packet, offset);
+        point["longitudeRadians"] = BitConverter.ToDouble(packet, offset + 8);
+        point["altitudeMeters"] = BitConverter.ToDouble(packet, offset + 16);
+        return point;
+    }
+
+    private static JArray ReadColoredVertices(byte[] packet, int offset, int count)
+    {
+        var vertices = new JArray();
+        for (int i = 0; i < count; i++, offset += ColoredVertexSize)
+        {
+            var v = new JObject();
+            v["position"] = ReadFloats(packet, offset, 3);
+            v["color"] = ReadFloats(packet, offset + 12, 4);
+            vertices.Add(v);
+        }
+
+        return vertices;
+    }
+
+    private static JArray ReadIndices(byte[] packet, int offset, int count)
+    {
+        var indices = new JArray();
+        for (int i = 0; i < count; i++)
+        {
+            indices.Add((int)BitConverter.ToUInt32(packet, offset + i * 4));
+        }
+
+        return indices;
+    }
+
+    private static JArray ReadFloats(byte[] packet, int offset, int count)
+    {
+        var values = new JArray();
+        for (int i = 0; i < count; i++)
+        {
+            values.Add(BitConverter.ToSingle(packet, offset + i * 4));
+        }
+
+        return values;
+    }
+}
@@ -97,6 +97,8 @@ public class GeoFixedExternalDrawingsManager : MonoBehaviour
             OnSetMeshActive(command.ToObject<SetMeshActiveCommand>());
         else if (type == "SET_MESH_VERTICES")
             OnSetMeshVertices(command.ToObject<SetMeshVerticesCommand>());
+        else if (type == "SET_MESH_VERTEX_OFFSETS")
+            OnSetMeshVertexOffsets(command.ToObject<SetMeshVertexOffsetsCommand>());
         else if (type == "SET_MESH_INDICES")
             OnSetMeshIndices(command.ToObject<SetMeshIndicesCommand>());
         else if (type == "COMMIT_MESH_CHANGES")
@@ -174,8 +176,21 @@ public class GeoFixedExternalDrawingsManager : MonoBehaviour
         if (elm == null) return;
 
         List<GeoFixedVertex> vs = cmd.vertices.Select(v => v.ToInternalRepresentation()).ToList();
+        _addOrSetVertices(elm, vs, cmd.StartIndex);
+    }
 
-        if (!cmd.StartIndex.HasValue)
+    private void OnSetMeshVertexOffsets(SetMeshVertexOffsetsCommand cmd)
+    {
+        var elm = _checkIdAndGet(cmd.Id);
+        if (elm == null) return;
+
+        List<GeoFixedVertex> vs = cmd.Groups.SelectMany(g => g.ToInternalRepresentation()).ToList();
+        _addOrSetVertices(elm, vs, cmd.StartIndex);
+    }
+
+    private void _addOrSetVertices(GeoFixedExternalLineMesh elm, List<GeoFixedVertex> vs, uint? startIndex)
+    {
+        if (!startIndex.HasValue)
         {
             elm.AddVertices(vs);
             return;
@@ -183,7 +198,7 @@ public class GeoFixedExternalDrawingsManager : MonoBehaviour
 
         try
         {
-            elm.SetVertices(vs, (int)cmd.StartIndex.Value);
+            elm.SetVertices(vs, (int)startIndex.Value);
         } catch (Exception e)
         {
             _udpManager.SendUDPMessage("Error while trying to set vertices, message: " + e.Message);
@@ -222,27 +237,46 @@ public class GeoFixedExternalDrawingsManager : MonoBehaviour
         public Vector3 LocalPositionMeters = Vector3.zero;
         public Vector3 LocalRotationRadians = Vector3.zero;
 
-        private Quaternion LocalRotationAsQuaternionDouble()
+        public GeoFixedVertex ToInternalRepresentation()
         {
-            var rotX = Quaternion.AngleAxis(LocalRotationRadians.x * Mathf.Rad2Deg, Vector3.right);
-            var rotY = Quaternion.AngleAxis(LocalRotationRadians.y * Mathf.Rad2Deg, Vector3.up);
-            var rotZ = Quaternion.AngleAxis(LocalRotationRadians.z * Mathf.Rad2Deg, Vector3.forward);
-            return Quaternion.identity * rotZ * rotX * rotY;
+            return ToGeoFixedVertex(OriginWGS, Color, LocalRotationAsQuaternion(LocalRotationRadians), LocalPositionMeters);
         }
+    }
 
-        public GeoFixedVertex ToInternalRepresentation()
+    // Vertices that share their origin, color and rotation, and only differ by their local position
+    public class ExternalLineMeshVertexGroupDto
+    {
+        public WGS84Point OriginWGS;
+        public Color Color;
+        public Vector3 LocalRotationRadians = Vector3.zero;
+        public List<Vector3> LocalPositionsMeters;
+
+        public IEnumerable<GeoFixedVertex> ToInternalRepresentation()
         {
-            var v = new GeoFixedVertex();
+            var rot = LocalRotationAsQuaternion(LocalRotationRadians);
+            return LocalPositionsMeters.Select(p => ToGeoFixedVertex(OriginWGS, Color, rot, p));
+        }
+    }
 
-            var rot = LocalRotationAsQuaternionDouble();
-            var pointInEnu = /*enuOrigin = (0, 0, 0) + */ rot * LocalPositionMeters; // Rotation happens in ENU space
-            var pointInEcef = ENUPoint.FromUnity(Vector3Double.From(pointInEnu)).ToECEF(OriginWGS);
+    private static Quaternion LocalRotationAsQuaternion(Vector3 localRotationRadians)
+    {
+        var rotX = Quaternion.AngleAxis(localRotationRadians.x * Mathf.Rad2Deg, Vector3.right);
+        var rotY = Quaternion.AngleAxis(localRotationRadians.y * Mathf.Rad2Deg, Vector3.up);
+        var rotZ = Quaternion.AngleAxis(localRotationRadians.z * Mathf.Rad2Deg, Vector3.forward);
+        return Quaternion.identity * rotZ * rotX * rotY;
+    }
 
-            v.Position = ECEFPoint.RawFrom(pointInEcef.RawToVector3Double());
-            v.Color = Color;
+    private static GeoFixedVertex ToGeoFixedVertex(WGS84Point originWgs, Color color, Quaternion rot, Vector3 localPositionMeters)
+    {
+        var v = new GeoFixedVertex();
 
-            return v;
-        }
+        var pointInEnu = /*enuOrigin = (0, 0, 0) + */ rot * localPositionMeters; // Rotation happens in ENU space
+        var pointInEcef = ENUPoint.FromUnity(Vector3Double.From(pointInEnu)).ToECEF(originWgs);
+
+        v.Position = ECEFPoint.RawFrom(pointInEcef.RawToVector3Double());
+        v.Color = color;
+
+        return v;
     }
 
     private class CreateMeshCommand
@@ -265,6 +299,13 @@ public class GeoFixedExternalDrawingsManager : MonoBehaviour
         public List<ExternalLineMeshVertexDto> vertices;
     }
 
+    private class SetMeshVertexOffsetsCommand
+    {
+        public string Id;
+        public uint? StartIndex;
+        public List<ExternalLineMeshVertexGroupDto> Groups;
+    }
+
     private class SetMeshIndicesCommand
     {
         public string Id;
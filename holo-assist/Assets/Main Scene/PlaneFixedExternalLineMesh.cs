@@ -38,7 +38,7 @@ public class PlaneFixedExternalLineMesh : MonoBehaviour
     public void SetIndices(List<int> newIndices, int startIndex)
     {
         Debug.Assert(newIndices.Count <= _indices.Count - startIndex);
-        for (int i = startIndex; i < newIndices.Count; i++)
+        for (int i = startIndex; i < startIndex + newIndices.Count; i++)
         {
             _indices[i] = newIndices[i - startIndex];
         }
@@ -52,7 +52,7 @@ public class PlaneFixedExternalLineMesh : MonoBehaviour
     public void SetVertices(List<ColoredVertex> newVertices, int startIndex)
     {
         Debug.Assert(newVertices.Count <= _vertices.Count - startIndex);
-        for (int i = startIndex; i < newVertices.Count; i++)
+        for (int i = startIndex; i < startIndex + newVertices.Count; i++)
         {
             _vertices[i] = newVertices[i - startIndex];
         }
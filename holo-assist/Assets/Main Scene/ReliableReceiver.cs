@@ -0,0 +1,122 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using System.Text;
+
+/*
+    Receiving side of the optional reliable delivery of the commands (see
+    `reliable_delivery.py` in holo-assist-apps for the protocol, and its
+    `ReliableReceiver`, which this class mirrors). The commands of each mesh
+    are returned exactly once and in order: duplicates are dropped, and a
+    command received too early is held back until the ones before it
+    arrive. The acks are collected and sent once per frame, to the host
+    that sent the last frame of each mesh.
+*/
+
+public class ReliableReceiver
+{
+    private const byte FormatVersion = 1;
+
+    // Frames received this far ahead of the first missing one are dropped
+    private const uint MaxBufferedFrames = 1024;
+    private const int MaxAckRanges = 16;
+
+    private class Stream
+    {
+        public uint Session;
+        public uint NextSequence;
+        public string SourceHost;
+        public SortedDictionary<uint, byte[]> Buffered = new SortedDictionary<uint, byte[]>();
+    }
+
+    private readonly Dictionary<string, Stream> _Streams = new Dictionary<string, Stream>();
+    private readonly HashSet<string> _ToAck = new HashSet<string>();
+
+    public static bool IsReliableFrame(byte[] packet)
+    {
+        return packet.Length >= 2 && packet[0] == (byte)'H' && packet[1] == (byte)'R';
+    }
+
+    /*
+        Returns the commands that can now be applied, in order. `sourceHost`
+        is where the acks of the mesh of the frame are sent.
+    */
+    public List<byte[]> Receive(byte[] packet, string sourceHost)
+    {
+        var version = packet[2];
+        if (version != FormatVersion)
+            throw new ArgumentException($"Unsupported reliable frame version {version}");
+
+        uint session = BitConverter.ToUInt32(packet, 3);
+        int idLength = BitConverter.ToUInt16(packet, 7);
+        var id = Encoding.UTF8.GetString(packet, 9, idLength);
+        uint sequence = BitConverter.ToUInt32(packet, 9 + idLength);
+
+        int commandOffset = 9 + idLength + 4;
+        var command = new byte[packet.Length - commandOffset];
+        Array.Copy(packet, commandOffset, command, 0, command.Length);
+
+        // A new session (e.g. the app was restarted) starts over
+        if (!_Streams.TryGetValue(id, out Stream stream) || stream.Session != session)
+        {
+            stream = new Stream { Session = session };
+            _Streams[id] = stream;
+        }
+
+        stream.SourceHost = sourceHost;
+        _ToAck.Add(id);
+
+        var ready = new List<byte[]>();
+        if (sequence < stream.NextSequence || stream.Buffered.ContainsKey(sequence))
+            return ready;
+
+        if (sequence >= stream.NextSequence + MaxBufferedFrames)
+            return ready;
+
+        stream.Buffered[sequence] = command;
+
+        while (stream.Buffered.TryGetValue(stream.NextSequence, out byte[] next))
+        {
+            ready.Add(next);
+            stream.Buffered.Remove(stream.NextSequence);
+            stream.NextSequence++;
+        }
+
+        return ready;
+    }
+
+    /*
+        Returns the acks to send for the frames received since the previous
+        call, with the host to send each of them to
+    */
+    public List<(string Host, object Ack)> TakeAcks()
+    {
+        var acks = new List<(string Host, object Ack)>();
+
+        foreach (var id in _ToAck)
+        {
+            var stream = _Streams[id];
+
+            var ranges = new List<uint[]>();
+            foreach (var sequence in stream.Buffered.Keys)
+            {
+                if (ranges.Count > 0 && ranges[ranges.Count - 1][1] == sequence)
+                    ranges[ranges.Count - 1][1]++;
+                else
+                    ranges.Add(new uint[] { sequence, sequence + 1 });
+            }
+
+            acks.Add((stream.SourceHost, new
+            {
+                type = "RELIABLE_ACK",
+                session = stream.Session,
+                id,
+                next = stream.NextSequence,
+                ranges = ranges.Take(MaxAckRanges).ToList()
+            }));
+        }
+
+        _ToAck.Clear();
+        return acks;
+    }
+}
@@ -23,6 +23,11 @@ using System.IO;
     Receives UDP packets and dispatches them to the rest of the application
     via `UnityEvent`. The conditional compilation is needed because the
     Unity Editor and the Hololens use different network APIs.
+
+    Debug messages are sent to `SendUdpIp`, while the acks (SYNC_ACK and
+    RELIABLE_ACK) go back to the host the acknowledged datagram came from,
+    so that the apps can run on any host. Both use `SendUdpPort`, which is
+    the port on which the apps wait for acks.
 */
 
 public class SimulatorStatusUpdate
@@ -56,6 +61,8 @@ public class UDPManager : MonoBehaviour
 	
 	private readonly ConcurrentQueue<Action> _ExecuteOnMainThreadQueue = new ConcurrentQueue<Action>();
 	private SimulatorStatusUpdate _CurrentSimulatorStatus;
+	private readonly BatchAssembler _Batches = new BatchAssembler();
+	private readonly ReliableReceiver _Reliable = new ReliableReceiver();
 
 	async void Start()
 	{
@@ -110,6 +117,13 @@ public class UDPManager : MonoBehaviour
 				a.Invoke();
 			}
 		}
+
+		// One ack per mesh and per frame at most, for all the reliable
+		// frames processed above (see ReliableReceiver)
+		foreach (var (host, ack) in _Reliable.TakeAcks())
+		{
+			SendUDPJSONMessage(ack, host);
+		}
 	}
 
 	public void SendUDPJSONMessage(object message)
@@ -117,25 +131,63 @@ public class UDPManager : MonoBehaviour
 		SendUDPMessage(JsonConvert.SerializeObject(message));
     }
 
+	public void SendUDPJSONMessage(object message, string host)
+	{
+		SendUDPMessage(JsonConvert.SerializeObject(message), host);
+	}
+
 	public void SendUDPMessage(string message)
+	{
+		SendUDPMessage(message, SendUdpIp);
+	}
+
+	public void SendUDPMessage(string message, string host)
     {
 #if UNITY_EDITOR
-		SendUdpMessageUnityEditor(message);
+		SendUdpMessageUnityEditor(message, host);
 #endif
 
 #if !UNITY_EDITOR
-		SendUdpMessageUWP(message);
+		SendUdpMessageUWP(message, host);
 #endif
 	}
 
-	private void ProcessPacket(byte[] packet)
+	private void ProcessPacket(byte[] packet, string sourceHost)
 	{
 
 		var byteReprOfOpenSquareBracket = Encoding.UTF8.GetBytes("{")[0];
 		if (packet[0] == byteReprOfOpenSquareBracket)
         {
 			var jobj = JObject.Parse(Encoding.UTF8.GetString(packet));
-			OnUDPCommandReceived.Invoke(jobj["type"].ToString(), jobj);
+			var type = jobj["type"].ToString();
+
+			if (type == "SYNC")
+			{
+				// Packets are processed in order, so when a SYNC is processed
+				// every command sent before it has already been applied: the
+				// ack tells the app that it can send more (see flow_control.py)
+				SendUDPJSONMessage(new { type = "SYNC_ACK", sequence = jobj["sequence"].Value<long>() }, sourceHost);
+				return;
+			}
+
+			OnUDPCommandReceived.Invoke(type, jobj);
+		} else if (BinaryCommandDecoder.IsBinaryCommand(packet))
+		{
+			var (type, jobj) = BinaryCommandDecoder.Decode(packet);
+			OnUDPCommandReceived.Invoke(type, jobj);
+		} else if (ReliableReceiver.IsReliableFrame(packet))
+		{
+			foreach (var command in _Reliable.Receive(packet, sourceHost))
+			{
+				ProcessPacket(command, sourceHost);
+			}
+		} else if (BatchAssembler.IsBatchPacket(packet))
+		{
+			// Nothing is applied until the whole batch has been received
+			foreach (var command in _Batches.Add(packet))
+			{
+				ProcessPacket(command, sourceHost);
+			}
 		} else
         {
 			WGS84Point p;
@@ -171,19 +223,19 @@ public class UDPManager : MonoBehaviour
 
 		IPEndPoint source = new IPEndPoint(0, 0);
 		byte[] packet = socket.EndReceive(result, ref source);
+		var sourceHost = source.Address.ToString();
 
 		_ExecuteOnMainThreadQueue.Enqueue(() => {
-			ProcessPacket(packet);
+			ProcessPacket(packet, sourceHost);
 		});
 
 		socket.BeginReceive(new AsyncCallback(OnUdpData), socket);
 	}
 
-	void SendUdpMessageUnityEditor(string message)
+	void SendUdpMessageUnityEditor(string message, string host)
     {
 		byte[] msg = Encoding.ASCII.GetBytes(message);
-		_UdpSocket.Send(msg, msg.Length, SendUdpIp, SendUdpPort);
-		_UdpSocket.BeginReceive(new AsyncCallback(OnUdpData), _UdpSocket);
+		_UdpSocket.Send(msg, msg.Length, host, SendUdpPort);
 	}
 #endif
 
@@ -201,11 +253,11 @@ public class UDPManager : MonoBehaviour
 		// I can't believe it. I hope this is a bug and not intended behaviour.
 
 		await Task.Delay(3000);
-		await SendUdpMessageUWP("Datagram socket initialized");
+		await SendUdpMessageUWP("Datagram socket initialized", SendUdpIp);
 	}
 
-	public async Task SendUdpMessageUWP(string message){
-		using (Stream outputStream = (await _UdpSocket.GetOutputStreamAsync(new HostName(SendUdpIp), this.SendUdpPort.ToString())).AsStreamForWrite())
+	public async Task SendUdpMessageUWP(string message, string host){
+		using (Stream outputStream = (await _UdpSocket.GetOutputStreamAsync(new HostName(host), this.SendUdpPort.ToString())).AsStreamForWrite())
 		{
 			using (var streamWriter = new StreamWriter(outputStream))
 			{
@@ -221,8 +273,9 @@ public class UDPManager : MonoBehaviour
 		{
 			byte[] packet = new byte[dataReader.UnconsumedBufferLength];
 			dataReader.ReadBytes(packet);
+			var sourceHost = args.RemoteAddress.CanonicalName;
 			_ExecuteOnMainThreadQueue.Enqueue(() => {
-				ProcessPacket(packet);
+				ProcessPacket(packet, sourceHost);
 			});
 		}
 